@@ -0,0 +1,277 @@
+"""LeanUp benchmark suite.
+
+Measures CLI startup, the per-call overhead of `execute_command` and
+`LeanRepo.lake*`, `status` latency and batch checking throughput against
+the stub executables in `stubs.py`.
+
+Usage:
+    python benchmarks/run.py -o baseline.json
+    python benchmarks/run.py --compare baseline.json --threshold 0.2
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import click
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'benchmarks'))
+sys.path.insert(0, str(ROOT))
+
+from stubs import make_project, make_stub_env  # noqa: E402
+
+# name -> (function, unit, higher_is_better, description)
+BENCHMARKS: Dict[str, Tuple[Callable[['BenchContext'], List[float]], str, bool, str]] = {}
+
+
+def benchmark(name: str, unit: str = 'ms', higher_is_better: bool = False):
+    """Register a benchmark returning a list of samples"""
+    def decorator(func):
+        BENCHMARKS[name] = (func, unit, higher_is_better, (func.__doc__ or '').strip())
+        return func
+    return decorator
+
+
+class BenchContext:
+    """Stub toolchain, projects and settings shared by the benchmarks"""
+
+    def __init__(self, root: Path, repeat: int):
+        self.root = root
+        self.repeat = repeat
+        self.env = make_stub_env(root)
+        # Subprocesses import the LeanUp being benchmarked, installed or not
+        self.env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(ROOT), self.env.get('PYTHONPATH')]))
+        # Keep status caches and metrics of the runs out of the user's cache
+        self.env['LEANUP_CACHE_DIR'] = str(root / 'cache')
+        self.project = make_project(root / 'project', files=64)
+        self.lake = str(Path(self.env['ELAN_HOME']) / 'bin' / 'lake')
+
+    def stub(self, **settings) -> Dict[str, str]:
+        """Environment variables configuring the stubs, e.g. stub(latency=0.1)"""
+        return {f"LEANUP_STUB_{key.upper()}": str(value) for key, value in settings.items()}
+
+
+class stub_settings:
+    """Apply stub settings to this process while a benchmark runs"""
+
+    def __init__(self, settings: Dict[str, str]):
+        self.settings = settings
+
+    def __enter__(self):
+        os.environ.update(self.settings)
+
+    def __exit__(self, *exc):
+        for key in self.settings:
+            os.environ.pop(key, None)
+
+
+def timed(func: Callable[[], object]) -> float:
+    """Run `func` once and return its wall time in milliseconds"""
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+
+def overhead(measured: Callable[[], object], floor: Callable[[], object], repeat: int) -> List[float]:
+    """Time `measured` minus `floor`, interleaving runs so drift affects both equally"""
+    return [timed(measured) - timed(floor) for _ in range(repeat)]
+
+
+def run_stub(cmd: List[str], env: Optional[Dict[str, str]] = None) -> None:
+    subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env, check=True)
+
+
+@benchmark('cli_startup')
+def bench_cli_startup(ctx: BenchContext) -> List[float]:
+    """Wall time of `leanup elan --version` including interpreter startup"""
+    cmd = [sys.executable, '-c', "from leanup.cli import cli; cli(['elan', '--version'])"]
+    return [timed(lambda: run_stub(cmd, ctx.env)) for _ in range(ctx.repeat)]
+
+
+@benchmark('elan_proxy_overhead')
+def bench_elan_proxy_overhead(ctx: BenchContext) -> List[float]:
+    """Time `leanup elan` adds over an interpreter running elan directly"""
+    elan = str(Path(ctx.env['ELAN_HOME']) / 'bin' / 'elan')
+    cmd = [sys.executable, '-c', "from leanup.cli import cli; cli(['elan', '--version'])"]
+    floor = [sys.executable, '-c', f"import subprocess; subprocess.run([{elan!r}, '--version'])"]
+    return overhead(lambda: run_stub(cmd, ctx.env), lambda: run_stub(floor, ctx.env), ctx.repeat)
+
+
+@benchmark('execute_command_overhead')
+def bench_execute_command_overhead(ctx: BenchContext) -> List[float]:
+    """Time `execute_command` adds over `subprocess.run`"""
+    from leanup.utils.basic import execute_command
+    cmd = [ctx.lake, '--version']
+    return overhead(lambda: execute_command(cmd), lambda: run_stub(cmd), ctx.repeat)
+
+
+@benchmark('execute_command_16mib')
+def bench_execute_command_output(ctx: BenchContext) -> List[float]:
+    """`execute_command` on a command writing 16 MiB to stdout"""
+    from leanup.utils.basic import execute_command
+    with stub_settings(ctx.stub(output=16 * 1024 * 1024)):
+        return [timed(lambda: execute_command([ctx.lake, 'build'])) for _ in range(ctx.repeat)]
+
+
+@benchmark('lake_call_overhead')
+def bench_lake_call_overhead(ctx: BenchContext) -> List[float]:
+    """Time `LeanRepo.lake` adds over running the toolchain's lake directly"""
+    from leanup.repo.manager import LeanRepo
+    repo = LeanRepo(ctx.project)
+    lake = repo.toolchain_executable('lake')
+    return overhead(lambda: repo.lake(['--version']),
+                    lambda: subprocess.run([lake, '--version'], cwd=ctx.project, capture_output=True),
+                    ctx.repeat)
+
+
+@benchmark('lake_build')
+def bench_lake_build(ctx: BenchContext) -> List[float]:
+    """`LeanRepo.lake_build` with 4 MiB of output, 256 MiB of memory and 50 ms of work"""
+    from leanup.repo.manager import LeanRepo
+    repo = LeanRepo(ctx.project)
+    with stub_settings(ctx.stub(output=4 * 1024 * 1024, memory=256, latency=0.05)):
+        return [timed(repo.lake_build) for _ in range(ctx.repeat)]
+
+
+@benchmark('status_refresh')
+def bench_status_refresh(ctx: BenchContext) -> List[float]:
+    """`leanup status` information collected from scratch"""
+    from leanup.repo.elan import ElanManager
+    manager = ElanManager()
+    manager.status_cache_path = ctx.root / 'status.json'
+    return [timed(lambda: manager.get_status_info(refresh=True)) for _ in range(ctx.repeat)]
+
+
+@benchmark('status_cached')
+def bench_status_cached(ctx: BenchContext) -> List[float]:
+    """`leanup status` information served from the status cache"""
+    from leanup.repo.elan import ElanManager
+    manager = ElanManager()
+    manager.status_cache_path = ctx.root / 'status.json'
+    manager.get_status_info(refresh=True)
+    return [timed(manager.get_status_info) for _ in range(ctx.repeat)]
+
+
+@benchmark('check_many_throughput', unit='files/s', higher_is_better=True)
+def bench_check_many(ctx: BenchContext) -> List[float]:
+    """`LeanRepo.check_many` over 64 files taking 20 ms each, 8 at a time"""
+    from leanup.repo.manager import LeanRepo
+    repo = LeanRepo(ctx.project)
+    files = sorted(ctx.project.glob('*.lean'))
+    repo.lake_env()
+    samples = []
+    with stub_settings(ctx.stub(latency=0.02)):
+        for _ in range(max(1, ctx.repeat // 4)):
+            elapsed = timed(lambda: list(repo.check_many(files, jobs=8))) / 1000
+            samples.append(len(files) / elapsed)
+    return samples
+
+
+def summarize(samples: List[float], unit: str, higher_is_better: bool) -> Dict[str, object]:
+    return {
+        'unit': unit,
+        'higher_is_better': higher_is_better,
+        'median': round(statistics.median(samples), 3),
+        'min': round(min(samples), 3),
+        'max': round(max(samples), 3),
+        'samples': len(samples),
+    }
+
+
+def run_benchmarks(names: List[str], repeat: int) -> Dict[str, Dict[str, object]]:
+    """Run the selected benchmarks against freshly created stubs"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        ctx = BenchContext(Path(tmp), repeat)
+        # In-process benchmarks resolve elan, lake and git through this environment
+        os.environ.update(ctx.env)
+        for name in names:
+            func, unit, higher_is_better, _ = BENCHMARKS[name]
+            results[name] = summarize(func(ctx), unit, higher_is_better)
+            click.echo(f"{name:<28} {results[name]['median']:>10.3f} {unit}")
+    return results
+
+
+def compare(baseline: Dict[str, Dict[str, object]], results: Dict[str, Dict[str, object]],
+            threshold: float, min_delta: float) -> List[str]:
+    """Compare medians with a baseline and return the regressed benchmarks.
+
+    Args:
+        baseline: Benchmarks of the baseline file
+        results: Benchmarks of this run
+        threshold: Relative change counted as a regression, e.g. 0.2 for 20%
+        min_delta: Smaller absolute changes of millisecond benchmarks are ignored as noise
+
+    Returns:
+        Names of the benchmarks that regressed
+    """
+    regressions = []
+    click.echo(f"\n{'benchmark':<28} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old, new = baseline[name]['median'], result['median']
+        delta = (old - new) if result['higher_is_better'] else (new - old)
+        change = delta / abs(old) if old else 0.0
+        regressed = change > threshold and not (result['unit'] == 'ms' and delta < min_delta)
+        mark = '  REGRESSION' if regressed else ''
+        click.echo(f"{name:<28} {old:>10.3f} {new:>10.3f} {change:>+8.1%}{mark}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+@click.command()
+@click.option('--output', '-o', type=click.Path(dir_okay=False, path_type=Path),
+              help='Write results to this JSON file')
+@click.option('--compare', 'baseline_path', type=click.Path(exists=True, dir_okay=False, path_type=Path),
+              help='Baseline JSON file to compare against')
+@click.option('--threshold', type=float, default=0.2, show_default=True,
+              help='Relative slowdown reported as a regression')
+@click.option('--min-delta', type=float, default=1.0, show_default=True,
+              help='Ignore changes of millisecond benchmarks below this many ms')
+@click.option('--repeat', '-n', type=int, default=10, show_default=True, help='Samples per benchmark')
+@click.option('--only', multiple=True, type=click.Choice(sorted(BENCHMARKS)), help='Run only these benchmarks')
+@click.option('--list', 'list_only', is_flag=True, help='List benchmarks and exit')
+def main(output: Optional[Path], baseline_path: Optional[Path], threshold: float, min_delta: float,
+         repeat: int, only: Tuple[str, ...], list_only: bool):
+    """Run the LeanUp benchmarks"""
+    if list_only:
+        for name, (_, unit, _, description) in BENCHMARKS.items():
+            click.echo(f"{name:<28} {unit:<8} {description}")
+        return
+    results = run_benchmarks(list(only) or list(BENCHMARKS), repeat)
+    if output:
+        import leanup
+        report = {
+            'meta': {
+                'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'leanup': leanup.__version__,
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpus': os.cpu_count(),
+                'repeat': repeat,
+            },
+            'benchmarks': results,
+        }
+        output.write_text(json.dumps(report, indent=2) + '\n')
+        click.echo(f"Results written to {output}")
+    if baseline_path:
+        baseline = json.loads(baseline_path.read_text())['benchmarks']
+        regressions = compare(baseline, results, threshold, min_delta)
+        if regressions:
+            click.echo(f"\n✗ {len(regressions)} regression(s) over {threshold:.0%}: {', '.join(regressions)}", err=True)
+            sys.exit(1)
+        click.echo("\n✓ No regressions")
+
+
+if __name__ == '__main__':
+    main()
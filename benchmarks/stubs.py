@@ -0,0 +1,101 @@
+"""Fake `lake`, `lean`, `elan` and `git` executables for benchmarks.
+
+The stubs are small Python scripts whose cost is set with environment
+variables, so a benchmark measures LeanUp rather than Lean:
+
+    LEANUP_STUB_LATENCY  seconds to sleep before exiting (default 0)
+    LEANUP_STUB_OUTPUT   bytes written to stdout (default 0)
+    LEANUP_STUB_MEMORY   MiB allocated and touched while running (default 0)
+
+`lake env <cmd>` runs `<cmd>` so `LeanRepo.lake_env` works, and
+`--version` prints a version line like the real tools.
+"""
+import os
+import sys
+from pathlib import Path
+from typing import Dict
+
+TOOLCHAIN = 'leanprover/lean4:v4.9.0'
+
+STUB_SCRIPT = '''\
+import os
+import sys
+import time
+
+VERSIONS = {
+    'elan': 'elan 4.0.0 (stub)',
+    'lake': 'Lake version 5.0.0-stub (Lean version 4.9.0)',
+    'lean': 'Lean (version 4.9.0, x86_64-unknown-linux-gnu, commit stub, Release)',
+    'git': 'git version 2.40.0',
+}
+name = os.path.basename(sys.argv[0])
+args = sys.argv[1:]
+if name == 'lake' and args[:1] == ['env'] and len(args) > 1:
+    os.execvp(args[1], args[1:])
+if args[:1] == ['--version']:
+    sys.stdout.write(VERSIONS.get(name, f"{name} 0.0.0 (stub)") + "\\n")
+memory = int(os.environ.get('LEANUP_STUB_MEMORY') or 0)
+block = bytearray(memory * 1024 * 1024)
+for i in range(0, len(block), 4096):
+    block[i] = 1
+output = int(os.environ.get('LEANUP_STUB_OUTPUT') or 0)
+line = b'x' * 79 + b'\\n'
+while output > 0:
+    sys.stdout.buffer.write(line[:output])
+    output -= len(line)
+sys.stdout.flush()
+time.sleep(float(os.environ.get('LEANUP_STUB_LATENCY') or 0))
+'''
+
+
+def write_stub(path: Path) -> Path:
+    """Write one stub executable, named after the tool it replaces"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # -S skips site imports so the stubs start as fast as the interpreter allows
+    path.write_text(f"#!{sys.executable} -S\n{STUB_SCRIPT}")
+    path.chmod(0o755)
+    return path
+
+
+def make_stub_env(root: Path) -> Dict[str, str]:
+    """Create a fake ELAN_HOME, toolchain and PATH under `root`.
+
+    Args:
+        root: Empty directory to create the stubs in
+
+    Returns:
+        Environment with ELAN_HOME and PATH pointing at the stubs
+    """
+    elan_home = root / 'elan'
+    toolchain_bin = elan_home / 'toolchains' / TOOLCHAIN.replace('/', '--').replace(':', '---') / 'bin'
+    for name in ('lake', 'lean'):
+        write_stub(toolchain_bin / name)
+        write_stub(elan_home / 'bin' / name)
+    write_stub(elan_home / 'bin' / 'elan')
+    write_stub(root / 'bin' / 'git')
+    (elan_home / 'settings.toml').write_text(f'default_toolchain = "{TOOLCHAIN}"\n')
+    env = dict(os.environ)
+    env['ELAN_HOME'] = str(elan_home)
+    env['PATH'] = os.pathsep.join([str(elan_home / 'bin'), str(root / 'bin'), env.get('PATH', '')])
+    for name in ('LEANUP_STUB_LATENCY', 'LEANUP_STUB_OUTPUT', 'LEANUP_STUB_MEMORY'):
+        env.pop(name, None)
+    return env
+
+
+def make_project(path: Path, files: int = 0) -> Path:
+    """Create a minimal Lake project using the stub toolchain.
+
+    Args:
+        path: Project directory
+        files: Number of Lean files to create under the project
+
+    Returns:
+        Project directory
+    """
+    path.mkdir(parents=True, exist_ok=True)
+    (path / 'lean-toolchain').write_text(TOOLCHAIN + '\n')
+    (path / 'lakefile.lean').write_text('import Lake\nopen Lake DSL\n\npackage bench\n')
+    (path / 'lake-manifest.json').write_text('{"version": 7, "packagesDir": ".lake/packages", "packages": []}\n')
+    for i in range(files):
+        (path / f'File{i}.lean').write_text(f'theorem t{i} : {i} = {i} := rfl\n')
+    return path
@@ -1,21 +1,94 @@
 import click
+import importlib
+import json
 import sys
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Tuple
 
 from leanup.repo.elan import ElanManager
+from leanup.utils import tracing
+from leanup.utils.profiling import DEFAULT_PROFILE
 from leanup.utils.custom_logger import setup_logger
-from leanup.cli.repo import repo
 
 logger = setup_logger("leanup_cli")
 
 
-@click.group()
+class LazyGroup(click.Group):
+    """Group whose subcommands are imported only when they are invoked.
+    
+    Subcommands are registered as `name -> (import path, short help)`, so
+    listing them in `--help` does not import their modules. Options listed
+    in `optional_values` may be given without a value, which then defaults
+    to the one registered.
+    """
+    
+    def __init__(self, *args, lazy_commands: Optional[dict] = None,
+                 optional_values: Optional[dict] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
+        self.optional_values = optional_values or {}
+    
+    def parse_args(self, ctx, args):
+        commands = set(self.list_commands(ctx))
+        args = list(args)
+        for i, arg in enumerate(args):
+            if arg in commands:
+                break
+            # Followed by a command or another option, the value was left out
+            if arg in self.optional_values and (
+                    i + 1 == len(args) or args[i + 1] in commands or args[i + 1].startswith('-')):
+                args[i] = f"{arg}={self.optional_values[arg]}"
+        return super().parse_args(ctx, args)
+    
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+    
+    def get_command(self, ctx, cmd_name):
+        if cmd_name in self.lazy_commands and cmd_name not in self.commands:
+            module_name, attr = self.lazy_commands[cmd_name][0].split(':')
+            self.add_command(getattr(importlib.import_module(module_name), attr), cmd_name)
+        return super().get_command(ctx, cmd_name)
+    
+    def format_commands(self, ctx, formatter):
+        rows = []
+        for name in self.list_commands(ctx):
+            if name in self.lazy_commands and name not in self.commands:
+                rows.append((name, self.lazy_commands[name][1]))
+                continue
+            command = self.get_command(ctx, name)
+            if command is not None and not command.hidden:
+                rows.append((name, command.get_short_help_str(formatter.width - 6 - len(name))))
+        if rows:
+            with formatter.section('Commands'):
+                formatter.write_dl(rows)
+
+
+@click.group(cls=LazyGroup, lazy_commands={
+    'repo': ('leanup.cli.repo:repo', 'Repository management commands'),
+    'stats': ('leanup.cli.stats:stats', 'Show timing statistics of past builds and installs'),
+    'cache': ('leanup.cli.cache:cache', 'Cache management commands'),
+}, optional_values={'--profile': DEFAULT_PROFILE})
 @click.version_option()
+@click.option('--trace', type=click.Path(dir_okay=False, path_type=Path), envvar=tracing.TRACE_ENV,
+              help='Record commands and their timings to a trace file (.json: Chrome trace, otherwise JSON lines)')
+@click.option('--profile', type=click.Path(dir_okay=False, path_type=Path), metavar='[=FILE]',
+              help=f'Profile the command, writing FILE (default: {DEFAULT_PROFILE}) and a report '
+                   'of Python CPU, subprocess and I/O time')
 @click.pass_context
-def cli(ctx):
+def cli(ctx, trace: Optional[Path], profile: Optional[Path]):
     """LeanUp - Lean project management tool"""
     ctx.ensure_object(dict)
+    if trace:
+        tracing.enable(trace)
+        # Closed in reverse order: the root span ends before the trace is written
+        ctx.call_on_close(tracing.disable)
+        ctx.with_resource(tracing.span(f"leanup {ctx.invoked_subcommand}", argv=sys.argv[1:]))
+    if profile:
+        from leanup.utils.profiling import CommandProfiler
+        profiler = CommandProfiler(profile)
+        # Stops first on close, reusing the trace's command spans if tracing
+        ctx.call_on_close(lambda: click.echo(profiler.stop()['report'], err=True))
+        profiler.start()
 
 
 @cli.command()
@@ -35,10 +108,16 @@ def init():
 
 
 @cli.command()
-@click.argument('version', required=False)
+@click.argument('versions', nargs=-1)
 @click.option('--force', '-f', is_flag=True, help='Force reinstall')
-def install(version: Optional[str], force: bool):
-    """Install Lean toolchain version via elan"""
+@click.option('--direct', is_flag=True,
+              help='Install release archives in parallel without going through elan')
+@click.option('--jobs', '-j', type=int, default=4, show_default=True,
+              help='Toolchains downloaded at the same time with --direct')
+@click.option('--mirror-dir', type=click.Path(file_okay=False, path_type=Path), envvar='LEANUP_TOOLCHAIN_MIRROR',
+              help='Shared directory of release archives, used and filled by --direct')
+def install(versions: Tuple[str, ...], force: bool, direct: bool, jobs: int, mirror_dir: Optional[Path]):
+    """Install Lean toolchain versions via elan"""
     elan_manager = ElanManager()
     
     if not elan_manager.is_elan_installed():
@@ -48,46 +127,67 @@ def install(version: Optional[str], force: bool):
             sys.exit(1)
         click.echo("✓ elan installed successfully")
     
-    if not version:
-        # Install latest stable version
-        click.echo("Installing latest Lean toolchain...")
-        cmd = ['toolchain', 'install', 'stable']
-    else:
-        # Install specific version
-        click.echo(f"Installing Lean toolchain {version}...")
-        cmd = ['toolchain', 'install', version]
-    if force:
-        cmd.append('--force')
-    try:
-        result = elan_manager.proxy_elan_command(cmd)
-        if result == 0:
-            click.echo(f"✓ Lean toolchain {version} installed")
+    if direct:
+        targets = list(versions) or ['stable']
+        click.echo(f"Installing Lean toolchains {', '.join(targets)}...")
+        results = elan_manager.install_toolchains(targets, jobs=jobs, mirror_dir=mirror_dir, force=force)
+        for version, ok in results.items():
+            if ok:
+                click.echo(f"✓ Lean toolchain {version} installed")
+            else:
+                click.echo(f"✗ Failed to install Lean toolchain {version}", err=True)
+        if not all(results.values()):
+            sys.exit(1)
+        return
+    
+    for version in versions or [None]:
+        if not version:
+            # Install latest stable version
+            click.echo("Installing latest Lean toolchain...")
+            cmd = ['toolchain', 'install', 'stable']
         else:
-            click.echo(f"✗ Failed to install Lean toolchain {version}", err=True)
+            # Install specific version
+            click.echo(f"Installing Lean toolchain {version}...")
+            cmd = ['toolchain', 'install', version]
+        if force:
+            cmd.append('--force')
+        try:
+            result = elan_manager.proxy_elan_command(cmd)
+            if result == 0:
+                click.echo(f"✓ Lean toolchain {version} installed")
+            else:
+                click.echo(f"✗ Failed to install Lean toolchain {version}", err=True)
+                sys.exit(1)
+        except Exception as e:
+            click.echo(f"✗ Failed to install Lean toolchain {version}: {e}", err=True)
             sys.exit(1)
-    except Exception as e:
-        click.echo(f"✗ Failed to install Lean toolchain {version}: {e}", err=True)
-        sys.exit(1)
 
 
 @cli.command()
-def status():
+@click.option('--json', 'as_json', is_flag=True, help='Print status as JSON')
+@click.option('--refresh', is_flag=True, help='Ignore the cached status')
+def status(as_json: bool, refresh: bool):
     """Show status information"""
     elan_manager = ElanManager()
+    info = elan_manager.get_status_info(refresh=refresh)
+    
+    if as_json:
+        click.echo(json.dumps(info, indent=2))
+        return
     
     click.echo("=== LeanUp Status ===")
     
     # elan status
-    if elan_manager.is_elan_installed():
-        version = elan_manager.get_elan_version()
-        click.echo(f"elan: ✓ installed (version: {version})")
+    if info['installed']:
+        click.echo(f"elan: ✓ installed (version: {info['version']})")
         
         # Show toolchains
-        toolchains = elan_manager.get_installed_toolchains()
-        if toolchains:
-            click.echo(f"Toolchains: {', '.join(toolchains)}")
+        if info['toolchains']:
+            click.echo(f"Toolchains: {', '.join(info['toolchains'])}")
         else:
             click.echo("Toolchains: none")
+        if info.get('default_toolchain'):
+            click.echo(f"Default toolchain: {info['default_toolchain']}")
     else:
         click.echo("elan: ✗ not installed")
 
@@ -110,7 +210,5 @@ def elan(args):
         click.echo("\nInterrupted", err=True)
         sys.exit(1)
 
-cli.add_command(repo)
-
 if __name__ == '__main__':
     cli()
\ No newline at end of file
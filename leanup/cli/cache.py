@@ -0,0 +1,53 @@
+import click
+import sys
+from pathlib import Path
+from typing import Optional
+
+from leanup.const import LEANUP_CACHE_DIR
+from leanup.repo.eviction import CacheEvictor, BUDGET_KEY, cache_budget, format_size, parse_size
+
+
+@click.group()
+def cache():
+    """Cache management commands"""
+    pass
+
+
+@cache.command()
+@click.option('--max-size', help=f'Cache budget, e.g. 200GiB (default: {BUDGET_KEY} in config.yaml)')
+@click.option('--search-dir', '-d', help='Directory of the cached repositories',
+              type=click.Path(file_okay=False, dir_okay=True, path_type=Path),
+              default=LEANUP_CACHE_DIR / "repos")
+@click.option('--dry-run', '-n', is_flag=True, help='Only show what would be evicted')
+@click.option('--rescan', is_flag=True, help='Measure every repository instead of using the catalog sizes')
+def gc(max_size: Optional[str], search_dir: Path, dry_run: bool, rescan: bool):
+    """Evict the least recently used builds and checkouts until the cache is under budget"""
+    try:
+        budget = parse_size(max_size) if max_size else cache_budget()
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    if budget is None:
+        click.echo(f"Error: No cache budget, set {BUDGET_KEY} in config.yaml or pass --max-size", err=True)
+        sys.exit(1)
+
+    evictor = CacheEvictor(budget, repos_dir=search_dir)
+    entries = evictor.entries(rescan=rescan)
+    usage = evictor.usage(entries)
+    click.echo(f"Cache usage: {format_size(usage)} of {format_size(budget)} in {len(entries)} repositories")
+    if usage <= budget:
+        click.echo("✓ Under budget, nothing to evict")
+        return
+
+    evicted = evictor.collect(dry_run=dry_run, entries=entries)
+    verb = "Would evict" if dry_run else "Evicted"
+    for item in evicted:
+        what = "build outputs of" if item['kind'] == 'build' else "checkout"
+        click.echo(f"{verb} {what} {Path(item['path']).name} ({format_size(item['freed'])})")
+    for path in evictor.skipped:
+        click.echo(f"- Skipped {Path(path).name}, in use")
+    remaining = usage - sum(item['freed'] for item in evicted)
+    click.echo(f"Cache usage {'would be' if dry_run else 'after eviction'}: {format_size(remaining)}")
+    if remaining > budget:
+        click.echo("⚠ Still over budget", err=True)
+        sys.exit(1)
@@ -1,12 +1,22 @@
 import click
+import json
 import shutil
 import sys
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Optional, List, Tuple
 from urllib.parse import urlparse
 
 from leanup.const import LEANUP_CACHE_DIR
+from leanup.repo.installer import (
+    RepoInstaller, BuildLimiter, INSTALL_STAGES, SYNC_STAGES, DEFAULT_BUILD_MEMORY,
+    default_repo_dir, load_manifest,
+)
+from leanup.repo.catalog import default_catalog, matches_filters, read_entry, FILTER_FIELDS
+from leanup.repo.eviction import format_size
 from leanup.repo.manager import RepoManager, LeanRepo
+from leanup.repo.mirror import MirrorCache
+from leanup.utils.basic import OutputCapture
 from leanup.utils.custom_logger import setup_logger
 
 logger = setup_logger("repo_cli")
@@ -24,9 +34,27 @@ def repo():
 @click.option('--force', '-f', is_flag=True, help='Replace existing directory')
 @click.option('--dest-dir', '-d', help='Destination directory', type=click.Path(path_type=Path))
 @click.option('--interactive', '-i', is_flag=True, help='Interactive mode')
+@click.option('--share-artifacts/--no-share-artifacts', default=True,
+              help='Reuse dependency builds from the shared artifact store')
+@click.option('--mirror', '-m', is_flag=True,
+              help='Clone through a local mirror cache, fetching only new objects')
+@click.option('--from', 'manifest', help='Install all repositories listed in a YAML file',
+              type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option('--jobs', '-j', type=int, default=4, show_default=True,
+              help='Concurrent clones and updates when installing from a file')
+@click.option('--max-builds', type=int,
+              help='Concurrent builds when installing from a file (default: by CPU and memory)')
+@click.option('--build-memory', type=float, default=DEFAULT_BUILD_MEMORY / 1024 ** 3, show_default=True,
+              help='Memory in GiB reserved per build when deriving --max-builds')
 def install(repository: str, source: str, branch: Optional[str], force: bool,
-            dest_dir: Optional[Path], interactive: bool):
+            dest_dir: Optional[Path], interactive: bool, share_artifacts: bool, mirror: bool,
+            manifest: Optional[Path], jobs: int, max_builds: Optional[int], build_memory: float):
     """Install a repository"""
+    if manifest:
+        _install_from_manifest(manifest, force, share_artifacts, mirror, jobs,
+                               BuildLimiter(max_builds, memory_per_build=int(build_memory * 1024 ** 3)))
+        return
+
     if interactive:
         if repository:
             click.echo(f"Repository name: {repository}")
@@ -45,10 +73,7 @@ def install(repository: str, source: str, branch: Optional[str], force: bool,
     if dest_dir:
         dest_path = dest_dir
     else:
-        repository = repository.replace('/', '_').lower()
-        # Default to current directory + repo name
-        dir_name = f"{repository}_{branch}" if branch else repository
-        dest_path = LEANUP_CACHE_DIR / "repos" / dir_name
+        dest_path = default_repo_dir(repository, branch)
     if interactive:
         dest_path = click.prompt("Destination directory", type=click.Path(path_type=Path), default=dest_path)
     
@@ -65,6 +90,8 @@ def install(repository: str, source: str, branch: Optional[str], force: bool,
     
     # Create parent directories
     dest_path.mkdir(parents=True, exist_ok=True)
+    # Keep `leanup cache gc` away from the repository until the command ends
+    click.get_current_context().with_resource(default_catalog().in_use(dest_path))
     
     # Clone repository
     click.echo(f"Cloning {repo_url} to {dest_path}...")
@@ -73,11 +100,13 @@ def install(repository: str, source: str, branch: Optional[str], force: bool,
     success = repo_manager.clone_from(
         url=repo_url,
         branch=branch,
-        depth=1  # Shallow clone for faster download
+        depth=1,  # Shallow clone for faster download
+        mirror=MirrorCache() if mirror else None
     )
     
     if success:
         click.echo(f"✓ Repository cloned successfully to {dest_path}")
+        build_duration = build_ok = None
         
         # Check if it's a Lean project and run post-install commands
         if (dest_path / "lakefile.lean").exists() or (dest_path / "lakefile.toml").exists():
@@ -95,7 +124,7 @@ def install(repository: str, source: str, branch: Optional[str], force: bool,
             # Lake update
             click.echo("Executing lake update...")
             try:
-                stdout, stderr, returncode = lean_repo.lake_update()
+                stdout, stderr, returncode = lean_repo.lake_update(capture=OutputCapture())
                 if returncode == 0:
                     click.echo("✓ lake update completed")
                 else:
@@ -103,36 +132,179 @@ def install(repository: str, source: str, branch: Optional[str], force: bool,
             except Exception as e:
                 click.echo(f"⚠ lake update error: {e}", err=True)
             
+            if share_artifacts:
+                restored = lean_repo.restore_artifacts()
+                if restored:
+                    click.echo(f"✓ Reused builds of {', '.join(restored)}")
+            
             # Lake build
             click.echo("Building project...")
             try:
-                stdout, stderr, returncode = lean_repo.lake_build()
+                start = time.monotonic()
+                stdout, stderr, returncode = lean_repo.lake_build(capture=OutputCapture())
+                build_duration, build_ok = time.monotonic() - start, returncode == 0
                 if returncode == 0:
                     click.echo("✓ Build completed")
+                    if share_artifacts:
+                        lean_repo.store_artifacts()
                 else:
                     click.echo(f"⚠ Build failed: {stderr}", err=True)
             except Exception as e:
                 click.echo(f"⚠ Build error: {e}", err=True)
+        
+        default_catalog().update(dest_path, url=repo_url, build_duration=build_duration, build_ok=build_ok)
     else:
         click.echo("✗ Failed to clone repository", err=True)
         sys.exit(1)
 
 
+def _format_seconds(seconds: Optional[float]) -> str:
+    return f"{seconds:.1f}s" if seconds is not None else "-"
+
+
+def _print_progress(result: dict):
+    """Print the one-line outcome of a repository"""
+    marks = {'ok': '✓', 'unchanged': '=', 'skipped': '-', 'failed': '✗'}
+    line = f"{marks[result['status']]} {result['repository']} ({_format_seconds(result['timings']['total'])})"
+    error = (result['error'] or '').strip()
+    if error:
+        line += f": {error.splitlines()[-1]}"
+    click.echo(line, err=result['status'] == 'failed')
+
+
+def _print_summary(results: List[dict], stages: List[str]):
+    """Print a table of per-stage timings and exit with an error if any repository failed"""
+    columns = ['repository', 'status'] + stages + ['total']
+    rows = [[r['repository'], r['status']] + [_format_seconds(r['timings'].get(c)) for c in columns[2:]]
+            for r in results]
+    widths = [max(len(str(row[i])) for row in [columns] + rows) for i in range(len(columns))]
+    click.echo("")
+    for row in [columns] + rows:
+        click.echo("  ".join(str(cell).ljust(width) for cell, width in zip(row, widths)).rstrip())
+    if any(r['status'] == 'failed' for r in results):
+        sys.exit(1)
+
+
+def _install_from_manifest(manifest: Path, force: bool, share_artifacts: bool, mirror: bool,
+                           jobs: int, builds: BuildLimiter):
+    """Install every repository of a manifest and print a timing summary"""
+    try:
+        specs = load_manifest(manifest)
+    except (OSError, ValueError) as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    if not specs:
+        click.echo("No repositories to install.")
+        return
+
+    click.echo(f"Installing {len(specs)} repositories ({jobs} jobs, {builds.slots} concurrent builds)...")
+    installer = RepoInstaller(jobs=jobs, builds=builds, force=force, share_artifacts=share_artifacts,
+                              mirror=MirrorCache() if mirror else None, on_progress=_print_progress)
+    _print_summary(installer.install_all(specs), INSTALL_STAGES)
+
+
+@repo.command()
+@click.argument('names', nargs=-1)
+@click.option('--all', '-a', 'sync_all', is_flag=True, help='Sync every cached repository')
+@click.option('--search-dir', '-d', help='Directory of the cached repositories',
+              type=click.Path(file_okay=False, dir_okay=True, path_type=Path),
+              default=LEANUP_CACHE_DIR / "repos")
+@click.option('--force', '-f', is_flag=True, help='Update and rebuild even if nothing changed')
+@click.option('--jobs', '-j', type=int, default=8, show_default=True, help='Concurrent fetches and updates')
+@click.option('--max-builds', type=int, help='Concurrent builds (default: by CPU and memory)')
+@click.option('--build-memory', type=float, default=DEFAULT_BUILD_MEMORY / 1024 ** 3, show_default=True,
+              help='Memory in GiB reserved per build when deriving --max-builds')
+@click.option('--share-artifacts/--no-share-artifacts', default=True,
+              help='Reuse dependency builds from the shared artifact store')
+def sync(names: Tuple[str, ...], sync_all: bool, search_dir: Path, force: bool, jobs: int,
+         max_builds: Optional[int], build_memory: float, share_artifacts: bool):
+    """Fetch cached repositories and rebuild only what changed"""
+    if not names and not sync_all:
+        click.echo("Error: Give repository names or --all", err=True)
+        sys.exit(1)
+    if sync_all:
+        paths = sorted(p for p in search_dir.iterdir() if (p / ".git").exists()) if search_dir.exists() else []
+    else:
+        paths = [search_dir / name for name in names]
+        missing = [str(p) for p in paths if not (p / ".git").exists()]
+        if missing:
+            click.echo(f"Error: Not a cached repository: {', '.join(missing)}", err=True)
+            sys.exit(1)
+    if not paths:
+        click.echo("No repositories to sync.")
+        return
+
+    builds = BuildLimiter(max_builds, memory_per_build=int(build_memory * 1024 ** 3))
+    click.echo(f"Syncing {len(paths)} repositories ({jobs} jobs, {builds.slots} concurrent builds)...")
+    installer = RepoInstaller(jobs=jobs, builds=builds, force=force, share_artifacts=share_artifacts,
+                              on_progress=_print_progress)
+    _print_summary(installer.sync_all(paths), SYNC_STAGES)
+
+
+def _format_time(timestamp: Optional[float]) -> str:
+    return time.strftime('%Y-%m-%d %H:%M', time.localtime(timestamp)) if timestamp else "-"
+
+
+def _parse_filters(filters: Tuple[str, ...]) -> dict:
+    """Parse `--filter FIELD=PATTERN` options"""
+    parsed = {}
+    for item in filters:
+        field, sep, pattern = item.partition('=')
+        if not sep or field not in FILTER_FIELDS:
+            raise click.BadParameter(f"expected FIELD=PATTERN with FIELD one of {', '.join(FILTER_FIELDS)}",
+                                     param_hint='--filter')
+        parsed[field] = pattern
+    return parsed
+
+
 @repo.command()
 @click.option('--name', '-n', help='Filter by repository name')
 @click.option('--search-dir', '-d', help='Directory to search for repositories', 
               type=click.Path(exists=True, file_okay=False, dir_okay=True, path_type=Path),
               default=LEANUP_CACHE_DIR / "repos")
-def list(name: Optional[str], search_dir: Path):
+@click.option('--long', '-l', 'long_format', is_flag=True,
+              help='Show toolchain, commit, sizes and last build')
+@click.option('--json', 'as_json', is_flag=True, help='Print catalog entries as JSON')
+@click.option('--filter', '-f', 'filters', multiple=True, metavar='FIELD=PATTERN',
+              help=f"Only repositories whose field matches a glob pattern ({', '.join(FILTER_FIELDS)}), "
+                   "e.g. toolchain='*v4.9.0'")
+def list(name: Optional[str], search_dir: Path, long_format: bool, as_json: bool, filters: Tuple[str, ...]):
     """List repositories in the specified directory"""
     
     if not search_dir.exists():
         click.echo(f"Directory {search_dir} doesn't exist.")
         return
-    names = [dir.name for dir in search_dir.iterdir() if dir.is_dir()]
-
+    parsed = _parse_filters(filters)
+    catalog = default_catalog()
+    if search_dir.resolve() == catalog.cache_dir / "repos":
+        # Catalog repositories installed before the catalog existed or by hand
+        catalog.refresh(search_dir)
+    names = sorted(dir.name for dir in search_dir.iterdir() if dir.is_dir())
     if name:
         names = [n for n in names if name in n]
+    if not (long_format or as_json or parsed):
+        for n in names:
+            click.echo(n)
+        return
+    
+    # Directories outside the catalog, e.g. in another --search-dir, are read but not stored
+    cataloged = {entry['name']: entry for entry in catalog.entries(parent=search_dir)}
+    entries = [cataloged.get(n) or read_entry(search_dir / n) for n in names]
+    entries = [entry for entry in entries if matches_filters(entry, parsed)]
     
-    for name in names:
-        click.echo(name)
+    if as_json:
+        click.echo(json.dumps([{key: value for key, value in entry.items() if key != 'parts'}
+                               for entry in entries], indent=2))
+        return
+    if not long_format:
+        for entry in entries:
+            click.echo(entry['name'])
+        return
+    columns = ['name', 'toolchain', 'commit', 'size', '.lake', 'last build', 'duration']
+    rows = [[entry['name'], entry['toolchain'] or '-', (entry['commit_hash'] or '-')[:12],
+             format_size(entry['size']), format_size(entry['lake_size']), _format_time(entry['last_build']),
+             _format_seconds(entry['build_duration']) + ('' if entry['build_ok'] in (None, 1) else ' ✗')]
+            for entry in entries]
+    widths = [max(len(str(row[i])) for row in [columns] + rows) for i in range(len(columns))]
+    for row in [columns] + rows:
+        click.echo("  ".join(str(cell).ljust(width) for cell, width in zip(row, widths)).rstrip())
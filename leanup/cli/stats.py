@@ -0,0 +1,91 @@
+import click
+import json
+import time
+from pathlib import Path
+from typing import Optional, List
+
+from leanup.utils.metrics import MetricsStore, default_store, metrics_enabled, METRICS_ENV
+
+
+def _format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "-"
+    if seconds < 1:
+        return f"{seconds * 1000:.0f}ms"
+    if seconds < 120:
+        return f"{seconds:.1f}s"
+    return f"{seconds / 60:.1f}m"
+
+
+def _format_rss(rss: Optional[int]) -> str:
+    return f"{rss / 1024 ** 2:.0f}MiB" if rss else "-"
+
+
+def _format_repo(repo: Optional[str]) -> str:
+    return Path(repo).name if repo else "-"
+
+
+def _print_table(columns: List[str], rows: List[List[str]]):
+    widths = [max(len(str(row[i])) for row in [columns] + rows) for i in range(len(columns))]
+    for row in [columns] + rows:
+        click.echo("  ".join(str(cell).ljust(width) for cell, width in zip(row, widths)).rstrip())
+
+
+@click.command()
+@click.option('--operation', '-o', help='Only this operation, e.g. repo.lake_build')
+@click.option('--repo', '-r', help='Only this repository (name or path)')
+@click.option('--days', type=float, help='Only records of the last N days')
+@click.option('--by', type=click.Choice(['commit', 'toolchain']),
+              help='Show the median duration per commit or toolchain')
+@click.option('--threshold', type=float, default=0.2, show_default=True,
+              help='Relative slowdown reported as a regression')
+@click.option('--json', 'as_json', is_flag=True, help='Print statistics as JSON')
+def stats(operation: Optional[str], repo: Optional[str], days: Optional[float], by: Optional[str],
+          threshold: float, as_json: bool):
+    """Show timing statistics of past builds and installs"""
+    store: MetricsStore = default_store()
+    filters = {
+        'operation': operation,
+        'repo': repo,
+        'since': time.time() - days * 86400 if days else None,
+    }
+    summary = store.summary(**filters)
+    field = {'commit': 'commit_hash', 'toolchain': 'toolchain'}.get(by)
+    trend = store.trend(by=field, threshold=threshold, **filters) if field else []
+    regressions = store.regressions(threshold=threshold, **filters)
+
+    if as_json:
+        report = {'summary': summary, 'regressions': regressions}
+        if field:
+            report['trend'] = trend
+        click.echo(json.dumps(report, indent=2))
+        return
+
+    if not summary:
+        click.echo(f"No metrics recorded yet in {store.path}")
+        if not metrics_enabled():
+            click.echo(f"Recording is disabled by {METRICS_ENV}=0")
+        return
+
+    _print_table(['operation', 'repository', 'runs', 'p50', 'p95', 'p99', 'peak RSS'], [
+        [row['operation'], _format_repo(row['repo']), row['count'], _format_duration(row['p50']),
+         _format_duration(row['p95']), _format_duration(row['p99']), _format_rss(row['peak_rss'])]
+        for row in summary])
+
+    if field:
+        click.echo("")
+        _print_table(['operation', 'repository', by, 'runs', 'median', 'change'], [
+            [row['operation'], _format_repo(row['repo']),
+             (row[field] or '-')[:12] if field == 'commit_hash' else row[field] or '-',
+             row['count'], _format_duration(row['median']),
+             '-' if row['change'] is None else f"{row['change']:+.0%}" + (' ⚠' if row['regression'] else '')]
+            for row in trend])
+
+    click.echo("")
+    if regressions:
+        for row in regressions:
+            click.echo(f"⚠ {row['operation']} {_format_repo(row['repo'])}: "
+                       f"{_format_duration(row['baseline'])} → {_format_duration(row['recent'])} "
+                       f"({row['change']:+.0%})")
+    else:
+        click.echo("✓ No regressions")
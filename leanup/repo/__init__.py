@@ -1,6 +1,32 @@
 """Repository management module for LeanUp."""
 
-from .manager import RepoManager, LeanRepo
-from .elan import ElanManager
+import importlib
 
-__all__ = ['RepoManager', 'ElanManager', 'LeanRepo']
+# Exported names and their submodules; imported on first access so that
+# e.g. `leanup elan` does not load GitPython
+_EXPORTS = {
+    'RepoManager': 'manager',
+    'LeanRepo': 'manager',
+    'AsyncLeanRepo': 'manager',
+    'ElanManager': 'elan',
+    'LeanWorkerPool': 'worker',
+    'BuildProfiler': 'build_profile',
+    'ArtifactStore': 'artifacts',
+    'MirrorCache': 'mirror',
+    'RepoInstaller': 'installer',
+    'BuildLimiter': 'installer',
+    'RepoCatalog': 'catalog',
+    'CacheEvictor': 'eviction',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
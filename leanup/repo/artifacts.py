@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+import shutil
+import stat
+import threading
+from pathlib import Path
+from typing import Optional, Union, Dict, Any
+
+from leanup.const import LEANUP_CACHE_DIR, OS_TYPE
+from leanup.utils.custom_logger import setup_logger
+
+logger = setup_logger("artifact_store")
+
+# FICLONE ioctl request number on Linux, used for copy-on-write reflinks
+FICLONE = 0x40049409
+
+
+def _reflink(src: Path, dst: Path) -> bool:
+    """Create a copy-on-write clone of a file, if the filesystem supports it."""
+    if OS_TYPE != 'Linux':
+        return False
+    try:
+        import fcntl
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        return True
+    except (OSError, ImportError):
+        try:
+            dst.unlink()
+        except OSError:
+            pass
+        return False
+
+
+def copy_file(src: Path, dst: Path) -> str:
+    """Materialize a writable copy of `src` at `dst`.
+
+    Uses a copy-on-write reflink where supported and a plain copy
+    otherwise. Never hardlinks, so writing to either file in place cannot
+    change the other.
+
+    Returns:
+        str: The method used ("reflink" or "copy")
+    """
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(f"{dst.name}.{os.getpid()}.{threading.get_ident()}.leanup-tmp")
+    if _reflink(src, tmp):
+        shutil.copystat(src, tmp)
+        method = 'reflink'
+    else:
+        shutil.copy2(src, tmp)
+        method = 'copy'
+    tmp.chmod(tmp.stat().st_mode | stat.S_IWUSR)
+    os.replace(tmp, dst)
+    return method
+
+
+def clone_tree(src: Path, dst: Path) -> None:
+    """Copy a directory tree, using copy-on-write reflinks where supported.
+
+    Unlike hardlinks, reflinked files can be rewritten in either tree
+    without affecting the other.
+    """
+    for path in src.rglob('*'):
+        target = dst / path.relative_to(src)
+        if path.is_symlink():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.symlink(os.readlink(path), target)
+        elif path.is_dir():
+            target.mkdir(parents=True, exist_ok=True)
+        else:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if _reflink(path, target):
+                shutil.copystat(path, target)
+            else:
+                shutil.copy2(path, target)
+
+
+def file_digest(path: Path) -> str:
+    """Get the SHA-256 digest of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    """Content-addressed store of `.lake` build outputs shared by cached repos.
+
+    Files are stored once under `objects/` by SHA-256 and copied into each
+    checkout, as reflinks where the filesystem supports them. A manifest per (toolchain, package, revision) records which
+    object belongs at which path of the package's `.lake/build`, so a
+    dependency already built by another checkout can be restored without
+    rebuilding it.
+
+    Stored objects are read-only and never share an inode with a checkout,
+    so lake can rewrite `.olean`, `.trace` and `.hash` files in place when
+    it rebuilds a package.
+    """
+
+    def __init__(self, root: Optional[Union[str, Path]] = None):
+        """
+        Args:
+            root: Store directory (default: LEANUP_CACHE_DIR/artifacts)
+        """
+        self.root = Path(root) if root else LEANUP_CACHE_DIR / "artifacts"
+        self.objects_dir = self.root / "objects"
+        self.manifests_dir = self.root / "manifests"
+
+    @staticmethod
+    def make_key(toolchain: Optional[str], name: str, rev: str, url: Optional[str] = None) -> str:
+        """Get the store key of a package build.
+
+        Args:
+            toolchain: Lean toolchain the package is built with
+            name: Package name
+            rev: Git revision of the package
+            url: Package source URL
+
+        Returns:
+            str: Key of the build
+        """
+        data = json.dumps([toolchain or "", name, rev, url or ""])
+        return f"{name}-{rev[:12]}-{hashlib.sha256(data.encode()).hexdigest()[:16]}"
+
+    def _manifest_path(self, key: str) -> Path:
+        return self.manifests_dir / f"{key}.json"
+
+    def _object_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / digest
+
+    def has(self, key: str) -> bool:
+        """Check if a build is stored"""
+        return self._manifest_path(key).exists()
+
+    def ingest(self, key: str, build_dir: Union[str, Path]) -> Dict[str, Any]:
+        """Store copies of the files of a build directory.
+
+        The checkout keeps its own files. Files still hardlinked to a stored
+        object, as earlier versions left them, are replaced by writable
+        copies.
+
+        Args:
+            key: Store key of the build
+            build_dir: Build directory of the package, e.g. `.lake/packages/x/.lake/build`
+
+        Returns:
+            Dict with the number of files and bytes stored
+        """
+        build_dir = Path(build_dir)
+        files = {}
+        new_bytes = 0
+        for path in sorted(build_dir.rglob('*')):
+            if not path.is_file() or path.is_symlink():
+                continue
+            digest = file_digest(path)
+            obj = self._object_path(digest)
+            if obj.exists():
+                if os.path.samefile(obj, path):
+                    copy_file(obj, path)
+            else:
+                tmp = obj.with_name(f"{digest}.{os.getpid()}.{threading.get_ident()}.tmp")
+                copy_file(path, tmp)
+                tmp.chmod(stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+                # Another checkout storing the same file concurrently writes the same content
+                os.replace(tmp, obj)
+                new_bytes += obj.stat().st_size
+            files[path.relative_to(build_dir).as_posix()] = digest
+        self.manifests_dir.mkdir(parents=True, exist_ok=True)
+        manifest = self._manifest_path(key)
+        tmp = manifest.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+        tmp.write_text(json.dumps({'files': files}), encoding='utf-8')
+        os.replace(tmp, manifest)
+        logger.debug(f"Stored {len(files)} files for {key}")
+        return {'files': len(files), 'bytes': new_bytes}
+
+    def restore(self, key: str, build_dir: Union[str, Path]) -> bool:
+        """Materialize a stored build into a build directory.
+
+        Args:
+            key: Store key of the build
+            build_dir: Target build directory
+
+        Returns:
+            bool: True if the build was restored, False otherwise
+        """
+        try:
+            manifest = json.loads(self._manifest_path(key).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return False
+        build_dir = Path(build_dir)
+        try:
+            for rel, digest in manifest['files'].items():
+                copy_file(self._object_path(digest), build_dir / rel)
+            return True
+        except OSError as e:
+            logger.error(f"Error restoring artifacts for {key}: {e}")
+            return False
+
+    @staticmethod
+    def detach(build_dir: Union[str, Path]) -> int:
+        """Replace read-only files hardlinked to stored objects by writable copies.
+
+        Earlier versions linked stored objects into checkouts, which makes
+        rebuilding those files in place fail.
+
+        Args:
+            build_dir: Build directory of a package
+
+        Returns:
+            int: Number of files replaced
+        """
+        detached = 0
+        for path in Path(build_dir).rglob('*'):
+            try:
+                info = path.lstat()
+                if stat.S_ISREG(info.st_mode) and info.st_nlink > 1 and not info.st_mode & stat.S_IWUSR:
+                    copy_file(path, path)
+                    detached += 1
+            except OSError as e:
+                logger.error(f"Failed to detach {path} from the artifact store: {e}")
+        return detached
@@ -0,0 +1,215 @@
+import copy
+import re
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Union, List, Dict, Any, Generator
+
+from leanup.utils import tracing
+from leanup.utils.basic import OutputCapture
+from leanup.utils.custom_logger import setup_logger
+from .worker import split_imports
+
+logger = setup_logger("build_profile")
+
+# Lake progress lines, e.g. "✔ [12/345] Built Mathlib.Order.Basic (1.2s)"
+# or "[12/345] Building Mathlib.Order.Basic" for older lake versions
+PROGRESS_REGEX = re.compile(
+    r'^\s*(?:[✔⚠✖ℹ]\s+)?\[(?P<index>\d+)/(?P<total>\d+)\]\s+'
+    r'(?P<verb>\w+)\s+(?P<name>\S+)'
+    r'(?:.*\((?P<duration>(?:\d+(?:\.\d+)?\s*(?:ms|s|m|h)\s*)+)\))?\s*$'
+)
+DURATION_REGEX = re.compile(r'(\d+(?:\.\d+)?)\s*(ms|s|m|h)')
+DURATION_UNITS = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+
+
+def parse_duration(text: str) -> float:
+    """Parse a lake duration such as "1.2s", "340ms" or "1m 3s" into seconds"""
+    return sum(float(value) * DURATION_UNITS[unit] for value, unit in DURATION_REGEX.findall(text))
+
+
+class BuildProfiler:
+    """Per-module profile of a `lake build` from its progress lines.
+
+    Feed it the build output as it streams (see `capture`) to record when
+    each job starts and finishes, then call `report` for the slowest
+    modules, CPU versus wall time, achieved parallelism and the critical
+    path through the import graph.
+
+    Example:
+        >>> profiler = BuildProfiler(repo.cwd)
+        >>> repo.lake_build(profiler=profiler)
+        >>> profiler.report()["critical_path"]
+    """
+
+    def __init__(self, root: Union[str, Path]):
+        """
+        Args:
+            root: Root of the Lean project, used to resolve module imports
+        """
+        self.root = Path(root)
+        self.jobs: Dict[str, Dict[str, float]] = {}
+        self.started_at = None
+        self.finished_at = None
+        self._cpu_time = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Mark the start of the build."""
+        self.started_at = time.monotonic()
+
+    def finish(self) -> None:
+        """Mark the end of the build."""
+        self.finished_at = time.monotonic()
+
+    @contextmanager
+    def running(self) -> Generator[None, None, None]:
+        """Context manager marking the start and end of the build run inside it.
+
+        The CPU time of the lake process and the jobs it waited for is read
+        from `os.wait4` when lake exits, so other commands running at the
+        same time are not counted. It is not available on Windows or for
+        builds run by AsyncLeanRepo.
+        """
+        self.start()
+        try:
+            with tracing.span('build profile', always=True) as span:
+                yield
+        finally:
+            self.finish()
+        if 'user_time' in span.attrs:
+            self._cpu_time = span.attrs['user_time'] + span.attrs['system_time']
+
+    def capture(self, capture: Optional[OutputCapture] = None) -> OutputCapture:
+        """Get capture settings that also feed every output line to this profiler.
+
+        Args:
+            capture: Settings to extend (default: OutputCapture())
+
+        Returns:
+            OutputCapture: Copy of the settings with the profiler attached
+        """
+        capture = copy.copy(capture) if capture is not None else OutputCapture()
+        previous = capture.on_line
+
+        def on_line(line: str) -> None:
+            self.feed(line)
+            if previous is not None:
+                previous(line)
+
+        capture.on_line = on_line
+        return capture
+
+    def feed(self, line: str, now: Optional[float] = None) -> None:
+        """Record a line of build output.
+
+        Args:
+            line: Output line
+            now: Monotonic timestamp of the line (default: current time)
+        """
+        match = PROGRESS_REGEX.match(line)
+        if not match:
+            return
+        now = time.monotonic() if now is None else now
+        name = match.group('name')
+        with self._lock:
+            if self.started_at is None:
+                self.started_at = now
+            job = self.jobs.setdefault(name, {})
+            if match.group('duration'):
+                duration = parse_duration(match.group('duration'))
+                job['end'] = now
+                job['start'] = min(job.get('start', now), now - duration)
+                job['duration'] = duration
+            elif match.group('verb') in ('Building', 'Compiling'):
+                job['start'] = now
+            elif 'start' in job:
+                job['end'] = now
+                job['duration'] = now - job['start']
+
+    def _module_imports(self, module: str, roots: List[Path], cache: Dict[str, List[str]]) -> List[str]:
+        """Get the modules imported by a module found under one of `roots`."""
+        if module not in cache:
+            rel = Path(*module.split('.')).with_suffix('.lean')
+            cache[module] = []
+            for root in roots:
+                path = root / rel
+                if path.is_file():
+                    try:
+                        cache[module] = split_imports(path.read_text(encoding='utf-8'))[0]
+                    except Exception as e:
+                        logger.debug(f"Failed to read imports of {module}: {e}")
+                    break
+        return cache[module]
+
+    def critical_path(self) -> Dict[str, Any]:
+        """Find the chain of imports with the largest total build time.
+
+        Returns:
+            Dict with the modules on the path (first built first) and its duration
+        """
+        durations = {name: job['duration'] for name, job in self.jobs.items()
+                     if 'duration' in job and ':' not in name}
+        roots = [self.root] + sorted((self.root / '.lake' / 'packages').glob('*'))
+        imports_cache: Dict[str, List[str]] = {}
+        best: Dict[str, float] = {}
+        parent: Dict[str, Optional[str]] = {}
+
+        def visit(module: str, stack: set) -> float:
+            if module in best:
+                return best[module]
+            stack.add(module)
+            best_dep, best_time = None, 0.0
+            for dep in self._module_imports(module, roots, imports_cache):
+                if dep in durations and dep not in stack:
+                    dep_time = visit(dep, stack)
+                    if dep_time > best_time:
+                        best_dep, best_time = dep, dep_time
+            stack.discard(module)
+            best[module] = durations[module] + best_time
+            parent[module] = best_dep
+            return best[module]
+
+        for module in durations:
+            visit(module, set())
+        if not best:
+            return {'modules': [], 'duration': 0.0}
+        module = max(best, key=best.get)
+        total = best[module]
+        path = []
+        while module is not None:
+            path.append(module)
+            module = parent[module]
+        return {'modules': path[::-1], 'duration': total}
+
+    def report(self, top: int = 10) -> Dict[str, Any]:
+        """Summarize the recorded build.
+
+        Args:
+            top: Number of slowest jobs to list
+
+        Returns:
+            Dict containing the build profile
+        """
+        with self._lock:
+            jobs = {name: dict(job) for name, job in self.jobs.items() if 'duration' in job}
+        origin = self.started_at or 0.0
+        end = self.finished_at or max((job['end'] for job in jobs.values()), default=origin)
+        wall_time = max(end - origin, 0.0)
+        job_time = sum(job['duration'] for job in jobs.values())
+        slowest = sorted(jobs.items(), key=lambda item: item[1]['duration'], reverse=True)[:top]
+        return {
+            'wall_time': wall_time,
+            'job_time': job_time,
+            'cpu_time': self._cpu_time,
+            'parallelism': job_time / wall_time if wall_time > 0 else 0.0,
+            'jobs': len(jobs),
+            'slowest': [{
+                'name': name,
+                'duration': job['duration'],
+                'start': job['start'] - origin,
+                'end': job['end'] - origin,
+            } for name, job in slowest],
+            'critical_path': self.critical_path(),
+        }
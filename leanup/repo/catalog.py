@@ -0,0 +1,635 @@
+import functools
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Generator, List, Optional, Tuple, Union
+
+from leanup.const import LEANUP_CACHE_DIR
+from leanup.utils.custom_logger import setup_logger
+
+logger = setup_logger("repo_catalog")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS repos (
+    path TEXT PRIMARY KEY,
+    parent TEXT NOT NULL,
+    name TEXT NOT NULL,
+    url TEXT,
+    toolchain TEXT,
+    commit_hash TEXT,
+    size INTEGER,
+    lake_size INTEGER,
+    last_build REAL,
+    build_duration REAL,
+    build_ok INTEGER,
+    updated REAL NOT NULL,
+    parts TEXT
+);
+CREATE INDEX IF NOT EXISTS repos_parent ON repos (parent, name);
+"""
+
+# Suffix of the directory `RepoManager.create_sandboxes` puts next to a repository
+SANDBOX_SUFFIX = '.sandboxes'
+
+# Columns `RepoCatalog.entries` can filter on, by their name in `--filter`
+FILTER_FIELDS = {
+    'name': 'name',
+    'url': 'url',
+    'toolchain': 'toolchain',
+    'commit': 'commit_hash',
+}
+
+
+def tree_size(path: Union[str, Path], exclude: Optional[List[str]] = None) -> int:
+    """Bytes used by the files under a directory, not following symlinks.
+
+    Files hard-linked several times within the tree are counted once.
+
+    Args:
+        path: Directory
+        exclude: Directories below `path` that are not counted
+    """
+    total = 0
+    seen = set()
+    skip = set(exclude or [])
+    stack = [str(path)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.path not in skip:
+                                stack.append(entry.path)
+                            continue
+                        stat = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    if stat.st_nlink > 1:
+                        if (stat.st_dev, stat.st_ino) in seen:
+                            continue
+                        seen.add((stat.st_dev, stat.st_ino))
+                    total += stat.st_size
+        except OSError:
+            continue
+    return total
+
+
+def repo_sizes(path: Union[str, Path]) -> Tuple[int, int]:
+    """Size of a checkout and of its `.lake` directory, in one walk.
+
+    Returns:
+        Tuple of the total size and the `.lake` size in bytes
+    """
+    total = lake = 0
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        size = tree_size(entry.path)
+                        if entry.name == '.lake':
+                            lake = size
+                    else:
+                        size = entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    continue
+                total += size
+    except OSError:
+        pass
+    return total, lake
+
+
+def _dir_stamp(path: str) -> List[int]:
+    """Modification times of a directory and of the directories two levels below it.
+
+    Lake adds directories for new namespaces and output kinds here, so the
+    stamp tells a build directory changed without walking it.
+    """
+    stamp = []
+    level = [path]
+    for depth in range(3):
+        below = []
+        for directory in level:
+            try:
+                stamp.append(os.stat(directory).st_mtime_ns)
+                if depth < 2:
+                    with os.scandir(directory) as it:
+                        below.extend(entry.path for entry in it if entry.is_dir(follow_symlinks=False))
+            except OSError:
+                continue
+        level = sorted(below)
+    return stamp
+
+
+def repo_parts(path: Union[str, Path], previous: Optional[Dict[str, list]] = None,
+               changed: Tuple[str, ...] = ()) -> Dict[str, list]:
+    """Sizes of the parts of a checkout, measuring only the parts that changed.
+
+    The parts are the checkout outside `.lake` (".") and every entry of
+    `.lake`, with each package split into its sources and its
+    `.lake/build`. Each size is kept with a stamp: the checked out commit
+    for the checkout and package sources, the modification time for files
+    and `_dir_stamp` for other directories. A part is measured again when
+    its stamp differs from `previous` or it is listed in `changed`.
+
+    Args:
+        path: Checkout directory
+        previous: Parts returned for the checkout before (default: measure everything)
+        changed: Parts to measure in any case, e.g. ".lake/build" after a build
+
+    Returns:
+        Dict mapping each part to its size in bytes and its stamp
+    """
+    from .manager import RepoManager
+    previous = previous or {}
+    parts = {}
+
+    def measure(name: str, stamp: Any, size: Callable[[], int]) -> None:
+        known = previous.get(name)
+        if known is not None and name not in changed and known[1] == stamp:
+            parts[name] = known
+        else:
+            parts[name] = [size(), stamp]
+
+    def measure_entry(name: str, entry: os.DirEntry) -> None:
+        if entry.is_dir(follow_symlinks=False):
+            measure(name, _dir_stamp(entry.path), lambda: tree_size(entry.path))
+        else:
+            stat = entry.stat(follow_symlinks=False)
+            measure(name, stat.st_mtime_ns, lambda: stat.st_size)
+
+    path = str(path)
+    lake = os.path.join(path, '.lake')
+    measure('.', RepoManager(path).head_commit(), lambda: tree_size(path, exclude=[lake]))
+    try:
+        with os.scandir(lake) as it:
+            lake_entries = sorted(it, key=lambda entry: entry.name)
+    except OSError:
+        lake_entries = []
+    for entry in lake_entries:
+        try:
+            if entry.name != 'packages' or not entry.is_dir(follow_symlinks=False):
+                measure_entry(f".lake/{entry.name}", entry)
+                continue
+            with os.scandir(entry.path) as it:
+                packages = sorted(it, key=lambda package: package.name)
+        except OSError:
+            continue
+        for package in packages:
+            name = f".lake/packages/{package.name}"
+            try:
+                if not package.is_dir(follow_symlinks=False):
+                    measure_entry(name, package)
+                    continue
+                build = os.path.join(package.path, '.lake', 'build')
+                # Sources change with the commit, builds are measured apart
+                measure(name, RepoManager(package.path).head_commit(),
+                        lambda: tree_size(package.path, exclude=[build]))
+                if os.path.isdir(build):
+                    measure(f"{name}/.lake/build", _dir_stamp(build), lambda: tree_size(build))
+            except OSError:
+                continue
+    return parts
+
+
+def read_entry(path: Union[str, Path], previous: Optional[Dict[str, list]] = None,
+               changed: Tuple[str, ...] = ()) -> Dict[str, Any]:
+    """Read the state of a directory into a catalog entry, without storing it.
+
+    Args:
+        path: Repository directory
+        previous: Parts of the stored entry, see `repo_parts`
+        changed: Parts to measure again in any case
+
+    Returns:
+        Entry with the fields of the catalog; build fields and the URL are None
+    """
+    from .manager import RepoManager
+    path = Path(path).resolve()
+    try:
+        toolchain = (path / "lean-toolchain").read_text(encoding='utf-8').strip() or None
+    except OSError:
+        toolchain = None
+    parts = repo_parts(path, previous, changed)
+    size = sum(part[0] for part in parts.values())
+    return {
+        'path': str(path),
+        'parent': str(path.parent),
+        'name': path.name,
+        'url': None,
+        'toolchain': toolchain,
+        'commit_hash': RepoManager(path).head_commit(),
+        'size': size,
+        'lake_size': size - parts['.'][0],
+        'last_build': None,
+        'build_duration': None,
+        'build_ok': None,
+        'updated': time.time(),
+        'parts': parts,
+    }
+
+
+def matches_filters(entry: Dict[str, Any], filters: Dict[str, str]) -> bool:
+    """Check an entry against glob patterns by field, like `RepoCatalog.entries`.
+
+    Raises:
+        ValueError: If a filter field is unknown
+    """
+    import fnmatch
+    for field, pattern in filters.items():
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Unknown field {field!r}, expected one of {', '.join(FILTER_FIELDS)}")
+        value = entry.get(FILTER_FIELDS[field])
+        if value is None or not fnmatch.fnmatchcase(value, pattern):
+            return False
+    return True
+
+
+class RepoLock:
+    """Advisory lock marking a repository as in use.
+
+    Users of a repository hold a shared lock, and eviction takes an
+    exclusive one, so a checkout is never deleted while any process works
+    in it. Taking a shared lock also sets the lock file's modification
+    time, which records when the repository was last used. On platforms
+    without `fcntl` locking is a no-op.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        """
+        Args:
+            path: Lock file
+        """
+        self.path = Path(path)
+        self._file = None
+
+    def acquire(self, exclusive: bool = False, blocking: bool = True) -> bool:
+        """Take the lock.
+
+        Args:
+            exclusive: Take an exclusive lock instead of a shared one
+            blocking: Wait for other holders instead of failing
+
+        Returns:
+            bool: True if the lock is held
+        """
+        if self._file is not None:
+            return True
+        while True:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                created = not self.path.exists()
+                lock_file = open(self.path, 'a')
+            except OSError as e:
+                logger.debug(f"Failed to open lock {self.path}: {e}")
+                return False
+            try:
+                import fcntl
+                flags = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+                fcntl.flock(lock_file, flags if blocking else flags | fcntl.LOCK_NB)
+            except ImportError:
+                break
+            except OSError:
+                lock_file.close()
+                return False
+            # Eviction unlinks the file of a deleted checkout; a lock on it protects nothing
+            try:
+                if os.path.samestat(os.fstat(lock_file.fileno()), os.stat(self.path)):
+                    break
+            except OSError:
+                pass
+            lock_file.close()
+        try:
+            if not exclusive:
+                os.utime(self.path)
+            elif created:
+                # Checking a repository for eviction does not count as using it
+                os.utime(self.path, (0, 0))
+        except OSError:
+            pass
+        self._file = lock_file
+        return True
+
+    def release(self) -> None:
+        """Release the lock if it is held"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> 'RepoLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.release()
+
+
+class RepoCatalog:
+    """SQLite catalog of cached repositories.
+
+    Install, sync and build store each repository's toolchain, checked out
+    commit, disk and `.lake` sizes and its last build, so listing many
+    repositories does not have to open or walk any of them. Writes open a
+    short-lived connection, so several processes can update the catalog.
+
+    Example:
+        >>> catalog = RepoCatalog()
+        >>> catalog.update(path, build_duration=12.5, build_ok=True)
+        >>> catalog.entries(filters={'toolchain': '*v4.9.0'})
+    """
+
+    def __init__(self, path: Optional[Union[str, Path]] = None):
+        """Initialize the catalog.
+
+        Args:
+            path: Database file (default: LEANUP_CACHE_DIR/catalog.db)
+        """
+        self.path = Path(path) if path else LEANUP_CACHE_DIR / "catalog.db"
+        self.cache_dir = self.path.parent.resolve()
+        self.lock_dir = self.path.parent / "locks"
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        import sqlite3
+        if not self._initialized:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path), timeout=10)
+        conn.row_factory = sqlite3.Row
+        if not self._initialized:
+            with self._lock:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(SCHEMA)
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(repos)")}
+                if 'parts' not in columns:
+                    # Catalogs written before sizes were kept per part
+                    conn.execute("ALTER TABLE repos ADD COLUMN parts TEXT")
+                self._initialized = True
+        return conn
+
+    def _execute(self, sql: str, params: Any = ()) -> bool:
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute(sql, params)
+            finally:
+                conn.close()
+            return True
+        except Exception as e:
+            logger.error(f"Failed to update repository catalog {self.path}: {e}")
+            return False
+
+    def update(self, repo_path: Union[str, Path], url: Optional[str] = None,
+               build_duration: Optional[float] = None, build_ok: Optional[bool] = None,
+               build_time: Optional[float] = None, rescan: bool = False,
+               changed: Tuple[str, ...] = ()) -> bool:
+        """Read the state of a repository and store it.
+
+        Build fields are kept from the previous entry unless a build is given.
+        Sizes are updated incrementally: only the parts of the checkout whose
+        stamp changed are measured again, see `repo_parts`, and after a
+        build the project's `.lake/build`.
+
+        Args:
+            repo_path: Repository directory
+            url: Upstream URL, kept from the previous entry if not given
+            build_duration: Duration of the build just run, in seconds
+            build_ok: Whether that build succeeded
+            build_time: Time the build finished (default: now)
+            rescan: Measure the whole checkout again
+            changed: Parts to measure again in any case
+
+        Returns:
+            bool: True if the entry was stored
+        """
+        path = Path(repo_path).resolve()
+        if not path.is_dir():
+            return False
+        previous = None if rescan else self.get(path)
+        if build_duration is not None:
+            changed = changed + ('.lake/build',)
+        entry = read_entry(path, previous['parts'] if previous else None, changed)
+        if build_duration is not None:
+            build_time = build_time or entry['updated']
+            build_ok = True if build_ok is None else bool(build_ok)
+        return self._execute(
+            "INSERT INTO repos (path, parent, name, url, toolchain, commit_hash, size, lake_size,"
+            " last_build, build_duration, build_ok, updated, parts)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (path) DO UPDATE SET url = COALESCE(excluded.url, url),"
+            " toolchain = excluded.toolchain, commit_hash = excluded.commit_hash,"
+            " size = excluded.size, lake_size = excluded.lake_size,"
+            " last_build = COALESCE(excluded.last_build, last_build),"
+            " build_duration = COALESCE(excluded.build_duration, build_duration),"
+            " build_ok = COALESCE(excluded.build_ok, build_ok), updated = excluded.updated,"
+            " parts = excluded.parts",
+            (entry['path'], entry['parent'], entry['name'], url, entry['toolchain'], entry['commit_hash'],
+             entry['size'], entry['lake_size'], build_time, build_duration,
+             None if build_ok is None else int(build_ok), entry['updated'], json.dumps(entry['parts'])))
+
+    def set_sizes(self, repo_path: Union[str, Path], size: int, lake_size: int,
+                  parts: Optional[Dict[str, list]] = None) -> bool:
+        """Store sizes known without walking the repository, e.g. after deleting part of it.
+
+        Args:
+            repo_path: Repository directory
+            size: Total size in bytes
+            lake_size: Size of `.lake` in bytes
+            parts: Parts left, see `repo_parts` (default: measure all parts on the next update)
+
+        Returns:
+            bool: True if the catalog was updated
+        """
+        return self._execute("UPDATE repos SET size = ?, lake_size = ?, parts = ? WHERE path = ?",
+                             (size, lake_size, None if parts is None else json.dumps(parts),
+                              str(Path(repo_path).resolve())))
+
+    def lock(self, repo_path: Union[str, Path]) -> RepoLock:
+        """Get the in-use lock of a repository, not yet acquired.
+
+        Sandboxes in `<name>.sandboxes` share the lock of repository
+        `<name>`, whose objects and dependencies they use.
+        """
+        path = Path(repo_path).resolve()
+        if path.parent.name.endswith(SANDBOX_SUFFIX):
+            path = path.parent.with_name(path.parent.name[:-len(SANDBOX_SUFFIX)])
+        digest = hashlib.sha256(str(path).encode()).hexdigest()[:16]
+        return RepoLock(self.lock_dir / f"{digest}.lock")
+
+    @contextmanager
+    def in_use(self, repo_path: Union[str, Path]) -> Generator[bool, None, None]:
+        """Mark a cached repository as in use, keeping it from being evicted.
+
+        Only repositories under the cache directory can be evicted, so
+        other paths are not locked. Waits while an eviction of the
+        repository is running.
+
+        Args:
+            repo_path: Repository directory
+
+        Yields:
+            bool: True if a lock is held
+        """
+        path = Path(repo_path).resolve()
+        if self.cache_dir not in path.parents:
+            yield False
+            return
+        existed = path.exists()
+        lock = self.lock(path)
+        held = lock.acquire()
+        try:
+            if existed and not path.exists():
+                logger.error(f"{path} was evicted from the cache while waiting for it")
+            yield held
+        finally:
+            lock.release()
+
+    def last_access(self, entry: Dict[str, Any]) -> float:
+        """Time a cataloged repository was last used, built or updated"""
+        try:
+            used = self.lock(entry['path']).path.stat().st_mtime
+        except OSError:
+            used = 0.0
+        return max(used, entry['last_build'] or 0.0, entry['updated'])
+
+    def remove(self, repo_path: Union[str, Path]) -> bool:
+        """Drop the entry of a repository.
+
+        Returns:
+            bool: True if the catalog was updated
+        """
+        return self._execute("DELETE FROM repos WHERE path = ?", (str(Path(repo_path).resolve()),))
+
+    def entries(self, parent: Optional[Union[str, Path]] = None,
+                filters: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
+        """Get catalog entries ordered by name.
+
+        Args:
+            parent: Only repositories directly under this directory
+            filters: Glob patterns by field (name, url, toolchain or commit),
+                e.g. {'toolchain': '*v4.9.0'}
+
+        Returns:
+            List of entries as dicts
+
+        Raises:
+            ValueError: If a filter field is unknown
+        """
+        clauses, params = [], []
+        if parent is not None:
+            clauses.append("parent = ?")
+            params.append(str(Path(parent).resolve()))
+        for field, pattern in (filters or {}).items():
+            if field not in FILTER_FIELDS:
+                raise ValueError(f"Unknown field {field!r}, expected one of {', '.join(FILTER_FIELDS)}")
+            clauses.append(f"{FILTER_FIELDS[field]} GLOB ?")
+            params.append(pattern)
+        return self._select(clauses, params)
+
+    def _select(self, clauses: List[str], params: List[Any]) -> List[Dict[str, Any]]:
+        if not self.path.exists():
+            return []
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        try:
+            conn = self._connect()
+            try:
+                rows = conn.execute(f"SELECT * FROM repos{where} ORDER BY name, path", params).fetchall()
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.error(f"Failed to read repository catalog {self.path}: {e}")
+            return []
+        entries = [dict(row) for row in rows]
+        for entry in entries:
+            entry['parts'] = json.loads(entry['parts']) if entry['parts'] else None
+        return entries
+
+    def get(self, repo_path: Union[str, Path]) -> Optional[Dict[str, Any]]:
+        """Get the entry of a repository, or None if it is not cataloged"""
+        rows = self._select(["path = ?"], [str(Path(repo_path).resolve())])
+        return rows[0] if rows else None
+
+    def refresh(self, parent: Union[str, Path]) -> Tuple[int, int]:
+        """Bring the entries under a directory in line with its contents.
+
+        Git checkouts missing from the catalog, e.g. installed by an older
+        version, are added and entries of deleted directories are dropped.
+        Known repositories are not read again. Sandbox directories and
+        other directories that are not checkouts are ignored.
+
+        Args:
+            parent: Directory of cached repositories
+
+        Returns:
+            Tuple of the number of entries added and removed
+        """
+        parent = Path(parent).resolve()
+        try:
+            present = {entry.name for entry in os.scandir(parent)
+                       if entry.is_dir() and not entry.name.endswith(SANDBOX_SUFFIX)
+                       and os.path.exists(os.path.join(entry.path, ".git"))}
+        except OSError:
+            present = set()
+        known = {entry['name'] for entry in self.entries(parent=parent)}
+        added = sum(self.update(parent / name) for name in sorted(present - known))
+        removed = sum(self.remove(parent / name) for name in sorted(known - present))
+        return added, removed
+
+
+_default_catalog: Optional[RepoCatalog] = None
+
+
+def default_catalog() -> RepoCatalog:
+    """Get the catalog under LEANUP_CACHE_DIR shared by the process"""
+    global _default_catalog
+    if _default_catalog is None:
+        _default_catalog = RepoCatalog()
+    return _default_catalog
+
+
+def _refresh_entry(repo_path: Path, result: Any, build: bool, duration: float) -> None:
+    """Update the entry of a cataloged repository after an operation changed it."""
+    catalog = default_catalog()
+    if catalog.get(repo_path) is None:
+        return
+    if build:
+        ok = isinstance(result, tuple) and len(result) == 3 and result[2] == 0
+        catalog.update(repo_path, build_duration=duration, build_ok=ok)
+    else:
+        catalog.update(repo_path)
+
+
+def updates_catalog(build: bool = False):
+    """Decorator updating the catalog entry of `self.cwd` after a repository operation.
+
+    Repositories that are not cataloged are left alone. Coroutine results
+    are awaited first, and the entry is then updated in a worker thread.
+
+    Args:
+        build: The operation is a build returning (stdout, stderr, returncode),
+            whose time, duration and result are stored too
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            start = time.monotonic()
+            result = func(self, *args, **kwargs)
+            if inspect.isawaitable(result):
+                async def finish():
+                    import asyncio
+                    value = await result
+                    await asyncio.get_running_loop().run_in_executor(
+                        None, _refresh_entry, self.cwd, value, build, time.monotonic() - start)
+                    return value
+                return finish()
+            _refresh_entry(self.cwd, result, build, time.monotonic() - start)
+            return result
+        return wrapper
+    return decorator
@@ -1,24 +1,45 @@
+import hashlib
+import json
 import re
 import os
+import platform
 import shutil
 import subprocess
+import threading
 from pathlib import Path
-from typing import Optional, List, Dict
-import requests
+from typing import Optional, List, Dict, Tuple, Any
 
-from leanup.const import OS_TYPE
+from leanup.const import LEANUP_CACHE_DIR, OS_TYPE
 from leanup.utils.basic import execute_command, working_directory
+from leanup.utils import metrics, tracing
+from leanup.utils.archive import extract_archive, zstd_available
 from leanup.utils.custom_logger import setup_logger
 
 logger = setup_logger("elan_manager")
 
+LEAN_RELEASE_URL = "https://github.com/{origin}/releases/download/{tag}/{asset}"
+
 class ElanManager:
     """Elan toolchain manager"""
 
+    # Resolved toolchain bin directories, keyed by (elan_home, toolchain)
+    _toolchain_bin_cache: Dict[Tuple[str, str], Path] = {}
+
     def __init__(self):
         self.elan_home = Path(os.environ.get('ELAN_HOME', Path.home() / '.elan'))
         self.elan_bin_dir = self.elan_home / 'bin'
+        self._downloader = None
+        home_key = hashlib.sha256(str(self.elan_home).encode()).hexdigest()[:16]
+        self.status_cache_path = LEANUP_CACHE_DIR / "elan" / f"status-{home_key}.json"
         
+    @property
+    def downloader(self) -> 'Downloader':
+        """Download cache shared by elan installer and toolchain downloads"""
+        if self._downloader is None:
+            from leanup.utils.download import Downloader
+            self._downloader = Downloader()
+        return self._downloader
+    
     def get_elan_executable(self) -> Optional[Path]:
         """Get elan executable file path"""
         elan_exe = 'elan.exe' if OS_TYPE == 'Windows' else 'elan'
@@ -34,13 +55,55 @@ class ElanManager:
             
         return None
     
+    @staticmethod
+    def toolchain_dir_name(toolchain: str) -> str:
+        """Get the directory name elan uses for a toolchain under $ELAN_HOME/toolchains.
+        
+        Example:
+            leanprover/lean4:v4.9.0 -> leanprover--lean4---v4.9.0
+        """
+        return toolchain.strip().replace('/', '--').replace(':', '---')
+    
+    def resolve_toolchain_bin(self, toolchain: Optional[str]) -> Optional[Path]:
+        """Resolve a `lean-toolchain` value to the bin directory of an installed toolchain.
+        
+        Results are cached per process, so calling the real `lake`/`lean`
+        binaries skips the elan proxy. Channels such as `stable` and
+        toolchains that are not installed resolve to None, in which case
+        callers should go through the elan shim.
+        
+        Args:
+            toolchain: Toolchain name, e.g. leanprover/lean4:v4.9.0
+            
+        Returns:
+            Path to the toolchain bin directory, or None
+        """
+        if not toolchain:
+            return None
+        toolchain = toolchain.strip()
+        key = (str(self.elan_home), toolchain)
+        bin_dir = self._toolchain_bin_cache.get(key)
+        if bin_dir is not None and bin_dir.is_dir():
+            return bin_dir
+        candidates = [toolchain]
+        if ':' not in toolchain and '/' not in toolchain:
+            candidates.append(f"leanprover/lean4:{toolchain}")
+        lake_exe = 'lake.exe' if OS_TYPE == 'Windows' else 'lake'
+        for name in candidates:
+            bin_dir = self.elan_home / 'toolchains' / self.toolchain_dir_name(name) / 'bin'
+            if (bin_dir / lake_exe).is_file():
+                self._toolchain_bin_cache[key] = bin_dir
+                return bin_dir
+        self._toolchain_bin_cache.pop(key, None)
+        return None
+    
     def is_elan_installed(self) -> bool:
         """Check if elan is installed"""
         return self.get_elan_executable() is not None
     
-    def get_elan_version(self) -> Optional[str]:
+    def get_elan_version(self, elan_path: Optional[Path] = None) -> Optional[str]:
         """Get installed elan version"""
-        elan_path = self.get_elan_executable()
+        elan_path = elan_path or self.get_elan_executable()
         if not elan_path:
             return None
             
@@ -60,26 +123,14 @@ class ElanManager:
             return None
     
     def download(self, url: str, target_path: Path) -> bool:
-        """Download elan installer"""
-        try:
-            logger.info(f"Downloading elan installer: {url}")
-            
-            response = requests.get(url, stream=True)
-            response.raise_for_status()
-            
-            target_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            with open(target_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-                
-            logger.info(f"Download completed: {target_path}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Failed to download elan installer: {e}")
+        """Download a file through the shared download cache"""
+        logger.info(f"Downloading: {url}")
+        if not self.downloader.download(url, target_path):
             return False
+        logger.info(f"Download completed: {target_path}")
+        return True
     
+    @tracing.traced('elan.install_elan')
     def install_elan(self, force: bool = False) -> bool:
         """Install elan with optional version specification.
         
@@ -143,6 +194,7 @@ class ElanManager:
             logger.error(f"Error occurred during elan installation: {e}")
             return False
     
+    @tracing.traced('elan.proxy', lambda self, args: {'argv': ['elan'] + list(args)})
     def proxy_elan_command(self, args: List[str]) -> int:
         """Proxy execute elan command with streaming output"""
         elan_path = self.get_elan_executable()
@@ -162,40 +214,310 @@ class ElanManager:
             logger.error(f"Failed to execute elan command: {e}")
             return 1
     
-    def get_installed_toolchains(self) -> List[str]:
-        """Get list of installed toolchains"""
+    @staticmethod
+    def release_platform() -> Optional[str]:
+        """Get the platform suffix of Lean release archives, e.g. linux or darwin_aarch64"""
+        name = {'Linux': 'linux', 'MacOS': 'darwin', 'Windows': 'windows'}.get(OS_TYPE)
+        if name is None:
+            return None
+        return f"{name}_aarch64" if platform.machine().lower() in ('aarch64', 'arm64') else name
+    
+    def toolchain_release(self, toolchain: str) -> Optional[Dict[str, Any]]:
+        """Resolve a toolchain to the Lean release archives it is installed from.
+        
+        Only pinned releases and nightlies can be resolved; channels such
+        as `stable` need elan to look up the current version.
+        
+        Args:
+            toolchain: Toolchain name, e.g. leanprover/lean4:v4.9.0 or v4.9.0
+            
+        Returns:
+            Dict with the full toolchain name and a list of (archive name, URL)
+            in order of preference, or None
+        """
+        origin, _, tag = toolchain.strip().rpartition(':')
+        origin = origin or 'leanprover/lean4'
+        if re.fullmatch(r'\d+\.\d+\.\d+(-rc\d+)?', tag):
+            tag = 'v' + tag
+        if origin == 'leanprover/lean4' and re.fullmatch(r'v\d+\.\d+\.\d+(-rc\d+)?', tag):
+            version = tag[1:]
+        elif origin == 'leanprover/lean4-nightly' and re.fullmatch(r'nightly-\d{4}-\d{2}-\d{2}', tag):
+            version = tag
+        else:
+            return None
+        platform_name = self.release_platform()
+        if platform_name is None:
+            return None
+        formats = ['tar.zst', 'zip'] if zstd_available() else ['zip']
+        assets = [f"lean-{version}-{platform_name}.{fmt}" for fmt in formats]
+        return {
+            'name': f"{origin}:{tag}",
+            'assets': [(asset, LEAN_RELEASE_URL.format(origin=origin, tag=tag, asset=asset))
+                       for asset in assets],
+        }
+    
+    def _release_checksum(self, url: str) -> Optional[str]:
+        """Get the published SHA-256 of a release archive from its `.sha256` asset, if there is one."""
+        from leanup.utils.download import DownloadError
+        try:
+            text = self.downloader.fetch(url + '.sha256').read_text(encoding='utf-8', errors='replace')
+        except DownloadError as e:
+            logger.debug(f"No checksum published for {url}: {e}")
+            return None
+        # sha256sum format: <digest>  <file name>
+        digest = text.split()[0].lower() if text.split() else ''
+        if not re.fullmatch(r'[0-9a-f]{64}', digest):
+            logger.warning(f"Ignoring malformed checksum of {url}")
+            return None
+        return digest
+    
+    def _release_archive(self, release: Dict[str, Any],
+                         mirror_dir: Optional[Path]) -> Optional[Tuple[Path, str]]:
+        """Get a release archive and its name from the mirror directory, or download it and add it there.
+        
+        Archives are checked against their published checksum, which is kept
+        next to the archive in the mirror directory.
+        """
+        from leanup.utils.download import DownloadError, file_sha256
+        if mirror_dir is not None:
+            for asset, url in release['assets']:
+                if not (mirror_dir / asset).is_file():
+                    continue
+                checksum = mirror_dir / f"{asset}.sha256"
+                if checksum.is_file():
+                    expected = checksum.read_text(encoding='utf-8', errors='replace').split()[:1]
+                    if expected != [file_sha256(mirror_dir / asset)]:
+                        logger.warning(f"Mirrored archive {mirror_dir / asset} does not match its checksum")
+                        continue
+                logger.debug(f"Using mirrored archive {mirror_dir / asset}")
+                return mirror_dir / asset, asset
+        for asset, url in release['assets']:
+            sha256 = self._release_checksum(url)
+            try:
+                path = self.downloader.fetch(url, sha256=sha256)
+            except DownloadError as e:
+                logger.debug(f"Archive {asset} is not available: {e}")
+                continue
+            if mirror_dir is not None:
+                try:
+                    mirror_dir.mkdir(parents=True, exist_ok=True)
+                    tmp = mirror_dir / f".{asset}.{os.getpid()}.tmp"
+                    shutil.copyfile(path, tmp)
+                    os.replace(tmp, mirror_dir / asset)
+                    if sha256:
+                        tmp.write_text(f"{sha256}  {asset}\n", encoding='utf-8')
+                        os.replace(tmp, mirror_dir / f"{asset}.sha256")
+                except OSError as e:
+                    logger.warning(f"Failed to add {asset} to mirror {mirror_dir}: {e}")
+            return path, asset
+        return None
+    
+    def install_release(self, toolchain: str, mirror_dir: Optional[Path] = None, force: bool = False) -> bool:
+        """Install a Lean release into $ELAN_HOME/toolchains without going through elan.
+        
+        The release archive is taken from `mirror_dir` if present there, or
+        downloaded into the shared download cache (and copied to
+        `mirror_dir`), then decompressed straight into the toolchain
+        directory. elan discovers toolchains by that directory, so the
+        result shows up in `elan toolchain list`.
+        
+        Args:
+            toolchain: Toolchain name, e.g. leanprover/lean4:v4.9.0
+            mirror_dir: Directory of release archives shared between nodes
+            force: Reinstall even if the toolchain is installed
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        release = self.toolchain_release(toolchain)
+        if release is None:
+            logger.error(f"No release archive for toolchain {toolchain}")
+            return False
+        toolchains_dir = self.elan_home / 'toolchains'
+        dest = toolchains_dir / self.toolchain_dir_name(release['name'])
+        if not force and self.resolve_toolchain_bin(release['name']) is not None:
+            return True
+        archive = self._release_archive(release, Path(mirror_dir) if mirror_dir else None)
+        if archive is None:
+            logger.error(f"Failed to download toolchain {release['name']}")
+            return False
+        path, asset = archive
+        suffix = f"{os.getpid()}.{threading.get_ident()}"
+        tmp = toolchains_dir / f".{dest.name}.{suffix}.tmp"
+        old = toolchains_dir / f".{dest.name}.{suffix}.old"
+        try:
+            extract_archive(path, tmp, strip_components=1, name=asset)
+            # Move the old toolchain aside rather than deleting it in place, so
+            # `dest` is never seen half removed by a running lean
+            try:
+                os.replace(dest, old)
+            except FileNotFoundError:
+                pass
+            try:
+                os.replace(tmp, dest)
+            except OSError:
+                if not dest.exists():
+                    raise
+                # Installed by another process meanwhile
+                logger.info(f"Toolchain {release['name']} was installed concurrently")
+                return True
+        except Exception as e:
+            logger.error(f"Failed to extract toolchain {release['name']}: {e}")
+            return False
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+            shutil.rmtree(old, ignore_errors=True)
+        logger.info(f"Installed toolchain {release['name']} to {dest}")
+        return True
+    
+    @metrics.recorded('elan.install_toolchain', lambda self, toolchain, *args, **kwargs: {'toolchain': toolchain})
+    def install_toolchain(self, toolchain: str, mirror_dir: Optional[Path] = None, force: bool = False) -> bool:
+        """Install a toolchain unless it is already installed.
+
+        Pinned releases are installed directly from their archives; other
+        toolchains, and releases whose archive cannot be installed, go
+        through `elan toolchain install`.
+
+        Args:
+            toolchain: Toolchain name, e.g. leanprover/lean4:v4.9.0
+            mirror_dir: Directory of release archives shared between nodes
+            force: Reinstall even if the toolchain is installed
+
+        Returns:
+            bool: True if the toolchain is available, False otherwise
+        """
+        if not force and self.resolve_toolchain_bin(toolchain) is not None:
+            return True
+        if self.toolchain_release(toolchain) is not None and self.install_release(toolchain, mirror_dir, force):
+            return True
         elan_path = self.get_elan_executable()
         if not elan_path:
-            return []
+            logger.error("elan is not installed")
+            return False
+        cmd = [str(elan_path), 'toolchain', 'install', toolchain.strip()]
+        if force:
+            cmd.append('--force')
+        output, error, code = execute_command(cmd)
+        if code != 0:
+            logger.error(f"Failed to install toolchain {toolchain}: {error}")
+            return False
+        return True
+
+    def install_toolchains(self, toolchains: List[str], jobs: int = 4,
+                           mirror_dir: Optional[Path] = None, force: bool = False) -> Dict[str, bool]:
+        """Install several toolchains in parallel.
+
+        Args:
+            toolchains: Toolchain names
+            jobs: Number of toolchains downloaded and extracted at the same time
+            mirror_dir: Directory of release archives shared between nodes
+            force: Reinstall toolchains that are already installed
+
+        Returns:
+            Dict mapping each toolchain to whether it is available
+        """
+        if not toolchains:
+            return {}
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(toolchains)))) as executor:
+            futures = [executor.submit(tracing.in_context(self.install_toolchain), t, mirror_dir, force)
+                       for t in toolchains]
+            return {t: future.result() for t, future in zip(toolchains, futures)}
+
+    @staticmethod
+    def toolchain_name(dir_name: str) -> str:
+        """Get the toolchain name of a directory under $ELAN_HOME/toolchains.
         
+        Example:
+            leanprover--lean4---v4.9.0 -> leanprover/lean4:v4.9.0
+        """
+        return dir_name.replace('---', ':').replace('--', '/')
+    
+    def get_installed_toolchains(self) -> List[str]:
+        """Get list of installed toolchains from $ELAN_HOME/toolchains"""
+        toolchains_dir = self.elan_home / 'toolchains'
         try:
-            output, error, code = execute_command([str(elan_path), 'toolchain', 'list'])
-            if code == 0:
-                toolchains = []
-                for line in output.strip().split('\n'):
-                    line = line.strip()
-                    if line and not line.startswith('#'):
-                        # Remove status markers (like (default))
-                        toolchain = line.split()[0]
-                        toolchains.append(toolchain)
-                return toolchains
-            return []
-        except Exception as e:
-            logger.error(f"Failed to get toolchain list: {e}")
+            return sorted(self.toolchain_name(p.name) for p in toolchains_dir.iterdir()
+                          if p.is_dir() and not p.name.startswith('.'))
+        except OSError:
             return []
     
-    def get_status_info(self) -> Dict[str, any]:
-        """Get elan status information"""
+    def get_settings(self) -> Dict[str, Any]:
+        """Read the default toolchain and directory overrides from elan's settings.toml"""
+        settings = {'default_toolchain': None, 'overrides': {}}
+        try:
+            content = (self.elan_home / 'settings.toml').read_text(encoding='utf-8')
+        except OSError:
+            return settings
+        section = None
+        for line in content.splitlines():
+            line = line.strip()
+            header = re.fullmatch(r'\[(.+)\]', line)
+            if header:
+                section = header.group(1).strip()
+                continue
+            match = re.fullmatch(r'("(?:[^"\\]|\\.)*"|[\w-]+)\s*=\s*"((?:[^"\\]|\\.)*)"', line)
+            if not match:
+                continue
+            key, value = match.group(1).strip('"'), match.group(2)
+            if section is None and key == 'default_toolchain':
+                settings['default_toolchain'] = value
+            elif section == 'overrides':
+                settings['overrides'][key.replace('\\\\', '\\')] = value
+        return settings
+    
+    def _status_key(self, elan_path: Optional[Path]) -> List[Any]:
+        """Fingerprint of the elan installation: paths and modification times."""
+        def mtime(path: Optional[Path]) -> Optional[int]:
+            try:
+                return path.stat().st_mtime_ns if path else None
+            except OSError:
+                return None
+        return [str(self.elan_home), str(elan_path) if elan_path else None, mtime(elan_path),
+                mtime(self.elan_home / 'toolchains'), mtime(self.elan_home / 'settings.toml')]
+    
+    def get_status_info(self, refresh: bool = False) -> Dict[str, Any]:
+        """Get elan status information.
+        
+        Toolchains and the default toolchain are read from $ELAN_HOME. The
+        result is cached in `status_cache_path` keyed by the modification
+        times of the elan executable, the toolchains directory and
+        settings.toml, so `elan --version` only runs when one of them changed.
+        
+        Args:
+            refresh: Ignore the cached status
+            
+        Returns:
+            Dict containing status information
+        """
+        elan_path = self.get_elan_executable()
+        key = self._status_key(elan_path)
+        if not refresh:
+            try:
+                cached = json.loads(self.status_cache_path.read_text(encoding='utf-8'))
+                if cached.get('key') == key:
+                    return cached['info']
+            except (OSError, ValueError):
+                pass
+        
         info = {
-            'installed': self.is_elan_installed(),
+            'installed': elan_path is not None,
             'version': None,
             'elan_home': str(self.elan_home),
             'executable': None,
-            'toolchains': []
+            'toolchains': [],
+            'default_toolchain': None,
         }
-        
         if info['installed']:
-            info['version'] = self.get_elan_version()
-            info['executable'] = str(self.get_elan_executable())
+            info['version'] = self.get_elan_version(elan_path)
+            info['executable'] = str(elan_path)
             info['toolchains'] = self.get_installed_toolchains()
+            info['default_toolchain'] = self.get_settings()['default_toolchain']
+        try:
+            self.status_cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.status_cache_path.with_suffix(f'.{os.getpid()}.tmp')
+            tmp.write_text(json.dumps({'key': key, 'info': info}), encoding='utf-8')
+            os.replace(tmp, self.status_cache_path)
+        except OSError as e:
+            logger.debug(f"Failed to write elan status cache: {e}")
         return info
@@ -0,0 +1,200 @@
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from leanup.const import LEANUP_CACHE_DIR
+from leanup.utils.config import ConfigManager
+from leanup.utils.custom_logger import setup_logger
+from .catalog import RepoCatalog, SANDBOX_SUFFIX, default_catalog
+
+logger = setup_logger("cache_eviction")
+
+# Directories whose modification time tells a build outside LeanUp changed a checkout
+BUILD_DIRS = ['.lake', '.lake/build', '.lake/build/lib', '.lake/packages']
+
+# config.yaml key of the size budget of the repository cache, e.g. "200GiB"
+BUDGET_KEY = 'cache.max_size'
+
+_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def parse_size(value: Union[str, int, float]) -> int:
+    """Parse a size such as 500M, 20GiB or 1.5T into bytes.
+
+    Units are powers of 1024; a plain number is a number of bytes.
+
+    Raises:
+        ValueError: If the size cannot be parsed
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMGT]?)(?:i?B)?\s*', str(value), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid size: {value!r}")
+    return int(float(match.group(1)) * _UNITS[match.group(2).upper()])
+
+
+def format_size(size: Optional[int]) -> str:
+    """Format a size in bytes with a binary unit, e.g. 1.5GiB"""
+    if size is None:
+        return "-"
+    for unit in ['B', 'KiB', 'MiB', 'GiB']:
+        if size < 1024 or unit == 'GiB':
+            return f"{size:.0f}{unit}" if unit == 'B' else f"{size:.1f}{unit}"
+        size /= 1024
+
+
+def cache_budget(config: Optional[ConfigManager] = None) -> Optional[int]:
+    """Read the cache budget from config.yaml, or None if it is not set
+
+    Raises:
+        ValueError: If the configured size cannot be parsed
+    """
+    config = config or ConfigManager()
+    if not config.config_exists():
+        return None
+    value = config.get(BUDGET_KEY)
+    return None if value is None else parse_size(value)
+
+
+def _changed_since(path: Union[str, Path], timestamp: float) -> bool:
+    """Check if the build directories of a checkout changed after `timestamp`."""
+    for name in BUILD_DIRS:
+        try:
+            if os.stat(os.path.join(path, name)).st_mtime > timestamp:
+                return True
+        except OSError:
+            continue
+    return False
+
+
+class CacheEvictor:
+    """Keep the repository cache under a size budget.
+
+    Sizes come from the repository catalog, which install, sync and build
+    keep up to date, so checking the budget walks no directory. Only
+    repositories missing sizes, or whose build directories changed since
+    they were cataloged, e.g. by running lake directly, are measured. Over budget, the `.lake`
+    directories (build outputs and dependency checkouts) of the least
+    recently used repositories are deleted first, and whole checkouts
+    second, together with their sandboxes. Repositories whose in-use lock
+    is held by any process, including through one of their sandboxes, are
+    skipped.
+
+    Example:
+        >>> evictor = CacheEvictor(max_size=parse_size("200GiB"))
+        >>> evicted = evictor.collect()
+    """
+
+    def __init__(self, max_size: int,
+                 repos_dir: Optional[Union[str, Path]] = None,
+                 catalog: Optional[RepoCatalog] = None):
+        """
+        Args:
+            max_size: Budget in bytes
+            repos_dir: Directory of cached repositories (default: LEANUP_CACHE_DIR/repos)
+            catalog: Repository catalog (default: the catalog under LEANUP_CACHE_DIR)
+        """
+        self.max_size = max_size
+        self.repos_dir = Path(repos_dir) if repos_dir else LEANUP_CACHE_DIR / "repos"
+        self.catalog = catalog or default_catalog()
+        # Repositories the last `collect` left alone because they were in use
+        self.skipped: List[str] = []
+
+    def entries(self, rescan: bool = False) -> List[Dict[str, Any]]:
+        """Get the cached repositories, least recently used first.
+
+        Args:
+            rescan: Measure every repository again instead of trusting the catalog
+
+        Returns:
+            Catalog entries with a `last_access` timestamp
+        """
+        if not self.repos_dir.exists():
+            return []
+        self.catalog.refresh(self.repos_dir)
+        entries = self.catalog.entries(parent=self.repos_dir)
+        stale = [entry for entry in entries
+                 if rescan or entry['size'] is None or _changed_since(entry['path'], entry['updated'])]
+        if stale:
+            for entry in stale:
+                # Builds outside LeanUp may rewrite .lake/build in place, unseen by its stamp
+                self.catalog.update(entry['path'], rescan=rescan, changed=('.lake/build',))
+            entries = self.catalog.entries(parent=self.repos_dir)
+        for entry in entries:
+            entry['last_access'] = self.catalog.last_access(entry)
+        return sorted(entries, key=lambda entry: entry['last_access'])
+
+    def usage(self, entries: Optional[List[Dict[str, Any]]] = None) -> int:
+        """Total size of the cached repositories in bytes"""
+        if entries is None:
+            entries = self.entries()
+        return sum(entry['size'] or 0 for entry in entries)
+
+    def collect(self, dry_run: bool = False, rescan: bool = False,
+                entries: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """Evict repositories until the cache is under budget.
+
+        Args:
+            dry_run: Only report what would be evicted
+            rescan: Measure every repository again instead of trusting the catalog
+            entries: Entries as returned by `entries`, to avoid reading them again
+
+        Returns:
+            List of evictions, each a dict with the repository path, what was
+            evicted ("build" or "checkout") and the bytes freed
+        """
+        if entries is None:
+            entries = self.entries(rescan=rescan)
+        usage = self.usage(entries)
+        evicted = []
+        self.skipped = []
+        for kind in ('build', 'checkout'):
+            for entry in entries:
+                if usage <= self.max_size:
+                    return evicted
+                freed = (entry['lake_size'] if kind == 'build' else entry['size']) or 0
+                if freed <= 0:
+                    continue
+                if not self._evict(entry, kind, dry_run):
+                    if entry['path'] not in self.skipped:
+                        self.skipped.append(entry['path'])
+                    continue
+                usage -= freed
+                entry['size'] -= freed
+                entry['lake_size'] = 0
+                evicted.append({'path': entry['path'], 'kind': kind, 'freed': freed})
+        return evicted
+
+    def _evict(self, entry: Dict[str, Any], kind: str, dry_run: bool = False) -> bool:
+        """Delete the build outputs or the checkout of a repository unless it is in use."""
+        path = Path(entry['path'])
+        lock = self.catalog.lock(path)
+        if not lock.acquire(exclusive=True, blocking=False):
+            logger.info(f"Skipping {path}, it is in use")
+            return False
+        try:
+            if dry_run:
+                return True
+            if kind == 'build':
+                shutil.rmtree(path / ".lake")
+                parts = {name: part for name, part in (entry['parts'] or {}).items() if name == '.'}
+                self.catalog.set_sizes(path, entry['size'] - (entry['lake_size'] or 0), 0, parts or None)
+            else:
+                sandboxes = path.with_name(path.name + SANDBOX_SUFFIX)
+                if sandboxes.is_dir():
+                    # Worktrees of the checkout, useless without it
+                    shutil.rmtree(sandboxes)
+                shutil.rmtree(path)
+                self.catalog.remove(path)
+                # Nothing is left to lock; later users of the path start a new file
+                lock.path.unlink()
+            logger.info(f"Evicted {'build outputs of ' if kind == 'build' else ''}{path}")
+            return True
+        except OSError as e:
+            logger.error(f"Failed to evict {path}: {e}")
+            return False
+        finally:
+            lock.release()
@@ -0,0 +1,345 @@
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, Union, List, Dict, Any, Callable
+
+import psutil
+import yaml
+
+from leanup.const import LEANUP_CACHE_DIR
+from leanup.utils import tracing
+from leanup.utils.basic import OutputCapture
+from leanup.utils.custom_logger import setup_logger
+from .artifacts import ArtifactStore
+from .catalog import RepoCatalog, default_catalog
+from .manager import RepoManager, LeanRepo
+from .mirror import MirrorCache
+
+logger = setup_logger("repo_installer")
+
+DEFAULT_SOURCE = 'https://github.com'
+# Resources reserved for one `lake build`, which runs its own jobs in parallel
+DEFAULT_BUILD_CPUS = 4
+DEFAULT_BUILD_MEMORY = 8 * 1024 ** 3
+INSTALL_STAGES = ['clone', 'toolchain', 'update', 'build']
+SYNC_STAGES = ['fetch', 'toolchain', 'update', 'build']
+# Changes to these files require a `lake update`
+LAKE_CONFIG_FILES = {'lakefile.lean', 'lakefile.toml', 'lake-manifest.json', 'lean-toolchain'}
+
+
+def default_repo_dir(repository: str, branch: Optional[str] = None) -> Path:
+    """Get the cache directory a repository is installed to by default.
+
+    Example:
+        leanprover-community/mathlib4, v4.9.0 -> LEANUP_CACHE_DIR/repos/leanprover-community_mathlib4_v4.9.0
+    """
+    name = repository.replace('/', '_').lower()
+    return LEANUP_CACHE_DIR / "repos" / (f"{name}_{branch}" if branch else name)
+
+
+def load_manifest(path: Union[str, Path]) -> List[Dict[str, Any]]:
+    """Read the repositories to install from a YAML manifest.
+
+    The manifest is a list of entries, optionally under a `repos` key. Each
+    entry is either a repository name or a mapping with `repository` and
+    the optional keys `source`, `branch` and `dest_dir`:
+
+        repos:
+          - leanprover-community/mathlib4
+          - repository: leanprover/lean4-repl
+            branch: v4.9.0
+
+    Args:
+        path: Manifest file
+
+    Returns:
+        List of install specs with all keys filled in
+
+    Raises:
+        ValueError: If the manifest is malformed
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = yaml.safe_load(f) or []
+    if isinstance(data, dict):
+        data = data.get('repos', [])
+    if not isinstance(data, list):
+        raise ValueError(f"{path}: expected a list of repositories")
+    specs = []
+    for entry in data:
+        if isinstance(entry, str):
+            entry = {'repository': entry}
+        if not isinstance(entry, dict) or not entry.get('repository'):
+            raise ValueError(f"{path}: invalid entry {entry!r}")
+        branch = entry.get('branch') or None
+        if branch is not None:
+            branch = str(branch)
+        dest_dir = entry.get('dest_dir')
+        specs.append({
+            'repository': entry['repository'],
+            'source': entry.get('source') or DEFAULT_SOURCE,
+            'branch': branch,
+            'dest_dir': Path(dest_dir).expanduser() if dest_dir else default_repo_dir(entry['repository'], branch),
+        })
+    return specs
+
+
+class BuildLimiter:
+    """Cap on the number of `lake build` runs at the same time.
+
+    Each build already uses every core, so running many at once only adds
+    memory pressure. The default number of slots allows one build per
+    `cpus_per_build` cores and per `memory_per_build` bytes of available
+    memory, and at least one.
+    """
+
+    def __init__(self, max_builds: Optional[int] = None,
+                 cpus_per_build: int = DEFAULT_BUILD_CPUS,
+                 memory_per_build: int = DEFAULT_BUILD_MEMORY):
+        """
+        Args:
+            max_builds: Number of concurrent builds (default: derived from CPU and memory)
+            cpus_per_build: Cores reserved for one build
+            memory_per_build: Bytes of memory reserved for one build
+        """
+        if max_builds is None:
+            by_cpu = (os.cpu_count() or 1) // max(cpus_per_build, 1)
+            by_memory = psutil.virtual_memory().available // max(memory_per_build, 1)
+            max_builds = min(by_cpu, by_memory)
+        self.slots = max(int(max_builds), 1)
+        self._semaphore = threading.BoundedSemaphore(self.slots)
+
+    def __enter__(self) -> 'BuildLimiter':
+        self._semaphore.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self._semaphore.release()
+
+
+class RepoInstaller:
+    """Install many repositories at once.
+
+    Every repository goes through clone, toolchain, `lake update` and
+    `lake build`. The network-bound stages run up to `jobs` at a time and
+    builds are gated by a `BuildLimiter`, so later repositories keep
+    downloading while earlier ones build.
+
+    Example:
+        >>> installer = RepoInstaller(jobs=8)
+        >>> results = installer.install_all(load_manifest("repos.yaml"))
+    """
+
+    def __init__(self, jobs: int = 4,
+                 builds: Optional[BuildLimiter] = None,
+                 force: bool = False,
+                 share_artifacts: bool = True,
+                 mirror: Optional[MirrorCache] = None,
+                 on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 catalog: Optional[RepoCatalog] = None):
+        """
+        Args:
+            jobs: Maximum number of concurrent network-bound stages
+            builds: Build limiter (default: BuildLimiter())
+            force: Replace existing destination directories, and rerun every
+                stage when syncing even if nothing changed
+            share_artifacts: Reuse dependency builds from the shared artifact store
+            mirror: Local mirror cache to clone through
+            on_progress: Called with the result of each repository once it is done
+            catalog: Catalog updated with every repository installed or
+                synced (default: the catalog under LEANUP_CACHE_DIR)
+        """
+        self.jobs = max(jobs, 1)
+        self.builds = builds or BuildLimiter()
+        self.force = force
+        self.store = ArtifactStore() if share_artifacts else None
+        self.mirror = mirror
+        self.on_progress = on_progress
+        self.catalog = catalog or default_catalog()
+        self._network = threading.BoundedSemaphore(self.jobs)
+
+    def _stage(self, result: Dict[str, Any], name: str, func: Callable[[], bool], slot: Any) -> bool:
+        """Run one stage while holding `slot`, recording its duration and failure."""
+        with slot:
+            start = time.monotonic()
+            ok = func()
+        result['timings'][name] = time.monotonic() - start
+        if not ok:
+            result['status'] = 'failed'
+            result['error'] = result.get('error') or f"{name} failed"
+        return ok
+
+    def _run(self, name: str, repository: str, dest_path: Path,
+             func: Callable[[Dict[str, Any]], None], url: Optional[str] = None) -> Dict[str, Any]:
+        """Run the stages of one repository as operation `name`, timing it and reporting progress."""
+        result = {
+            'repository': repository,
+            'dest_dir': dest_path,
+            'status': 'ok',
+            'error': None,
+            'timings': {},
+        }
+        start = time.monotonic()
+        try:
+            with tracing.span(f"installer.{name}", repository=repository, dest_dir=str(dest_path)) as span, \
+                    self.catalog.in_use(dest_path):
+                func(result)
+                span.set(status=result['status'])
+        except Exception as e:
+            logger.error(f"Error processing {repository}: {e}")
+            result['status'] = 'failed'
+            result['error'] = str(e)
+        self._catalog(result, url)
+        result['timings']['total'] = time.monotonic() - start
+        if self.on_progress is not None:
+            self.on_progress(result)
+        return result
+
+    def _catalog(self, result: Dict[str, Any], url: Optional[str]) -> None:
+        """Store the state of a repository that was installed or synced in the catalog."""
+        dest_path = result['dest_dir']
+        if result['status'] == 'skipped' or not (dest_path / ".git").exists():
+            return
+        # lake_update and lake_build already updated repositories known to the default catalog
+        ran_lake = self.catalog is default_catalog() and (
+            'update' in result['timings'] or 'build' in result['timings'])
+        if (result['status'] == 'unchanged' or ran_lake) and self.catalog.get(dest_path) is not None:
+            return
+        # The build is the last stage, so it failed if the repository did
+        build = result['timings'].get('build')
+        self.catalog.update(dest_path, url=url, build_duration=build,
+                            build_ok=None if build is None else result['status'] == 'ok')
+
+    def _map(self, func: Callable[[Any], Dict[str, Any]], items: List[Any]) -> List[Dict[str, Any]]:
+        if not items:
+            return []
+        # One thread per repository; the semaphores decide what actually runs
+        with ThreadPoolExecutor(max_workers=len(items)) as executor:
+            futures = [executor.submit(tracing.in_context(func), item) for item in items]
+            return [future.result() for future in futures]
+
+    def install(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        """Install a single repository.
+
+        Args:
+            spec: Install spec as returned by `load_manifest`
+
+        Returns:
+            Dict with the repository, destination, status ("ok", "failed"
+            or "skipped"), error message and per-stage timings in seconds
+        """
+        dest_path = Path(spec['dest_dir'])
+        return self._run('install', spec['repository'], dest_path,
+                         lambda result: self._install(spec, dest_path, result),
+                         url=f"{spec['source'].rstrip('/')}/{spec['repository']}")
+
+    def _install(self, spec: Dict[str, Any], dest_path: Path, result: Dict[str, Any]) -> None:
+        if dest_path.exists():
+            if not self.force:
+                result['status'] = 'skipped'
+                result['error'] = f"{dest_path} already exists"
+                return
+            shutil.rmtree(dest_path)
+        dest_path.mkdir(parents=True, exist_ok=True)
+
+        url = f"{spec['source'].rstrip('/')}/{spec['repository']}"
+        repo_manager = RepoManager(dest_path)
+        if not self._stage(result, 'clone', lambda: repo_manager.clone_from(
+                url=url, branch=spec.get('branch'), depth=1, mirror=self.mirror), self._network):
+            return
+        self._lake_stages(dest_path, result)
+
+    def _lake_stages(self, path: Path, result: Dict[str, Any],
+                     toolchain: bool = True, update: bool = True) -> None:
+        """Run the toolchain, update and build stages of a Lean project."""
+        if not ((path / "lakefile.lean").exists() or (path / "lakefile.toml").exists()):
+            return
+        lean_repo = LeanRepo(path)
+        version = lean_repo.get_lean_toolchain() if toolchain else None
+        if version and not self._stage(
+                result, 'toolchain', lambda: lean_repo.elan.install_toolchain(version), self._network):
+            return
+
+        def lake_update() -> bool:
+            stdout, stderr, returncode = lean_repo.lake_update(capture=OutputCapture())
+            if returncode != 0:
+                result['error'] = f"lake update failed: {stderr}"
+            return returncode == 0
+
+        if update and not self._stage(result, 'update', lake_update, self._network):
+            return
+        if self.store is not None:
+            lean_repo.restore_artifacts(self.store)
+
+        def lake_build() -> bool:
+            stdout, stderr, returncode = lean_repo.lake_build(capture=OutputCapture())
+            if returncode != 0:
+                result['error'] = f"lake build failed: {stderr}"
+            return returncode == 0
+
+        if self._stage(result, 'build', lake_build, self.builds) and self.store is not None:
+            lean_repo.store_artifacts(self.store)
+
+    def install_all(self, specs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Install repositories concurrently.
+
+        Args:
+            specs: Install specs as returned by `load_manifest`
+
+        Returns:
+            List of results in the order of `specs`
+        """
+        return self._map(self.install, specs)
+
+    def sync(self, path: Union[str, Path]) -> Dict[str, Any]:
+        """Bring an installed repository up to date without discarding its build.
+
+        The checkout is fetched and moved to its upstream in place. `lake
+        update` runs only if the lakefile, manifest or toolchain changed, and
+        `lake build` only if that happened or Lean sources changed, so
+        unchanged repositories cost a single fetch.
+
+        Args:
+            path: Repository directory
+
+        Returns:
+            Dict with the repository, destination, status ("ok", "failed" or
+            "unchanged"), error message, changed paths and per-stage timings
+        """
+        path = Path(path)
+        return self._run('sync', path.name, path, lambda result: self._sync(path, result))
+
+    def _sync(self, path: Path, result: Dict[str, Any]) -> None:
+        sync_info = {}
+
+        def fetch() -> bool:
+            sync_info.update(RepoManager(path).git_sync())
+            if 'error' in sync_info:
+                result['error'] = f"git fetch failed: {sync_info['error']}"
+                return False
+            return True
+
+        if not self._stage(result, 'fetch', fetch, self._network):
+            return
+        changed = sync_info['changed']
+        result['changed'] = changed
+        if not changed and not self.force:
+            result['status'] = 'unchanged'
+            return
+        toolchain = self.force or 'lean-toolchain' in changed
+        update = toolchain or bool(LAKE_CONFIG_FILES.intersection(changed))
+        if update or any(name.endswith('.lean') for name in changed):
+            self._lake_stages(path, result, toolchain=toolchain, update=update)
+
+    def sync_all(self, paths: List[Union[str, Path]]) -> List[Dict[str, Any]]:
+        """Sync installed repositories concurrently.
+
+        Args:
+            paths: Repository directories
+
+        Returns:
+            List of results in the order of `paths`
+        """
+        return self._map(self.sync, paths)
@@ -1,17 +1,34 @@
+import hashlib
+import json as jsonlib
+import os
 import subprocess
 import re
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
-from token import OP
-from typing import Optional, Union, List, Dict, Any, Tuple
-import git
-import toml
-from leanup.utils.basic import execute_command
+from typing import Optional, Union, List, Dict, Any, Tuple, Iterable, Iterator, AsyncIterator, Callable, Generator
+from leanup.utils.basic import (
+    execute_command, async_execute_command, stream_command, OutputCapture
+)
+from leanup.const import OS_TYPE
+from leanup.utils import metrics, tracing
+from leanup.utils.cache import ResultCache
 from leanup.utils.custom_logger import setup_logger
 from .elan import ElanManager
+from .worker import LeanWorkerPool, split_imports
+from .build_profile import BuildProfiler
+from .artifacts import ArtifactStore, clone_tree
+from .mirror import MirrorCache
+from .catalog import default_catalog, updates_catalog
 
 
 logger = setup_logger("repo_manager")
 
+# Root modules shipped with the Lean toolchain rather than built by lake
+TOOLCHAIN_MODULES = {'Init', 'Std', 'Lean', 'Lake'}
+
 class RepoManager:
     """Class for managing directory operations and git functionality."""
     
@@ -22,20 +39,35 @@ class RepoManager:
             cwd: Working directory path
         """
         self.cwd = Path(cwd).resolve()
-        self._git_repo = None
-        self._check_git_repo()
+        self._repo = None
+        self._repo_checked = False
     
     def _check_git_repo(self) -> None:
         """Check if the current directory is a git repository and initialize git.Repo if it is."""
+        self._repo = None
+        self._repo_checked = True
         try:
             if (self.cwd / ".git").exists():
-                self._git_repo = git.Repo(self.cwd)
+                import git
+                self._repo = git.Repo(self.cwd)
                 logger.debug(f"Git repository found at {self.cwd}")
             else:
                 logger.debug(f"{self.cwd} is not a git repository")
         except Exception as e:
             logger.error(f"Error checking git repository: {e}")
     
+    @property
+    def _git_repo(self) -> Optional['git.Repo']:
+        """git.Repo of the directory, loaded on first use so GitPython is only imported when needed"""
+        if not self._repo_checked:
+            self._check_git_repo()
+        return self._repo
+    
+    @_git_repo.setter
+    def _git_repo(self, repo: Optional['git.Repo']) -> None:
+        self._repo = repo
+        self._repo_checked = True
+    
     @property
     def is_gitrepo(self) -> bool:
         """Check if the current directory is a git repository.
@@ -45,27 +77,69 @@ class RepoManager:
         """
         return self._git_repo is not None
     
-    def clone_from(self, url: str, branch: Optional[str] = None, depth: Optional[int] = None) -> bool:
+    def head_commit(self) -> Optional[str]:
+        """Read the checked out commit from the git directory, without starting git.
+        
+        Returns:
+            Commit hash, or None if it cannot be read
+        """
+        git_dir = self.cwd / ".git"
+        try:
+            if git_dir.is_file():
+                # Worktrees and submodules point at their git directory
+                git_dir = (self.cwd / git_dir.read_text().split(":", 1)[1].strip()).resolve()
+            head = (git_dir / "HEAD").read_text().strip()
+            if not head.startswith("ref:"):
+                return head or None
+            ref = head[len("ref:"):].strip()
+            common_dir = git_dir
+            if (git_dir / "commondir").is_file():
+                common_dir = (git_dir / (git_dir / "commondir").read_text().strip()).resolve()
+            for base in (git_dir, common_dir):
+                if (base / ref).is_file():
+                    return (base / ref).read_text().strip()
+            packed_refs = common_dir / "packed-refs"
+            if packed_refs.is_file():
+                for line in packed_refs.read_text().splitlines():
+                    if line.endswith(" " + ref):
+                        return line.split(" ", 1)[0]
+        except (OSError, IndexError):
+            pass
+        return None
+    
+    @tracing.traced('repo.clone', lambda self, url, *args, **kwargs: {'cwd': str(self.cwd), 'url': url})
+    def clone_from(self, url: str, branch: Optional[str] = None, depth: Optional[int] = None,
+                   mirror: Optional[MirrorCache] = None) -> bool:
         """Clone a git repository to the current directory.
         
         Args:
             url: Git repository URL
             branch: Branch to clone (optional)
-            depth: Depth for shallow clone (optional)
+            depth: Depth for shallow clone (optional, ignored when cloning from a mirror)
+            mirror: Local mirror cache; the mirror is fetched and the clone is
+                made from it, with `origin` still pointing at `url`
             
         Returns:
             bool: True if successful, False otherwise
         """
         try:
+            mirror_path = mirror.update(url) if mirror is not None else None
             # Prepare command
-            cmd = ["git", "clone", url, "."]
+            if mirror_path is not None:
+                # Local clones hardlink the mirror's objects instead of downloading them
+                cmd = ["git", "clone", str(mirror_path), "."]
+            else:
+                cmd = ["git", "clone", url, "."]
             if branch:
                 cmd.extend(["--branch", branch])
-            if depth:
+            if depth and mirror_path is None:
                 cmd.extend(["--depth", str(depth)])
                 
             # Execute clone command
             stdout, stderr, returncode = execute_command(cmd, cwd=str(self.cwd))
+            if returncode == 0 and mirror_path is not None:
+                stdout, stderr, returncode = execute_command(
+                    ["git", "remote", "set-url", "origin", url], cwd=str(self.cwd))
             
             if returncode == 0:
                 logger.info(f"Successfully cloned {url} to {self.cwd}")
@@ -93,22 +167,133 @@ class RepoManager:
                 logger.error("Cannot clone repository from current directory")
                 return False
             # Clone repository
+            import git
             git.Repo.clone_from(str(path), str(self.cwd))
             return True
         except Exception as e:
             logger.error(f"Error cloning repository from path: {e}")
             return False
     
-    def execute_command(self, command: Union[str, List[str]]) -> Tuple[str, str, int]:
+    def create_sandboxes(self, n: int,
+                         base_dir: Optional[Union[str, Path]] = None,
+                         ref: str = "HEAD") -> List['RepoManager']:
+        """Create lightweight working trees of this repository with `git worktree`.
+        
+        All sandboxes share the repository's object store. Their
+        `.lake/packages` and `.lake/build` start as copy-on-write copies of
+        this repository's (plain copies where reflinks are not supported),
+        so a job updating or rebuilding dependencies cannot change the
+        original or other sandboxes.
+        
+        Args:
+            n: Number of sandboxes
+            base_dir: Directory holding the sandboxes (default: a
+                `<name>.sandboxes` directory next to the repository)
+            ref: Commit checked out (detached) in each sandbox
+            
+        Returns:
+            List of managers of the same class, one per sandbox
+        """
+        if not self.is_gitrepo:
+            logger.error("Not a git repository")
+            return []
+        base_dir = Path(base_dir) if base_dir else self.cwd.parent / f"{self.cwd.name}.sandboxes"
+        base_dir.mkdir(parents=True, exist_ok=True)
+        sandboxes = []
+        for _ in range(n):
+            path = base_dir / f"sandbox-{uuid.uuid4().hex[:8]}"
+            stdout, stderr, returncode = execute_command(
+                ["git", "worktree", "add", "--detach", str(path), ref], cwd=str(self.cwd))
+            if returncode != 0:
+                logger.error(f"Failed to create sandbox: {stderr}")
+                break
+            try:
+                self._share_lake_dir(path)
+            except OSError as e:
+                logger.error(f"Failed to share .lake with sandbox {path}: {e}")
+            sandboxes.append(type(self)(path))
+        return sandboxes
+    
+    def _share_lake_dir(self, path: Path) -> None:
+        """Clone dependencies and build outputs into a sandbox."""
+        lake_dir = self.cwd / ".lake"
+        if not lake_dir.is_dir():
+            return
+        (path / ".lake").mkdir(exist_ok=True)
+        for name in ("packages", "build"):
+            if (lake_dir / name).is_dir():
+                clone_tree(lake_dir / name, path / ".lake" / name)
+    
+    def remove_sandbox(self, sandbox: 'RepoManager') -> bool:
+        """Remove a sandbox created by `create_sandboxes`.
+        
+        Args:
+            sandbox: Manager of the sandbox
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        # Sandboxes of older versions link to the original's packages; drop the
+        # link first so nothing follows it into the original
+        packages = sandbox.cwd / ".lake" / "packages"
+        if packages.is_symlink():
+            packages.unlink()
+        stdout, stderr, returncode = execute_command(
+            ["git", "worktree", "remove", "--force", str(sandbox.cwd)], cwd=str(self.cwd))
+        if returncode != 0:
+            logger.error(f"Failed to remove sandbox: {stderr}")
+            return False
+        return True
+    
+    @contextmanager
+    def sandbox(self, ref: str = "HEAD",
+                base_dir: Optional[Union[str, Path]] = None) -> Generator['RepoManager', None, None]:
+        """Context manager providing a temporary sandbox for one job.
+        
+        Example:
+            >>> with repo.sandbox() as box:
+            ...     box.lake_build()
+        """
+        sandboxes = self.create_sandboxes(1, base_dir=base_dir, ref=ref)
+        if not sandboxes:
+            raise RuntimeError(f"Failed to create sandbox of {self.cwd}")
+        try:
+            yield sandboxes[0]
+        finally:
+            self.remove_sandbox(sandboxes[0])
+    
+    def in_use(self):
+        """Context manager keeping `leanup cache gc` from evicting the repository.
+        
+        A no-op unless the repository is under the cache directory. Commands
+        run by this class already hold it; hold it around a series of
+        operations to keep the repository between them.
+        
+        Example:
+            >>> with repo.in_use():
+            ...     repo.lake_update()
+            ...     repo.lake_build()
+        """
+        return default_catalog().in_use(self.cwd)
+    
+    def execute_command(self, command: Union[str, List[str]],
+                        timeout: Optional[float] = None,
+                        capture: Optional[OutputCapture] = None,
+                        env: Optional[Dict[str, str]] = None) -> Tuple[str, str, int]:
         """Execute a command in the current directory.
         
         Args:
             command: Command to execute (string or list of arguments)
+            timeout: Maximum execution time in seconds
+            capture: Bounded-memory output capture settings
+            env: Environment of the command (default: inherit the current one)
             
         Returns:
             Tuple containing stdout, stderr, and return code
         """
-        return execute_command(command, cwd=str(self.cwd))
+        with self.in_use():
+            return execute_command(command, cwd=str(self.cwd), timeout=timeout,
+                                   capture=capture, env=env)
     
     def read_file(self, file_path: Union[str, Path]) -> str:
         """Read the contents of a file.
@@ -231,6 +416,7 @@ class RepoManager:
     def git_init(self) -> bool:
         """Initialize git repository."""
         try:
+            import git
             self._git_repo = git.Repo.init(str(self.cwd))
             return True
         except Exception as e:
@@ -333,17 +519,94 @@ class RepoManager:
             logger.error(f"Error pushing changes: {e}")
             return False
 
+    @tracing.traced('repo.sync', tracing.cwd_attrs)
+    def git_sync(self, remote: str = "origin") -> Dict[str, Any]:
+        """Fetch the upstream of the checkout and move the working tree to it.
+
+        The current branch, or the tag of a detached checkout, is fetched
+        (keeping shallow clones shallow) and checked out with
+        `git reset --hard`. Only files that differ are rewritten, and
+        untracked files such as `.lake` are kept, so build outputs of
+        unchanged modules stay valid. Checkouts detached at a plain commit
+        are left as they are.
+
+        Args:
+            remote: Remote name
+
+        Returns:
+            Dict with the old and new commit and the changed paths, or error message
+        """
+        if not self.is_gitrepo:
+            return {"error": "Not a git repository"}
+        cwd = str(self.cwd)
+        stdout, stderr, returncode = execute_command(["git", "rev-parse", "HEAD"], cwd=cwd)
+        if returncode != 0:
+            return {"error": stderr.strip()}
+        old = stdout.strip()
+
+        stdout, _, returncode = execute_command(["git", "symbolic-ref", "-q", "--short", "HEAD"], cwd=cwd)
+        if returncode == 0:
+            branch = stdout.strip()
+            refspec = f"+refs/heads/{branch}:refs/remotes/{remote}/{branch}"
+            target = f"refs/remotes/{remote}/{branch}"
+        else:
+            stdout, _, returncode = execute_command(
+                ["git", "describe", "--tags", "--exact-match", "HEAD"], cwd=cwd)
+            if returncode != 0:
+                return {"old": old, "new": old, "changed": []}
+            tag = stdout.strip()
+            refspec = f"+refs/tags/{tag}:refs/tags/{tag}"
+            target = f"refs/tags/{tag}"
+
+        cmd = ["git", "fetch", "--no-tags", remote, refspec]
+        if (self.cwd / ".git" / "shallow").exists():
+            cmd[2:2] = ["--depth", "1"]
+        stdout, stderr, returncode = execute_command(cmd, cwd=cwd)
+        if returncode != 0:
+            logger.error(f"Failed to fetch {refspec} in {self.cwd}: {stderr}")
+            return {"error": stderr.strip()}
+        stdout, stderr, returncode = execute_command(["git", "rev-parse", f"{target}^{{commit}}"], cwd=cwd)
+        if returncode != 0:
+            return {"error": stderr.strip()}
+        new = stdout.strip()
+        if new == old:
+            return {"old": old, "new": new, "changed": []}
+
+        stdout, stderr, returncode = execute_command(["git", "diff", "--name-only", old, new], cwd=cwd)
+        if returncode != 0:
+            return {"error": stderr.strip()}
+        changed = [line for line in stdout.splitlines() if line]
+        stdout, stderr, returncode = execute_command(["git", "reset", "--hard", "-q", new], cwd=cwd)
+        if returncode != 0:
+            logger.error(f"Failed to check out {new} in {self.cwd}: {stderr}")
+            return {"error": stderr.strip()}
+        return {"old": old, "new": new, "changed": changed}
+
 class LeanRepo(RepoManager):
     """Class for managing Lean repositories with lake support."""
     
-    def __init__(self, cwd: Union[str, Path]):
+    # Captured `lake env` environments, keyed by repository and workspace state
+    _lake_env_cache: Dict[Tuple, Optional[Dict[str, str]]] = {}
+    
+    def __init__(self, cwd: Union[str, Path],
+                 cache: Union[bool, ResultCache] = False,
+                 direct_lean: bool = True):
         """Initialize LeanRepo with working directory.
         
         Args:
             cwd: Working directory path
+            cache: Cache `lake_env_lean` results, either True for the default
+                cache under LEANUP_CACHE_DIR or a ResultCache instance
+            direct_lean: Run lean directly in the cached `lake env`
+                environment instead of starting lake for every file
         """
         super().__init__(cwd)
         self.lean_version = self.get_lean_toolchain()
+        self.elan = ElanManager()
+        self.direct_lean = direct_lean
+        if cache is True:
+            cache = ResultCache()
+        self.result_cache = cache or None
     
     def get_lean_toolchain(self) -> Optional[str]:
         """Read lean-toolchain file to get Lean version.
@@ -364,18 +627,46 @@ class LeanRepo(RepoManager):
             logger.error(f"Error reading lean-toolchain: {e}")
             return None
     
-    def lake(self, args: List[str]) -> Tuple[str, str, int]:
+    def lake(self, args: List[str],
+             timeout: Optional[float] = None,
+             capture: Optional[OutputCapture] = None) -> Tuple[str, str, int]:
         """Execute lake command with given arguments.
         
         Args:
             args: List of lake command arguments
+            timeout: Maximum execution time in seconds
+            capture: Bounded-memory output capture settings
             
         Returns:
             Tuple containing stdout, stderr, and return code
         """
-        command = ["lake"] + args
+        command = self._lake_command(args)
         logger.debug("Executing lake command: " + ' '.join(command))
-        return self.execute_command(command)
+        return self.execute_command(command, timeout=timeout, capture=capture)
+    
+    def _lake_command(self, args: List[str]) -> List[str]:
+        """Build the full lake command line for the given arguments."""
+        return [self.toolchain_executable("lake")] + args
+    
+    def toolchain_executable(self, name: str) -> str:
+        """Get the toolchain binary to run for this repository.
+        
+        The `lean-toolchain` file (or ELAN_TOOLCHAIN) is resolved to the
+        installed toolchain so the binary runs without the elan proxy. Falls
+        back to the bare name, i.e. the elan shim, if it cannot be resolved.
+        
+        Args:
+            name: Binary name, e.g. lake or lean
+            
+        Returns:
+            str: Executable path or name
+        """
+        toolchain = os.environ.get('ELAN_TOOLCHAIN') or self.get_lean_toolchain()
+        bin_dir = self.elan.resolve_toolchain_bin(toolchain)
+        if bin_dir is None:
+            return name
+        exe = bin_dir / (name + '.exe' if OS_TYPE == 'Windows' else name)
+        return str(exe) if exe.is_file() else name
     
     def lake_init(self,
                   name: Optional[str] = None,
@@ -418,11 +709,19 @@ class LeanRepo(RepoManager):
                 cmds[-1] += f".{language}"
         return self.lake(cmds)
     
-    def lake_build(self, target: Optional[str] = None) -> Tuple[str, str, int]:
+    @updates_catalog(build=True)
+    @metrics.recorded('repo.lake_build', metrics.repo_attrs)
+    def lake_build(self, target: Optional[str] = None,
+                   capture: Optional[OutputCapture] = None,
+                   profiler: Optional[BuildProfiler] = None) -> Tuple[str, str, int]:
         """Build the Lean project using lake.
         
         Args:
             target: Optional build target
+            capture: Bounded-memory output capture settings, e.g.
+                `OutputCapture(tail_kb=256, spill_file="build.log")`
+            profiler: Profiler recording per-module timings from the
+                progress lines as they stream; see `BuildProfiler.report`
             
         Returns:
             Tuple containing stdout, stderr, and return code
@@ -430,31 +729,243 @@ class LeanRepo(RepoManager):
         args = ["build"]
         if target:
             args.append(target)
-        return self.lake(args)
+        if profiler is None:
+            return self.lake(args, capture=capture)
+        with profiler.running():
+            return self.lake(args, capture=profiler.capture(capture))
     
-    def lake_update(self) -> Tuple[str, str, int]:
+    @updates_catalog()
+    @metrics.recorded('repo.lake_update', metrics.repo_attrs)
+    def lake_update(self, capture: Optional[OutputCapture] = None) -> Tuple[str, str, int]:
         """Update dependencies using lake.
         
+        Args:
+            capture: Bounded-memory output capture settings
+        
         Returns:
             Tuple containing stdout, stderr, and return code
         """
-        return self.lake(["update"])
+        return self.lake(["update"], capture=capture)
     
     def lake_env_lean(
         self, 
         filepath: Union[str, Path], 
         json: bool = True, 
         options: Optional[Dict[str, Any]] = None,
-        nproc: Optional[int] = None) -> Tuple[str, str, int]:
+        nproc: Optional[int] = None,
+        timeout: Optional[float] = None) -> Tuple[str, str, int]:
         """Run lean file with lake environment.
         
+        With a result cache, only successful checks are cached: an error
+        may come from an imported module that is not built yet or stale.
+        
         Args:
             filepath: Path to the Lean file
             json: Whether to return JSON output, default is True
+            timeout: Maximum execution time in seconds
+            
+        Returns:
+            Tuple containing stdout, stderr, and return code
+        """
+        args = self._lake_env_lean_args(filepath, json, options, nproc)
+        if self.result_cache is None:
+            return self._run_env_lean(args, timeout)
+        key = self._result_cache_key(filepath, json, options)
+        if key is not None:
+            result = self.result_cache.get(key)
+            if result is not None:
+                return result
+        result = self._run_env_lean(args, timeout)
+        # Failed checks are run again, they may pass once their imports are rebuilt
+        if key is not None and result[2] == 0:
+            self.result_cache.put(key, result)
+        return result
+    
+    @metrics.recorded('repo.lake_env_lean', metrics.check_attrs)
+    def _run_env_lean(self, args: List[str], timeout: Optional[float]) -> Tuple[str, str, int]:
+        """Run `lake env lean` arguments, skipping lake when direct_lean is set.
+        
+        Recorded here rather than in `lake_env_lean`, so cache hits are not.
+        """
+        if self.direct_lean:
+            return self._lean(args[2:], timeout=timeout)
+        return self.lake(args, timeout=timeout)
+    
+    def _lake_env_key(self) -> Tuple:
+        """Workspace state that determines the `lake env` environment."""
+        mtimes = []
+        for name in ["lake-manifest.json", "lakefile.lean", "lakefile.toml", "lean-toolchain"]:
+            try:
+                mtimes.append((self.cwd / name).stat().st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return (str(self.cwd), os.environ.get('ELAN_TOOLCHAIN'), self.get_lean_toolchain(), tuple(mtimes))
+    
+    def lake_env(self, refresh: bool = False) -> Optional[Dict[str, str]]:
+        """Get the environment `lake env` sets up for this workspace.
+        
+        The environment is captured once with `lake env printenv` and cached
+        until the lake manifest, the lakefile or the toolchain changes.
+        
+        Args:
+            refresh: Capture the environment again even if cached
+            
+        Returns:
+            Dict of environment variables, or None if lake failed
+        """
+        key = self._lake_env_key()
+        if not refresh and key in self._lake_env_cache:
+            return self._lake_env_cache[key]
+        printenv = ["cmd", "/c", "set"] if OS_TYPE == 'Windows' else ["printenv"]
+        with self.in_use():
+            stdout, stderr, returncode = execute_command(
+                self._lake_command(["env"] + printenv), cwd=str(self.cwd))
+        env = None
+        if returncode == 0:
+            env = {}
+            for line in stdout.splitlines():
+                name, sep, value = line.partition('=')
+                if sep and name:
+                    env[name] = value
+        else:
+            logger.debug(f"Failed to capture lake env: {stderr}")
+        # Failures are cached too, so a broken workspace is not probed per file
+        self._lake_env_cache[key] = env
+        return env
+    
+    def _lean_executable(self, env: Dict[str, str]) -> str:
+        """Find the lean binary matching a captured lake environment."""
+        if env.get('LEAN'):
+            return env['LEAN']
+        lean_exe = 'lean.exe' if OS_TYPE == 'Windows' else 'lean'
+        if env.get('LEAN_SYSROOT'):
+            lean_path = Path(env['LEAN_SYSROOT']) / 'bin' / lean_exe
+            if lean_path.is_file():
+                return str(lean_path)
+        return self.toolchain_executable('lean')
+    
+    def _lean_command(self, args: List[str]) -> Tuple[List[str], Optional[Dict[str, str]]]:
+        """Build a command running lean in the lake environment.
+        
+        Returns:
+            Tuple of the command and the environment to run it with
+        """
+        env = self.lake_env() if self.direct_lean else None
+        if env is None:
+            return self._lake_command(["env", "lean"] + args), None
+        return [self._lean_executable(env)] + args, env
+    
+    @metrics.recorded('repo.lean', metrics.check_attrs)
+    def lean(self, args: List[str],
+             timeout: Optional[float] = None,
+             capture: Optional[OutputCapture] = None) -> Tuple[str, str, int]:
+        """Execute lean with given arguments in the lake environment.
+        
+        With `direct_lean` the cached `lake env` environment is used and lake
+        is not started; otherwise, or if the environment cannot be captured,
+        this runs `lake env lean`.
+        
+        Args:
+            args: List of lean command arguments
+            timeout: Maximum execution time in seconds
+            capture: Bounded-memory output capture settings
             
         Returns:
             Tuple containing stdout, stderr, and return code
         """
+        return self._lean(args, timeout=timeout, capture=capture)
+    
+    def _lean(self, args: List[str],
+              timeout: Optional[float] = None,
+              capture: Optional[OutputCapture] = None) -> Tuple[str, str, int]:
+        """Execute lean in the lake environment without recording metrics."""
+        command, env = self._lean_command(args)
+        logger.debug("Executing lean command: " + ' '.join(command))
+        return self.execute_command(command, timeout=timeout, capture=capture, env=env)
+    
+    def _result_cache_key(
+        self,
+        filepath: Union[str, Path],
+        json: bool,
+        options: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Hash everything that determines the output of a check.
+        
+        The key covers the file path and content, the toolchain, the lake
+        manifest, the lean flags and the build state of the modules the
+        file imports, see `_import_state`.
+        
+        Returns:
+            The key, or None if the check cannot be cached
+        """
+        try:
+            content = (self.cwd / filepath).read_bytes()
+        except OSError:
+            return None
+        imports = self._import_state(split_imports(content.decode('utf-8', errors='replace'))[0])
+        if imports is None:
+            return None
+        manifest = self.cwd / "lake-manifest.json"
+        digest = hashlib.sha256()
+        for part in [
+            str(filepath).encode(),
+            content,
+            (self.get_lean_toolchain() or "").encode(),
+            manifest.read_bytes() if manifest.exists() else b"",
+            jsonlib.dumps([json, sorted((str(k), str(v)) for k, v in (options or {}).items())]).encode(),
+            imports,
+        ]:
+            digest.update(hashlib.sha256(part).digest())
+        return digest.hexdigest()
+    
+    def _import_state(self, imports: List[str]) -> Optional[bytes]:
+        """Build state of imported modules, from their lake traces.
+        
+        Lake's `.trace` file of a module hashes the traces of its own
+        imports, so it changes whenever the module or anything it imports
+        transitively is rebuilt. Where no trace exists the size and mtime
+        of the `.olean` are used. Modules of the toolchain are covered by
+        the toolchain itself.
+        
+        Returns:
+            Bytes identifying the state, or None if an import is not built
+        """
+        roots = [self.cwd]
+        for packages in [self.cwd / ".lake" / "packages", self.cwd / "lake-packages"]:
+            if packages.is_dir():
+                roots.extend(sorted(packages.iterdir()))
+        lib_dirs = [lib for root in roots
+                    for lib in [root / ".lake" / "build" / "lib" / "lean",
+                                root / ".lake" / "build" / "lib", root / "build" / "lib"]
+                    if lib.is_dir()]
+        state = []
+        for module in sorted(set(imports)):
+            rel = Path(*module.split('.'))
+            for lib in lib_dirs:
+                olean = (lib / rel).with_suffix('.olean')
+                try:
+                    trace = (lib / rel).with_suffix('.trace').read_bytes()
+                    state.append(module.encode() + b'\0' + trace)
+                    break
+                except OSError:
+                    pass
+                try:
+                    stat = olean.stat()
+                except OSError:
+                    continue
+                state.append(f"{module}\0{stat.st_size}\0{stat.st_mtime_ns}".encode())
+                break
+            else:
+                if module.split('.')[0] not in TOOLCHAIN_MODULES:
+                    return None
+        return b'\n'.join(state)
+    
+    def _lake_env_lean_args(
+        self,
+        filepath: Union[str, Path],
+        json: bool = True,
+        options: Optional[Dict[str, Any]] = None,
+        nproc: Optional[int] = None) -> List[str]:
+        """Build lake arguments for running lean on a file."""
         args = ["env", "lean"]
         if json:
             args.append("--json")
@@ -465,23 +976,230 @@ class LeanRepo(RepoManager):
             # nproc += 1
             args += ["-j", str(nproc)]
         args.append(str(filepath))
-        return self.lake(args)
+        return args
+    
+    def iter_lean_messages(
+        self,
+        filepath: Union[str, Path],
+        options: Optional[Dict[str, Any]] = None,
+        nproc: Optional[int] = None,
+        stop: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Iterator[Dict[str, Any]]:
+        """Stream Lean messages for a file while it is being elaborated.
+        
+        Messages are parsed from `lake env lean --json` as soon as lean
+        prints them. The process is terminated once `stop` returns True for
+        a message, or when the caller stops iterating.
+        
+        Args:
+            filepath: Path to the Lean file
+            options: Options passed to lean as `-D` flags
+            nproc: Number of threads for the lean process
+            stop: Predicate on a message ending the check after it is yielded
+            
+        Yields:
+            Dict with the message fields (severity, pos, endPos, data, ...)
+        
+        Example:
+            >>> first_error = next(repo.iter_lean_messages(
+            ...     "Foo.lean", stop=lambda m: m["severity"] == "error"), None)
+        """
+        command, env = self._lean_command(self._lake_env_lean_args(filepath, True, options, nproc)[2:])
+        logger.debug("Streaming lean command: " + ' '.join(command))
+        with self.in_use():
+            lines = stream_command(command, cwd=str(self.cwd), env=env)
+            try:
+                for line in lines:
+                    try:
+                        message = jsonlib.loads(line)
+                    except ValueError:
+                        logger.debug(f"Skipping non-JSON output: {line}")
+                        continue
+                    if not isinstance(message, dict):
+                        continue
+                    yield message
+                    if stop is not None and stop(message):
+                        break
+            finally:
+                lines.close()
+    
+    def check_many(
+        self,
+        filepaths: Iterable[Union[str, Path]],
+        jobs: Optional[int] = None,
+        json: bool = True,
+        options: Optional[Dict[str, Any]] = None,
+        nproc: Optional[int] = None,
+        ordered: bool = False,
+        timeout: Optional[float] = None) -> Iterator[Tuple[Union[str, Path], Tuple[str, str, int]]]:
+        """Check many Lean files concurrently with `lake env lean`.
+        
+        Each file is checked exactly as `lake_env_lean` would check it. At most
+        `jobs` processes run at once and only a bounded number of files is
+        queued ahead, so `filepaths` may be a lazy iterable.
+        
+        Args:
+            filepaths: Paths to the Lean files
+            jobs: Maximum number of concurrent checks (default: CPU count)
+            json: Whether to return JSON output, default is True
+            options: Options passed to lean as `-D` flags
+            nproc: Number of threads per lean process
+            ordered: Yield results in input order instead of completion order
+            timeout: Maximum execution time of each check in seconds
+            
+        Yields:
+            Tuple of the file path and its (stdout, stderr, returncode)
+        """
+        jobs = jobs or os.cpu_count() or 1
+        filepaths = iter(filepaths)
+        pending = deque()
+        
+        def submit_next(executor) -> bool:
+            for filepath in filepaths:
+                future = executor.submit(tracing.in_context(self.lake_env_lean), filepath, json=json,
+                                         options=options, nproc=nproc, timeout=timeout)
+                pending.append((filepath, future))
+                return True
+            return False
+        
+        failed = 0
+        with self.in_use(), metrics.recording('repo.check_many', lambda: metrics.repo_attrs(self)) as current, \
+                ThreadPoolExecutor(max_workers=jobs) as executor:
+            for _ in range(2 * jobs):
+                if not submit_next(executor):
+                    break
+            try:
+                while pending:
+                    if ordered:
+                        done = [pending.popleft()]
+                    else:
+                        wait([f for _, f in pending], return_when=FIRST_COMPLETED)
+                        done = [item for item in pending if item[1].done()]
+                        for item in done:
+                            pending.remove(item)
+                    for filepath, future in done:
+                        result = future.result()
+                        failed += result[2] != 0
+                        yield filepath, result
+                        submit_next(executor)
+                current.set(failed=failed)
+            finally:
+                # Drop queued checks if the caller stops iterating early
+                for _, future in pending:
+                    future.cancel()
     
-    def lake_clean(self) -> Tuple[str, str, int]:
+    def worker_pool(self, size: int = 1, header: Optional[str] = None,
+                    **kwargs) -> LeanWorkerPool:
+        """Create a pool of persistent Lean workers for this repository.
+        
+        Args:
+            size: Number of workers
+            header: Import header loaded once per worker, e.g. "import Mathlib"
+            **kwargs: Extra arguments passed to LeanWorkerPool
+            
+        Returns:
+            LeanWorkerPool: Pool running in the repository directory
+        """
+        return LeanWorkerPool(self.cwd, size=size, header=header, **kwargs)
+    
+    def lake_clean(self, capture: Optional[OutputCapture] = None) -> Tuple[str, str, int]:
         """Clean build artifacts using lake.
         
+        Args:
+            capture: Bounded-memory output capture settings
+        
         Returns:
             Tuple containing stdout, stderr, and return code
         """
-        return self.lake(["clean"])
+        return self.lake(["clean"], capture=capture)
     
-    def lake_test(self) -> Tuple[str, str, int]:
+    @metrics.recorded('repo.lake_test', metrics.repo_attrs)
+    def lake_test(self, capture: Optional[OutputCapture] = None) -> Tuple[str, str, int]:
         """Run tests using lake.
         
+        Args:
+            capture: Bounded-memory output capture settings
+        
         Returns:
             Tuple containing stdout, stderr, and return code
         """
-        return self.lake(["test"])
+        return self.lake(["test"], capture=capture)
+    
+    def get_lake_packages(self) -> List[Dict[str, Any]]:
+        """Read the git dependencies pinned in lake-manifest.json.
+        
+        Returns:
+            List of dicts with the name, rev, url and build_dir of each package
+        """
+        try:
+            manifest = jsonlib.loads((self.cwd / "lake-manifest.json").read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return []
+        packages_dir = self.cwd / manifest.get("packagesDir", ".lake/packages")
+        packages = []
+        for package in manifest.get("packages", []):
+            # Older manifests nest the fields under the package type
+            package = package.get("git", package)
+            if not package.get("rev") or not package.get("name"):
+                continue
+            packages.append({
+                'name': package["name"],
+                'rev': package["rev"],
+                'url': package.get("url"),
+                'build_dir': packages_dir / package["name"] / ".lake" / "build",
+            })
+        return packages
+    
+    def _artifact_key(self, package: Dict[str, Any]) -> str:
+        return ArtifactStore.make_key(self.get_lean_toolchain(), package['name'],
+                                      package['rev'], package['url'])
+    
+    @tracing.traced('repo.restore_artifacts', tracing.cwd_attrs)
+    def restore_artifacts(self, store: Optional[ArtifactStore] = None) -> List[str]:
+        """Restore dependency builds from the shared artifact store.
+        
+        Run this after `lake update` and before `lake build`, so packages
+        already built by another checkout are copied instead of rebuilt.
+        
+        Args:
+            store: Artifact store (default: LEANUP_CACHE_DIR/artifacts)
+            
+        Returns:
+            List of restored package names
+        """
+        store = store or ArtifactStore()
+        restored = []
+        for package in self.get_lake_packages():
+            build_dir = package['build_dir']
+            if build_dir.exists() and any(build_dir.iterdir()):
+                # Lake rebuilds in place, which fails on files still linked to the store
+                store.detach(build_dir)
+                continue
+            if store.restore(self._artifact_key(package), build_dir):
+                restored.append(package['name'])
+        return restored
+    
+    @tracing.traced('repo.store_artifacts', tracing.cwd_attrs)
+    def store_artifacts(self, store: Optional[ArtifactStore] = None) -> List[str]:
+        """Add dependency builds to the shared artifact store.
+        
+        Args:
+            store: Artifact store (default: LEANUP_CACHE_DIR/artifacts)
+            
+        Returns:
+            List of stored package names
+        """
+        store = store or ArtifactStore()
+        stored = []
+        for package in self.get_lake_packages():
+            key = self._artifact_key(package)
+            if not package['build_dir'].is_dir() or store.has(key):
+                continue
+            try:
+                store.ingest(key, package['build_dir'])
+                stored.append(package['name'])
+            except OSError as e:
+                logger.error(f"Error storing artifacts of {package['name']}: {e}")
+        return stored
     
     def get_project_info(self) -> Dict[str, Any]:
         """Get comprehensive project information.
@@ -498,3 +1216,142 @@ class LeanRepo(RepoManager):
         }
         return info
 
+
+class AsyncLeanRepo(LeanRepo):
+    """LeanRepo whose command and lake methods are coroutines."""
+    
+    def __init__(self, cwd: Union[str, Path],
+                 max_concurrency: Optional[int] = None,
+                 semaphore: Optional['asyncio.Semaphore'] = None,
+                 direct_lean: bool = True):
+        """Initialize AsyncLeanRepo with working directory.
+        
+        Args:
+            cwd: Working directory path
+            max_concurrency: Maximum number of commands running at once
+            semaphore: Semaphore shared with other repositories (overrides max_concurrency)
+            direct_lean: Run lean directly in the cached `lake env` environment
+        """
+        super().__init__(cwd, direct_lean=direct_lean)
+        self.max_concurrency = max_concurrency
+        self._semaphore = semaphore
+    
+    @property
+    def semaphore(self) -> Optional['asyncio.Semaphore']:
+        """Semaphore capping concurrent commands, created inside the running loop."""
+        import asyncio
+        if self._semaphore is None and self.max_concurrency:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+    
+    async def execute_command(self, command: Union[str, List[str]],
+                              timeout: Optional[float] = None,
+                              capture: Optional[OutputCapture] = None,
+                              env: Optional[Dict[str, str]] = None) -> Tuple[str, str, int]:
+        """Execute a command in the current directory.
+        
+        Args:
+            command: Command to execute (string or list of arguments)
+            timeout: Maximum execution time in seconds
+            capture: Bounded-memory output capture settings
+            env: Environment of the command (default: inherit the current one)
+            
+        Returns:
+            Tuple containing stdout, stderr, and return code
+        """
+        with self.in_use():
+            return await async_execute_command(command, cwd=str(self.cwd), timeout=timeout,
+                                               semaphore=self.semaphore, capture=capture, env=env)
+    
+    async def lake(self, args: List[str],
+                   timeout: Optional[float] = None,
+                   capture: Optional[OutputCapture] = None) -> Tuple[str, str, int]:
+        """Execute lake command with given arguments."""
+        return await super().lake(args, timeout=timeout, capture=capture)
+    
+    async def lean(self, args: List[str],
+                   timeout: Optional[float] = None,
+                   capture: Optional[OutputCapture] = None) -> Tuple[str, str, int]:
+        """Execute lean with given arguments in the lake environment."""
+        return await super().lean(args, timeout=timeout, capture=capture)
+    
+    async def _lean(self, args: List[str],
+                    timeout: Optional[float] = None,
+                    capture: Optional[OutputCapture] = None) -> Tuple[str, str, int]:
+        """Execute lean in the lake environment without recording metrics."""
+        import asyncio
+        if self.direct_lean:
+            # Capturing the environment blocks, so do it off the event loop
+            await asyncio.get_running_loop().run_in_executor(None, self.lake_env)
+        command, env = self._lean_command(args)
+        return await self.execute_command(command, timeout=timeout, capture=capture, env=env)
+    
+    async def lake_init(self,
+                        name: Optional[str] = None,
+                        template: Optional[str] = None,
+                        language: Optional[str] = None) -> Tuple[str, str, int]:
+        """Initialize lake repository."""
+        return await super().lake_init(name, template, language)
+    
+    async def lake_build(self, target: Optional[str] = None,
+                         capture: Optional[OutputCapture] = None,
+                         profiler: Optional[BuildProfiler] = None) -> Tuple[str, str, int]:
+        """Build the Lean project using lake."""
+        if profiler is None:
+            return await super().lake_build(target, capture=capture)
+        with profiler.running():
+            return await super().lake_build(target, capture=profiler.capture(capture))
+    
+    async def lake_update(self, capture: Optional[OutputCapture] = None) -> Tuple[str, str, int]:
+        """Update dependencies using lake."""
+        return await super().lake_update(capture=capture)
+    
+    async def lake_env_lean(
+        self,
+        filepath: Union[str, Path],
+        json: bool = True,
+        options: Optional[Dict[str, Any]] = None,
+        nproc: Optional[int] = None,
+        timeout: Optional[float] = None) -> Tuple[str, str, int]:
+        """Run lean file with lake environment."""
+        return await super().lake_env_lean(filepath, json=json, options=options,
+                                           nproc=nproc, timeout=timeout)
+    
+    async def lake_clean(self, capture: Optional[OutputCapture] = None) -> Tuple[str, str, int]:
+        """Clean build artifacts using lake."""
+        return await super().lake_clean(capture=capture)
+    
+    async def lake_test(self, capture: Optional[OutputCapture] = None) -> Tuple[str, str, int]:
+        """Run tests using lake."""
+        return await super().lake_test(capture=capture)
+    
+    async def check_many(
+        self,
+        filepaths: Iterable[Union[str, Path]],
+        jobs: Optional[int] = None,
+        json: bool = True,
+        options: Optional[Dict[str, Any]] = None,
+        nproc: Optional[int] = None,
+        ordered: bool = False,
+        timeout: Optional[float] = None) -> AsyncIterator[Tuple[Union[str, Path], Tuple[str, str, int]]]:
+        """Check many Lean files concurrently, see `LeanRepo.check_many`."""
+        import asyncio
+        limit = asyncio.Semaphore(jobs or os.cpu_count() or 1)
+        
+        async def check(filepath):
+            async with limit:
+                return filepath, await self.lake_env_lean(
+                    filepath, json=json, options=options, nproc=nproc, timeout=timeout)
+        
+        failed = 0
+        with metrics.recording('repo.check_many', lambda: metrics.repo_attrs(self)) as current:
+            tasks = [asyncio.ensure_future(check(filepath)) for filepath in filepaths]
+            try:
+                for task in (tasks if ordered else asyncio.as_completed(tasks)):
+                    filepath, result = await task
+                    failed += result[2] != 0
+                    yield filepath, result
+                current.set(failed=failed)
+            finally:
+                for task in tasks:
+                    task.cancel()
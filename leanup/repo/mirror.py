@@ -0,0 +1,72 @@
+import hashlib
+import re
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Union, Generator
+
+from leanup.const import LEANUP_CACHE_DIR
+from leanup.utils.basic import execute_command
+from leanup.utils.custom_logger import setup_logger
+
+logger = setup_logger("mirror_cache")
+
+
+class MirrorCache:
+    """Local cache of bare mirror repositories.
+
+    Each upstream URL gets one `git clone --mirror` under the cache
+    directory. Later clones are made from the mirror after fetching only
+    the new objects, so repeated installs do not download the packfile
+    again.
+    """
+
+    def __init__(self, root: Optional[Union[str, Path]] = None):
+        """
+        Args:
+            root: Mirror directory (default: LEANUP_CACHE_DIR/mirrors)
+        """
+        self.root = Path(root) if root else LEANUP_CACHE_DIR / "mirrors"
+
+    def mirror_path(self, url: str) -> Path:
+        """Get the mirror location of a repository URL"""
+        name = re.sub(r'^[a-z+]+://', '', url.rstrip('/'))
+        name = re.sub(r'\.git$', '', name)
+        name = re.sub(r'[^A-Za-z0-9._-]+', '_', name).strip('_')[-80:]
+        digest = hashlib.sha256(url.encode()).hexdigest()[:8]
+        return self.root / f"{name}-{digest}.git"
+
+    @contextmanager
+    def _lock(self, path: Path) -> Generator[None, None, None]:
+        """Serialize updates of one mirror across processes."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path.with_suffix('.lock'), 'w') as lock_file:
+            try:
+                import fcntl
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            except ImportError:
+                pass
+            yield
+
+    def update(self, url: str) -> Optional[Path]:
+        """Create or refresh the mirror of a repository.
+
+        Args:
+            url: Git repository URL
+
+        Returns:
+            Path to the bare mirror, or None if it could not be updated
+        """
+        path = self.mirror_path(url)
+        with self._lock(path):
+            if (path / "HEAD").exists():
+                cmd = ["git", "--git-dir", str(path), "fetch", "--prune", "--tags", "origin"]
+                action = "update"
+            else:
+                cmd = ["git", "clone", "--mirror", url, str(path)]
+                action = "create"
+            stdout, stderr, returncode = execute_command(cmd)
+        if returncode != 0:
+            logger.error(f"Failed to {action} mirror of {url}: {stderr}")
+            return None
+        logger.debug(f"Mirror of {url} at {path} is up to date")
+        return path
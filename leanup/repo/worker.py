@@ -0,0 +1,344 @@
+import json
+import os
+import queue
+import re
+import subprocess
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional, Union, List, Dict, Any, Tuple
+
+import psutil
+
+from leanup.utils import metrics, tracing
+from leanup.utils.basic import execute_command
+from leanup.utils.custom_logger import setup_logger
+
+logger = setup_logger("lean_worker")
+
+DEFAULT_REPL_COMMAND = ["lake", "exe", "repl"]
+
+# Command checking a single file when the project has no `repl` executable
+FALLBACK_COMMAND = ["lake", "env", "lean", "--json"]
+
+
+def split_imports(content: str) -> Tuple[List[str], str]:
+    """Split the import header from the body of a Lean file.
+
+    Header lines are blanked out in the returned body, so positions reported
+    for the body still match the original file.
+
+    Args:
+        content: Lean source code
+
+    Returns:
+        Tuple containing the imported module names and the body
+    """
+    lines = content.split('\n')
+    imports = []
+    in_comment = False
+    end = 0
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if in_comment:
+            in_comment = '-/' not in stripped
+        elif stripped.startswith('/-') and not stripped.startswith('/-!'):
+            in_comment = '-/' not in stripped[2:]
+        elif not stripped or stripped.startswith('--'):
+            pass
+        elif stripped.startswith('import '):
+            imports.extend(stripped.split('--', 1)[0].split()[1:])
+        else:
+            break
+        end = i + 1
+    body = '\n' * end + '\n'.join(lines[end:])
+    return imports, body
+
+
+class LeanWorker:
+    """A long-lived Lean REPL process with its imports already loaded."""
+
+    def __init__(self, cwd: Union[str, Path],
+                 command: Optional[List[str]] = None,
+                 header: Optional[str] = None):
+        """Initialize the worker without starting it.
+
+        Args:
+            cwd: Working directory of the Lean project
+            command: Command starting the REPL (default: lake exe repl)
+            header: Import header loaded once when the worker starts
+        """
+        self.cwd = Path(cwd)
+        self.command = command or DEFAULT_REPL_COMMAND
+        self.header = header
+        self.process = None
+        self.env = None
+        self.jobs = 0
+
+    @property
+    def is_alive(self) -> bool:
+        """Check if the REPL process is running"""
+        return self.process is not None and self.process.poll() is None
+
+    def start(self) -> None:
+        """Start the REPL process and elaborate the header."""
+        self.process = subprocess.Popen(
+            self.command,
+            cwd=str(self.cwd),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1
+        )
+        self.jobs = 0
+        self.env = None
+        if self.header:
+            response = self._send({"cmd": self.header})
+            if 'env' not in response:
+                self.close()
+                raise RuntimeError(f"Failed to load header: {response}")
+            self.env = response['env']
+        logger.debug(f"Lean worker {self.process.pid} started in {self.cwd}")
+
+    def _send(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Send one request to the REPL and read its response."""
+        self.process.stdin.write(json.dumps(request) + "\n\n")
+        self.process.stdin.flush()
+        lines = []
+        while True:
+            line = self.process.stdout.readline()
+            if not line:
+                raise RuntimeError("Lean worker exited unexpectedly")
+            if line.strip():
+                lines.append(line)
+            elif lines:
+                break
+        return json.loads(''.join(lines))
+
+    def run(self, code: str, use_header: bool = True) -> Dict[str, Any]:
+        """Elaborate code in the environment of the header.
+
+        Args:
+            code: Lean code without the header imports
+            use_header: Whether to run on top of the loaded header
+
+        Returns:
+            Dict containing the REPL response
+        """
+        if not self.is_alive:
+            self.start()
+        request = {"cmd": code}
+        if use_header and self.env is not None:
+            request["env"] = self.env
+        response = self._send(request)
+        self.jobs += 1
+        return response
+
+    def memory_usage(self) -> int:
+        """Get the resident memory of the worker and its children in bytes"""
+        if not self.is_alive:
+            return 0
+        try:
+            proc = psutil.Process(self.process.pid)
+            procs = [proc] + proc.children(recursive=True)
+            return sum(p.memory_info().rss for p in procs)
+        except psutil.Error:
+            return 0
+
+    def close(self) -> None:
+        """Stop the REPL process."""
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+        except Exception:
+            pass
+        for proc in self._process_tree():
+            try:
+                proc.terminate()
+            except psutil.Error:
+                pass
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+        self.env = None
+
+    def _process_tree(self) -> List[psutil.Process]:
+        """Get the REPL process followed by its descendants"""
+        try:
+            proc = psutil.Process(self.process.pid)
+            return proc.children(recursive=True) + [proc]
+        except psutil.Error:
+            return []
+
+
+class LeanWorkerPool:
+    """Pool of Lean workers sharing one import header.
+
+    Each worker pays for the header once, so subsequent jobs only elaborate
+    the new code. Workers are restarted after `max_jobs` jobs or once their
+    memory exceeds `max_memory_mb`.
+
+    With the default command, a project without a `repl` executable falls
+    back to checking each job with `lake env lean`, which loads the
+    imports every time.
+    """
+
+    def __init__(self, cwd: Union[str, Path],
+                 size: int = 1,
+                 header: Optional[str] = None,
+                 command: Optional[List[str]] = None,
+                 max_jobs: Optional[int] = None,
+                 max_memory_mb: Optional[int] = None):
+        """Initialize the pool without starting any worker.
+
+        Args:
+            cwd: Working directory of the Lean project
+            size: Number of workers
+            header: Import header shared by all jobs, e.g. "import Mathlib"
+            command: Command starting the REPL (default: lake exe repl, or
+                lake env lean per job if the project has no repl)
+            max_jobs: Restart a worker after this many jobs
+            max_memory_mb: Restart a worker once its memory exceeds this limit
+        """
+        assert size > 0, "Pool size must be positive"
+        self.cwd = Path(cwd)
+        self.header = header
+        self.command = command
+        self.fallback = False
+        self.header_imports = set(split_imports(header)[0]) if header else set()
+        self.max_jobs = max_jobs
+        self.max_memory_mb = max_memory_mb
+        self.workers = [LeanWorker(self.cwd, command, header) for _ in range(size)]
+        self._idle = queue.Queue()
+        for worker in self.workers:
+            self._idle.put(worker)
+
+    def start(self) -> None:
+        """Start all workers concurrently so their headers load in parallel."""
+        threads = [threading.Thread(target=self._start_worker, args=(worker,))
+                   for worker in self.workers if not worker.is_alive]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _start_worker(self, worker: LeanWorker) -> None:
+        try:
+            worker.start()
+        except Exception as e:
+            if not self._repl_missing():
+                logger.error(f"Error starting Lean worker: {e}")
+
+    def _repl_missing(self) -> bool:
+        """Check if a failed worker is due to the project having no `repl` executable.
+
+        Only the default command is checked; once missing, the pool falls back
+        to `lake env lean` for all further jobs.
+        """
+        if self.fallback or self.command is not None:
+            return self.fallback
+        stdout, stderr, returncode = execute_command(DEFAULT_REPL_COMMAND, cwd=str(self.cwd), input='')
+        if returncode != 0 and re.search(r"unknown (executable|target)", stderr, re.IGNORECASE):
+            logger.warning(f"No repl executable in {self.cwd}; checking each job with "
+                           f"`{' '.join(FALLBACK_COMMAND)}` instead, which loads its imports every time. "
+                           "Add the Lean REPL to the project's dependencies to reuse the header.")
+            self.fallback = True
+        return self.fallback
+
+    def _run_fallback(self, filepath: Union[str, Path]) -> Dict[str, Any]:
+        """Check a file with `lake env lean`, in the shape of a REPL response."""
+        stdout, stderr, returncode = execute_command(FALLBACK_COMMAND + [str(filepath)], cwd=str(self.cwd))
+        messages = []
+        for line in stdout.splitlines():
+            try:
+                messages.append(json.loads(line))
+            except ValueError:
+                continue
+        if returncode != 0 and not messages:
+            return {"error": stderr.strip() or stdout.strip() or f"lean exited with {returncode}"}
+        return {"messages": messages}
+
+    def _run_code_fallback(self, code: str) -> Dict[str, Any]:
+        """Check code with `lake env lean` through a temporary file in the project."""
+        fd, path = tempfile.mkstemp(suffix='.lean', prefix='.leanup-', dir=str(self.cwd))
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(code)
+            return self._run_fallback(path)
+        finally:
+            os.unlink(path)
+
+    def _should_restart(self, worker: LeanWorker) -> bool:
+        if self.max_jobs is not None and worker.jobs >= self.max_jobs:
+            return True
+        if self.max_memory_mb is not None:
+            return worker.memory_usage() > self.max_memory_mb * 1024 * 1024
+        return False
+
+    def run(self, code: str, use_header: bool = True) -> Dict[str, Any]:
+        """Run code on the next idle worker.
+
+        Args:
+            code: Lean code without the header imports
+            use_header: Whether to run on top of the loaded header
+
+        Returns:
+            Dict containing the REPL response or an error message
+        """
+        if self.fallback:
+            return self._run_code_fallback(f"{self.header}\n{code}" if use_header and self.header else code)
+        worker = self._idle.get()
+        try:
+            response = worker.run(code, use_header=use_header)
+            if self._should_restart(worker):
+                logger.debug(f"Restarting Lean worker after {worker.jobs} jobs")
+                worker.close()
+            return response
+        except Exception as e:
+            worker.close()
+            if self._repl_missing():
+                return self.run(code, use_header=use_header)
+            logger.error(f"Error running Lean worker: {e}")
+            return {"error": str(e)}
+        finally:
+            self._idle.put(worker)
+
+    @metrics.recorded('worker.check_file', tracing.cwd_attrs)
+    def check_file(self, filepath: Union[str, Path]) -> Dict[str, Any]:
+        """Check a Lean file, reusing the loaded header when possible.
+
+        Files whose imports are covered by the header only elaborate their
+        body; other files are elaborated in full by the worker.
+
+        Args:
+            filepath: Path to the Lean file (relative to cwd)
+
+        Returns:
+            Dict containing the REPL response or an error message
+        """
+        try:
+            content = (self.cwd / filepath).read_text(encoding='utf-8')
+        except Exception as e:
+            return {"error": str(e)}
+        if self.fallback:
+            return self._run_fallback(filepath)
+        imports, body = split_imports(content)
+        if set(imports) <= self.header_imports:
+            return self.run(body)
+        return self.run(content, use_header=False)
+
+    def close(self) -> None:
+        """Stop all workers."""
+        for worker in self.workers:
+            worker.close()
+
+    def __enter__(self) -> 'LeanWorkerPool':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -1,8 +1,25 @@
+import importlib
+
 from .custom_logger import setup_logger
-from .basic import execute_command, working_directory
 
-__all__ = [
-    "setup_logger",
-    "execute_command",
-    "working_directory"
-]
\ No newline at end of file
+# Exported names and their submodules, imported on first access
+_EXPORTS = {
+    'execute_command': 'basic',
+    'async_execute_command': 'basic',
+    'stream_command': 'basic',
+    'OutputCapture': 'basic',
+    'working_directory': 'basic',
+    'Downloader': 'download',
+}
+
+__all__ = ["setup_logger"] + list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
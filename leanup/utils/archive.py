@@ -0,0 +1,128 @@
+import os
+import shutil
+import stat
+from pathlib import Path, PurePosixPath
+from typing import Optional, Union
+
+from leanup.utils.custom_logger import setup_logger
+
+logger = setup_logger("archive")
+
+
+def zstd_available() -> bool:
+    """Check if `.tar.zst` archives can be extracted (needs the zstandard package)"""
+    try:
+        import zstandard  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _strip(name: str, strip_components: int) -> Optional[str]:
+    """Drop leading path components of an archive member, or None if nothing is left."""
+    parts = PurePosixPath(name).parts[strip_components:]
+    return str(PurePosixPath(*parts)) if parts else None
+
+
+def _extract_tar_stream(fileobj, dest: Path, strip_components: int, mode: str = 'r|') -> None:
+    """Extract a tar stream member by member, without seeking."""
+    import tarfile
+    with tarfile.open(fileobj=fileobj, mode=mode) as tar:
+        for member in tar:
+            name = _strip(member.name, strip_components)
+            if name is None:
+                continue
+            member.name = name
+            if member.islnk():
+                member.linkname = _strip(member.linkname, strip_components) or ''
+            if hasattr(tarfile, 'tar_filter'):
+                tar.extract(member, dest, filter='tar')
+            else:
+                # Python without extraction filters: apply the checks of the 'tar' filter by hand
+                _check_tar_member(member, dest)
+                tar.extract(member, dest)
+
+
+def _check_tar_member(member, dest: Path) -> None:
+    """Reject a tar member that would be written or linked outside `dest`."""
+    root = os.path.realpath(dest)
+    target = dest / member.name
+    if os.path.isabs(member.name) or not _inside(target, root):
+        raise ValueError(f"Unsafe path in archive: {member.name}")
+    if member.issym():
+        link = os.path.join(target.parent, member.linkname)
+    elif member.islnk():
+        link = os.path.join(dest, member.linkname)
+    else:
+        link = None
+    if link is not None and (os.path.isabs(member.linkname) or not _inside(link, root)):
+        raise ValueError(f"Unsafe link in archive: {member.name} -> {member.linkname}")
+    member.mode &= ~(stat.S_ISUID | stat.S_ISGID)
+
+
+def _inside(path: Union[str, Path], root: str) -> bool:
+    """Check if `path`, with symlinks resolved, is `root` or below it."""
+    return os.path.commonpath([os.path.realpath(path), root]) == root
+
+
+def _extract_zip(path: Path, dest: Path, strip_components: int) -> None:
+    import zipfile
+    root = os.path.realpath(dest)
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            name = _strip(info.filename, strip_components)
+            if name is None:
+                continue
+            target = dest / name
+            # Resolve symlinks, so a member cannot be written through a link extracted before it
+            if not _inside(target, root):
+                raise ValueError(f"Unsafe path in archive: {info.filename}")
+            mode = info.external_attr >> 16
+            if info.is_dir():
+                target.mkdir(parents=True, exist_ok=True)
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if stat.S_ISLNK(mode):
+                link = archive.read(info).decode()
+                if not _inside(os.path.join(target.parent, link), root):
+                    raise ValueError(f"Unsafe symlink in archive: {info.filename} -> {link}")
+                os.symlink(link, target)
+                continue
+            with archive.open(info) as src, open(target, 'wb') as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            if mode & 0o777:
+                target.chmod(mode & 0o777)
+
+
+def extract_archive(path: Union[str, Path], dest: Union[str, Path], strip_components: int = 0,
+                    name: Optional[str] = None) -> None:
+    """Extract a `.tar.zst`, `.tar.gz`, `.tar` or `.zip` archive.
+
+    Tar archives are decompressed as a stream straight into `dest`; zip
+    archives keep their Unix permissions and symlinks.
+
+    Args:
+        path: Archive file
+        dest: Target directory
+        strip_components: Number of leading path components to drop, like `tar --strip-components`
+        name: File name that determines the format (default: name of `path`)
+
+    Raises:
+        ValueError: If the archive format is unknown or a member or a link
+            escapes `dest`
+    """
+    path, dest = Path(path), Path(dest)
+    dest.mkdir(parents=True, exist_ok=True)
+    name = (name or path.name).lower()
+    if name.endswith('.zip'):
+        _extract_zip(path, dest, strip_components)
+    elif name.endswith('.tar.zst'):
+        import zstandard
+        with open(path, 'rb') as f:
+            reader = zstandard.ZstdDecompressor().stream_reader(f, read_size=1024 * 1024)
+            _extract_tar_stream(reader, dest, strip_components)
+    elif name.endswith(('.tar.gz', '.tgz', '.tar')):
+        with open(path, 'rb') as f:
+            _extract_tar_stream(f, dest, strip_components, mode='r|*')
+    else:
+        raise ValueError(f"Unknown archive format: {path}")
@@ -1,21 +1,188 @@
+import re
 import tempfile
+import threading
 import subprocess
+from collections import deque
 from leanup.const import OS_TYPE, TMP_DIR
+from leanup.utils import tracing
 import shlex
-from typing import Optional, Union, Tuple, List, Generator
+from typing import Optional, Union, Tuple, List, Dict, Generator, Sequence, IO, Callable
 from contextlib import contextmanager
 from pathlib import Path
 import os
 
+# Return code reported when a command is killed for exceeding its deadline.
+# Negative like a death by signal, but beyond any signal number, so no exit
+# status of the command itself can be mistaken for it
+TIMEOUT_RETURNCODE = -1000
+
+# Seconds between SIGTERM and SIGKILL when killing a process group
+KILL_GRACE_PERIOD = 5
+
+# Longest piece of a line read at once by a bounded capture, in characters;
+# longer lines are captured in pieces
+READ_CHUNK = 64 * 1024
+
+# Lines kept from the omitted part of a bounded capture
+DEFAULT_ERROR_PATTERNS = (r'(?i)\berror\b', r'✖', r'(?i)\bfailed\b')
+
+class OutputCapture:
+    """
+    Bounded-memory capture settings for command output.
+
+    Instead of buffering everything, each stream keeps only its last
+    `tail_kb` KB of UTF-8 output plus the earlier lines matching
+    `error_patterns`. The full output can additionally be appended to
+    `spill_file`, and every line can be observed as it arrives through
+    `on_line`. Lines longer than READ_CHUNK characters are read, matched
+    and observed in pieces, so one line never has to fit in memory.
+    """
+
+    def __init__(self,
+                 tail_kb: int = 64,
+                 spill_file: Optional[Union[str, Path]] = None,
+                 error_patterns: Sequence[str] = DEFAULT_ERROR_PATTERNS,
+                 max_error_lines: int = 1000,
+                 on_line: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            tail_kb: Size of the kept tail of each stream in KB
+            spill_file: File receiving the full output of both streams
+            error_patterns: Regexes of lines kept even outside the tail
+            max_error_lines: Maximum number of matching lines kept per stream
+            on_line: Callback receiving each line of either stream; it may be
+                called from several threads
+        """
+        self.tail_bytes = tail_kb * 1024
+        self.spill_file = Path(spill_file) if spill_file else None
+        self.error_regexes = [re.compile(pattern) for pattern in error_patterns]
+        self.max_error_lines = max_error_lines
+        self.on_line = on_line
+
+    def is_error_line(self, line: str) -> bool:
+        """Check whether a line matches any error pattern."""
+        return any(regex.search(line) for regex in self.error_regexes)
+
+    def open_spill(self) -> Optional[IO[str]]:
+        """Open the spill file for appending, if one is configured."""
+        if self.spill_file is None:
+            return None
+        self.spill_file.parent.mkdir(parents=True, exist_ok=True)
+        return open(self.spill_file, 'a', encoding='utf-8')
+
+
+class _BoundedBuffer:
+    """Ring buffer of output lines plus the error lines dropped from it, sized in UTF-8 bytes."""
+
+    def __init__(self, capture: OutputCapture, spill: Optional[IO[str]], lock: threading.Lock):
+        self.capture = capture
+        self.spill = spill
+        self.lock = lock
+        self.tail = deque()
+        self.tail_size = 0
+        self.errors = []
+        self.dropped = 0
+
+    def feed(self, line: str) -> None:
+        if self.capture.on_line is not None:
+            self.capture.on_line(line)
+        if self.spill is not None:
+            with self.lock:
+                self.spill.write(line)
+        size = len(line.encode('utf-8', errors='replace'))
+        self.tail.append((line, size))
+        self.tail_size += size
+        while self.tail_size > self.capture.tail_bytes:
+            old, size = self.tail[0]
+            excess = self.tail_size - self.capture.tail_bytes
+            if len(self.tail) == 1 or (excess < size and not old.endswith('\n')):
+                # Keep the end of a line longer than the tail
+                self._trim_head(excess)
+                break
+            self.tail.popleft()
+            self.tail_size -= size
+            self.dropped += size
+            if len(self.errors) < self.capture.max_error_lines and self.capture.is_error_line(old):
+                self.errors.append(old)
+
+    def _trim_head(self, excess: int) -> None:
+        """Drop `excess` bytes from the start of the oldest piece, without splitting a character."""
+        old, size = self.tail[0]
+        kept = old.encode('utf-8', errors='replace')[excess:].decode('utf-8', errors='ignore')
+        kept_size = len(kept.encode('utf-8'))
+        self.tail[0] = (kept, kept_size)
+        self.tail_size -= size - kept_size
+        self.dropped += size - kept_size
+
+    def getvalue(self) -> str:
+        if not self.dropped:
+            return ''.join(line for line, _ in self.tail)
+        return (''.join(self.errors)
+                + f"... [{self.dropped} bytes omitted] ...\n"
+                + ''.join(line for line, _ in self.tail))
+
+def _process_group_kwargs() -> dict:
+    """Popen arguments starting the child in its own process group."""
+    if OS_TYPE == 'Windows':
+        return {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {'start_new_session': True}
+
+def kill_process_group(process: subprocess.Popen, grace: float = KILL_GRACE_PERIOD) -> None:
+    """
+    Kill a child started with its own process group, including grandchildren.
+
+    Sends SIGTERM to the whole group, then SIGKILL to whatever is left
+    after `grace` seconds. On Windows the process tree is killed instead.
+
+    Args:
+        process: Child process started by this module
+        grace: Seconds to wait between SIGTERM and SIGKILL
+    """
+    if OS_TYPE == 'Windows':
+        import psutil
+        try:
+            parent = psutil.Process(process.pid)
+            procs = parent.children(recursive=True) + [parent]
+        except psutil.Error:
+            procs = []
+        for proc in procs:
+            try:
+                proc.kill()
+            except psutil.Error:
+                pass
+        return
+    import signal
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(process.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            return
+        if sig == signal.SIGTERM:
+            try:
+                process.wait(timeout=grace)
+            except subprocess.TimeoutExpired:
+                pass
+            # The leader may exit on SIGTERM while the rest of the group lingers
+            try:
+                os.killpg(process.pid, 0)
+            except (ProcessLookupError, PermissionError):
+                return
+
 def execute_command(command: Union[str, List[str]],
         cwd: Optional[str] = None,
         text: bool = True,
         input: Union[str, None] = None,
         capture_output: bool = True,
-        timeout: Optional[int] = None) -> Tuple[str, str, int]:
+        timeout: Optional[float] = None,
+        capture: Optional[OutputCapture] = None,
+        env: Optional[Dict[str, str]] = None) -> Tuple[str, str, int]:
     """
     Execute command with subprocess.Popen.
 
+    The child runs in its own process group. When the timeout expires, or
+    the caller is interrupted, the whole group is killed so no grandchild
+    outlives the call.
+
     Args:
         command: Command to execute (string or list of arguments)
         cwd: Working directory path
@@ -23,10 +190,49 @@ def execute_command(command: Union[str, List[str]],
         input: Input string to pass to command
         capture_output: Whether to capture stdout/stderr
         timeout: Maximum execution time in seconds
+        capture: Bounded-memory capture settings; output is returned as text
+        env: Environment of the child (default: inherit the current one)
 
     Returns:
-        Tuple containing stdout, stderr, and return code
+        Tuple containing stdout, stderr, and return code. On timeout the
+        output produced so far is returned with TIMEOUT_RETURNCODE.
     """
+    if tracing.get_tracer() is None:
+        # A span measured while tracing is off still collects the child's peak RSS
+        return _execute_command(command, cwd, text, input, capture_output, timeout, capture, env,
+                                popen=tracing.popen_class())
+    with _command_span(command, cwd) as span:
+        result = _execute_command(command, cwd, text, input, capture_output, timeout, capture, env,
+                                  popen=tracing.popen_class())
+        _record_result(span, result)
+    return result
+
+@contextmanager
+def _command_span(command: Union[str, List[str]], cwd: Optional[str]) -> Generator['tracing.Span', None, None]:
+    """Span of one external command."""
+    argv = command if isinstance(command, str) else [str(arg) for arg in command]
+    with tracing.span(tracing.command_name(command), argv=argv, cwd=str(cwd or os.getcwd())) as span:
+        yield span
+
+def _record_result(span: 'tracing.Span', result: Tuple[Union[str, bytes], Union[str, bytes], int]) -> None:
+    """Record a command's exit code and output size in its span."""
+    stdout, stderr, returncode = result
+    span.set(returncode=returncode,
+             stdout_bytes=tracing.output_size(stdout),
+             stderr_bytes=tracing.output_size(stderr))
+
+def _execute_command(command: Union[str, List[str]],
+        cwd: Optional[str],
+        text: bool,
+        input: Union[str, None],
+        capture_output: bool,
+        timeout: Optional[float],
+        capture: Optional[OutputCapture],
+        env: Optional[Dict[str, str]],
+        popen: Optional[type] = None) -> Tuple[str, str, int]:
+    """Execute command, see `execute_command`."""
+    if capture is not None and capture_output:
+        return _execute_bounded(command, cwd, input, timeout, capture, env, popen)
     process = None
     try:
         stdout_pipe = subprocess.PIPE if capture_output else None
@@ -34,22 +240,344 @@ def execute_command(command: Union[str, List[str]],
         # Handle string commands
         if isinstance(command, str) and OS_TYPE != 'Windows':
             command = shlex.split(command)
-        process = subprocess.Popen(
+        process = (popen or subprocess.Popen)(
                 command,
                 cwd=cwd,
                 stdout=stdout_pipe,
                 stderr=stderr_pipe,
                 shell=OS_TYPE == 'Windows',
-                text=text
+                text=text,
+                env=env,
+                **_process_group_kwargs()
             )
         stdout, stderr = process.communicate(input=input, timeout=timeout)
         returncode = process.returncode
         stdout = stdout or ""
         stderr = stderr or ""
+    except subprocess.TimeoutExpired as e:
+        kill_process_group(process)
+        try:
+            stdout, stderr = process.communicate(timeout=KILL_GRACE_PERIOD)
+        except subprocess.TimeoutExpired:
+            stdout, stderr = e.stdout, e.stderr
+        stdout = _as_text(stdout, text)
+        stderr = _as_text(stderr, text) + _as_text(f"\nCommand timed out after {timeout} seconds", text)
+        returncode = TIMEOUT_RETURNCODE
+    except BaseException as e:
+        if process is not None and process.poll() is None:
+            kill_process_group(process)
+        if not isinstance(e, Exception):
+            raise
+        stdout, stderr, returncode = "", str(e), -1
+    return stdout, stderr, returncode
+
+def _execute_bounded(command: Union[str, List[str]],
+        cwd: Optional[str],
+        input: Union[str, None],
+        timeout: Optional[float],
+        capture: OutputCapture,
+        env: Optional[Dict[str, str]] = None,
+        popen: Optional[type] = None) -> Tuple[str, str, int]:
+    """Execute command reading its output line by line into bounded buffers."""
+    process = None
+    spill = None
+    threads = []
+    try:
+        if isinstance(command, str) and OS_TYPE != 'Windows':
+            command = shlex.split(command)
+        spill = capture.open_spill()
+        lock = threading.Lock()
+        buffers = (_BoundedBuffer(capture, spill, lock), _BoundedBuffer(capture, spill, lock))
+        process = (popen or subprocess.Popen)(
+                command,
+                cwd=cwd,
+                stdin=subprocess.PIPE if input is not None else None,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                shell=OS_TYPE == 'Windows',
+                text=True,
+                errors='replace',
+                env=env,
+                **_process_group_kwargs()
+            )
+        for stream, buffer in zip((process.stdout, process.stderr), buffers):
+            thread = threading.Thread(target=_pump_lines, args=(stream, buffer), daemon=True)
+            thread.start()
+            threads.append(thread)
+        if input is not None:
+            try:
+                process.stdin.write(input)
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+        timed_out = False
+        try:
+            returncode = process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            kill_process_group(process)
+            returncode = process.wait()
+        for thread in threads:
+            thread.join()
+        stdout, stderr = (buffer.getvalue() for buffer in buffers)
+        if timed_out:
+            stderr += f"\nCommand timed out after {timeout} seconds"
+            returncode = TIMEOUT_RETURNCODE
+    except BaseException as e:
+        if process is not None and process.poll() is None:
+            kill_process_group(process)
+        for thread in threads:
+            thread.join(timeout=KILL_GRACE_PERIOD)
+        if not isinstance(e, Exception):
+            raise
+        stdout, stderr, returncode = "", str(e), -1
+    finally:
+        if spill is not None:
+            spill.close()
+    return stdout, stderr, returncode
+
+def _pump_lines(stream: IO[str], buffer: _BoundedBuffer) -> None:
+    """Feed every line of a stream into a buffer until EOF."""
+    with stream:
+        for line in iter(lambda: stream.readline(READ_CHUNK), ''):
+            buffer.feed(line)
+
+def _as_text(data: Union[str, bytes, None], text: bool) -> Union[str, bytes]:
+    """Normalize partial output to the requested type."""
+    if data is None:
+        return "" if text else b""
+    if text and isinstance(data, bytes):
+        return data.decode(errors='replace')
+    if not text and isinstance(data, str):
+        return data.encode()
+    return data
+
+def stream_command(command: Union[str, List[str]],
+        cwd: Optional[str] = None,
+        env: Optional[Dict[str, str]] = None) -> Generator[str, None, None]:
+    """
+    Execute command and yield its output line by line as it is produced.
+
+    Stderr is merged into stdout. Closing the generator early terminates
+    the child process.
+
+    Args:
+        command: Command to execute (string or list of arguments)
+        cwd: Working directory path
+        env: Environment of the child (default: inherit the current one)
+
+    Yields:
+        Output lines without trailing newlines
+    """
+    if isinstance(command, str) and OS_TYPE != 'Windows':
+        command = shlex.split(command)
+    tracer = tracing.get_tracer()
+    # Not made current: the generator is suspended between lines
+    span = tracer.start_span(tracing.command_name(command), argv=command,
+                             cwd=str(cwd or os.getcwd())) if tracer is not None else None
+    try:
+        process = subprocess.Popen(
+                command,
+                cwd=cwd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                shell=OS_TYPE == 'Windows',
+                text=True,
+                bufsize=1,
+                env=env,
+                **_process_group_kwargs()
+            )
+    except BaseException as e:
+        if span is not None:
+            span.set(error=repr(e))
+            span.finish()
+        raise
+    output_bytes = 0
+    try:
+        for line in process.stdout:
+            if span is not None:
+                output_bytes += tracing.output_size(line)
+            yield line.rstrip('\n')
+    finally:
+        if process.poll() is None:
+            kill_process_group(process, grace=0)
+        process.stdout.close()
+        process.wait()
+        if span is not None:
+            span.set(returncode=process.returncode, stdout_bytes=output_bytes)
+            span.finish()
+
+async def async_execute_command(command: Union[str, List[str]],
+        cwd: Optional[str] = None,
+        text: bool = True,
+        input: Union[str, None] = None,
+        capture_output: bool = True,
+        timeout: Optional[float] = None,
+        semaphore: Optional['asyncio.Semaphore'] = None,
+        capture: Optional[OutputCapture] = None,
+        env: Optional[Dict[str, str]] = None) -> Tuple[str, str, int]:
+    """
+    Execute command with asyncio subprocesses.
+
+    Same contract as `execute_command`, but awaits the child instead of
+    blocking the calling thread. Cancelling the coroutine or exceeding the
+    timeout kills the child's whole process group.
+
+    Args:
+        command: Command to execute (string or list of arguments)
+        cwd: Working directory path
+        text: Whether to return output as text
+        input: Input string to pass to command
+        capture_output: Whether to capture stdout/stderr
+        timeout: Maximum execution time in seconds
+        semaphore: Semaphore limiting the number of concurrent commands
+        capture: Bounded-memory capture settings; output is returned as text
+        env: Environment of the child (default: inherit the current one)
+
+    Returns:
+        Tuple containing stdout, stderr, and return code. On timeout the
+        output produced so far is returned with TIMEOUT_RETURNCODE.
+    """
+    if semaphore is not None:
+        async with semaphore:
+            return await async_execute_command(
+                command, cwd=cwd, text=text, input=input,
+                capture_output=capture_output, timeout=timeout, capture=capture, env=env)
+    if tracing.get_tracer() is None:
+        return await _async_execute_command(command, cwd, text, input, capture_output, timeout, capture, env)
+    with _command_span(command, cwd) as span:
+        result = await _async_execute_command(command, cwd, text, input, capture_output, timeout, capture, env)
+        _record_result(span, result)
+    return result
+
+async def _async_execute_command(command: Union[str, List[str]],
+        cwd: Optional[str],
+        text: bool,
+        input: Union[str, None],
+        capture_output: bool,
+        timeout: Optional[float],
+        capture: Optional[OutputCapture],
+        env: Optional[Dict[str, str]]) -> Tuple[str, str, int]:
+    """Execute command with asyncio subprocesses, see `async_execute_command`."""
+    # Already loaded by the running event loop; imported here to keep the
+    # synchronous API cheap to import
+    import asyncio
+    process = None
+    readers = []
+    spill = None
+    try:
+        stdout_pipe = asyncio.subprocess.PIPE if capture_output else None
+        stderr_pipe = asyncio.subprocess.PIPE if capture_output else None
+        stdin_pipe = asyncio.subprocess.PIPE if input is not None else None
+        if OS_TYPE == 'Windows':
+            if not isinstance(command, str):
+                command = subprocess.list2cmdline(command)
+            process = await asyncio.create_subprocess_shell(
+                command, cwd=cwd, stdin=stdin_pipe,
+                stdout=stdout_pipe, stderr=stderr_pipe, env=env,
+                **_process_group_kwargs())
+        else:
+            if isinstance(command, str):
+                command = shlex.split(command)
+            process = await asyncio.create_subprocess_exec(
+                *command, cwd=cwd, stdin=stdin_pipe,
+                stdout=stdout_pipe, stderr=stderr_pipe, env=env,
+                **_process_group_kwargs())
+        if capture is not None:
+            spill = capture.open_spill()
+            lock = threading.Lock()
+            outputs = (_BoundedBuffer(capture, spill, lock), _BoundedBuffer(capture, spill, lock))
+        else:
+            outputs = (bytearray(), bytearray())
+        readers = [asyncio.ensure_future(_read_stream(stream, buffer))
+                   for stream, buffer in zip((process.stdout, process.stderr), outputs)]
+        if input is not None:
+            process.stdin.write(input.encode() if isinstance(input, str) else input)
+            await process.stdin.drain()
+            process.stdin.close()
+        timed_out = False
+        try:
+            await asyncio.wait_for(process.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            await _kill_async_process(process)
+        await asyncio.gather(*readers)
+        if capture is not None:
+            stdout, stderr = (buffer.getvalue().encode() for buffer in outputs)
+        else:
+            stdout, stderr = (bytes(buffer) for buffer in outputs)
+        returncode = process.returncode
+        if timed_out:
+            stderr += f"\nCommand timed out after {timeout} seconds".encode()
+            returncode = TIMEOUT_RETURNCODE
+        if text or capture is not None:
+            stdout = stdout.decode(errors='replace')
+            stderr = stderr.decode(errors='replace')
+    except asyncio.CancelledError:
+        await _kill_async_process(process)
+        raise
     except Exception as e:
+        await _kill_async_process(process)
         stdout, stderr, returncode = "", str(e), -1
+    finally:
+        for reader in readers:
+            reader.cancel()
+        if spill is not None:
+            spill.close()
     return stdout, stderr, returncode
 
+async def _read_stream(stream: Optional['asyncio.StreamReader'],
+                       buffer: Union[bytearray, _BoundedBuffer]) -> None:
+    """Read a child stream until EOF, keeping whatever arrived."""
+    import asyncio
+    import codecs
+    if stream is None:
+        return
+    # Pieces of long lines may end inside a multi-byte character
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    while True:
+        if isinstance(buffer, _BoundedBuffer):
+            try:
+                chunk = await stream.readuntil(b'\n')
+            except asyncio.IncompleteReadError as e:
+                chunk = e.partial
+            except asyncio.LimitOverrunError as e:
+                # Line longer than the stream limit, which is left buffered
+                chunk = await stream.read(max(e.consumed, 1))
+            text = decoder.decode(chunk, final=not chunk)
+            if text:
+                buffer.feed(text)
+        else:
+            chunk = await stream.read(65536)
+            buffer.extend(chunk)
+        if not chunk:
+            return
+
+async def _kill_async_process(process, grace: float = KILL_GRACE_PERIOD) -> None:
+    """Kill an asyncio child and its process group if it is still running."""
+    import asyncio
+    if process is None or process.returncode is not None:
+        return
+    if OS_TYPE == 'Windows':
+        kill_process_group(process)
+        await process.wait()
+        return
+    import signal
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(process.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            break
+        try:
+            await asyncio.wait_for(process.wait(), timeout=grace)
+            # Grandchildren may outlive the leader
+            os.killpg(process.pid, 0)
+        except asyncio.TimeoutError:
+            continue
+        except (ProcessLookupError, PermissionError):
+            break
+    await process.wait()
+
 @contextmanager
 def working_directory(
     path: Optional[Union[str, Path]] = None,
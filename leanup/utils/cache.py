@@ -0,0 +1,166 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Union, Tuple, Dict
+
+from leanup.const import LEANUP_CACHE_DIR
+from leanup.utils.custom_logger import setup_logger
+
+logger = setup_logger("result_cache")
+
+
+class ResultCache:
+    """On-disk LRU cache of command results keyed by content hashes.
+
+    Entries are stored as JSON files under `cache_dir`, sharded by the first
+    two characters of their key. The least recently used entries are
+    evicted once the total size exceeds `max_size`. A small in-memory layer
+    serves repeated lookups without touching the disk.
+    """
+
+    def __init__(self, cache_dir: Optional[Union[str, Path]] = None,
+                 max_size: int = 1024 ** 3,
+                 memory_entries: int = 256):
+        """Initialize the cache.
+
+        Args:
+            cache_dir: Cache directory (default: LEANUP_CACHE_DIR/results)
+            max_size: Maximum total size of the entries on disk in bytes
+            memory_entries: Number of entries also kept in memory
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir else LEANUP_CACHE_DIR / "results"
+        self.max_size = max_size
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._index = None
+        self._size = 0
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _load_index(self) -> None:
+        """Scan the cache directory once, ordering entries by last use."""
+        entries = []
+        if self.cache_dir.exists():
+            for path in self.cache_dir.glob("*/*.json"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, path.stem, stat.st_size))
+        entries.sort()
+        self._index = OrderedDict((key, size) for _, key, size in entries)
+        self._size = sum(self._index.values())
+
+    def get(self, key: str) -> Optional[Tuple[str, str, int]]:
+        """Get a cached result.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Tuple containing stdout, stderr, and return code, or None on a miss
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+            if self._index is None:
+                self._load_index()
+            if key not in self._index:
+                self.misses += 1
+                return None
+            path = self._path(key)
+            try:
+                data = json.loads(path.read_text(encoding='utf-8'))
+                result = (data['stdout'], data['stderr'], data['returncode'])
+                os.utime(path)
+            except Exception as e:
+                logger.debug(f"Dropping unreadable cache entry {key}: {e}")
+                self._size -= self._index.pop(key)
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            self._remember(key, result)
+            self.hits += 1
+            return result
+
+    def put(self, key: str, result: Tuple[str, str, int]) -> None:
+        """Store a result and evict old entries beyond the size cap.
+
+        Args:
+            key: Cache key
+            result: Tuple containing stdout, stderr, and return code
+        """
+        stdout, stderr, returncode = result
+        content = json.dumps({'stdout': stdout, 'stderr': stderr, 'returncode': returncode})
+        with self._lock:
+            if self._index is None:
+                self._load_index()
+            path = self._path(key)
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+                tmp_path.write_text(content, encoding='utf-8')
+                os.replace(tmp_path, path)
+            except Exception as e:
+                logger.error(f"Failed to write cache entry {key}: {e}")
+                return
+            self._size -= self._index.pop(key, 0)
+            self._index[key] = path.stat().st_size
+            self._size += self._index[key]
+            self._remember(key, result)
+            self._evict()
+
+    def _remember(self, key: str, result: Tuple[str, str, int]) -> None:
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self) -> None:
+        while self._size > self.max_size and self._index:
+            key, size = self._index.popitem(last=False)
+            self._size -= size
+            self._memory.pop(key, None)
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+
+    def clear(self) -> None:
+        """Remove all cached entries."""
+        with self._lock:
+            if self._index is None:
+                self._load_index()
+            for key in list(self._index):
+                try:
+                    self._path(key).unlink()
+                except OSError:
+                    pass
+            self._index.clear()
+            self._memory.clear()
+            self._size = 0
+
+    @property
+    def size(self) -> int:
+        """Total size of the entries on disk in bytes"""
+        with self._lock:
+            if self._index is None:
+                self._load_index()
+            return self._size
+
+    def stats(self) -> Dict[str, int]:
+        """Get hit/miss counters and current usage"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._index or {}),
+            'size': self.size,
+        }
@@ -1,27 +1,37 @@
 import logging
 from pathlib import Path
 from typing import Optional, Union, Literal
-import colorama
-from colorama import Fore, Style
 
-# Initialize colorama for Windows support
-colorama.init()
 
 class ColoredFormatter(logging.Formatter):
     """Custom formatter adding colors to log levels"""
     
-    COLORS = {
-        'DEBUG': Fore.BLUE,
-        'INFO': Fore.GREEN,
-        'WARNING': Fore.YELLOW,
-        'ERROR': Fore.RED,
-        'CRITICAL': Fore.RED + Style.BRIGHT
-    }
+    # Filled in on first use, so colorama is only loaded when a colored
+    # record is actually formatted
+    COLORS = None
+    RESET = ''
+
+    @classmethod
+    def _init_colors(cls):
+        import colorama
+        from colorama import Fore, Style
+        # Initialize colorama for Windows support
+        colorama.init()
+        cls.RESET = Style.RESET_ALL
+        cls.COLORS = {
+            'DEBUG': Fore.BLUE,
+            'INFO': Fore.GREEN,
+            'WARNING': Fore.YELLOW,
+            'ERROR': Fore.RED,
+            'CRITICAL': Fore.RED + Style.BRIGHT
+        }
 
     def format(self, record):
         # Add colors if the output is to console
         if hasattr(record, 'color_enabled') and record.color_enabled:
-            record.levelname = f"{self.COLORS.get(record.levelname, '')}{record.levelname}{Style.RESET_ALL}"
+            if self.COLORS is None:
+                self._init_colors()
+            record.levelname = f"{self.COLORS.get(record.levelname, '')}{record.levelname}{self.RESET}"
         return super().format(record)
 
 def setup_logger(
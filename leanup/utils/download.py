@@ -0,0 +1,276 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Union, Dict, Any, Generator
+
+import requests
+import urllib3
+
+from leanup.const import LEANUP_CACHE_DIR
+from leanup.utils.custom_logger import setup_logger
+
+logger = setup_logger("downloader")
+
+# Bounds of the adaptive read size; it doubles while reads are fast and
+# halves when they stall
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+FAST_READ_SECONDS = 0.1
+SLOW_READ_SECONDS = 1.0
+
+
+def file_sha256(path: Union[str, Path]) -> str:
+    """Compute the SHA-256 of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(MAX_CHUNK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DownloadError(Exception):
+    """Raised when a download fails or does not match its checksum"""
+
+
+class Downloader:
+    """Resumable, checksum-verified HTTP downloads with an on-disk cache.
+
+    Each URL gets an entry under `cache_dir` holding the payload, its
+    SHA-256 and the response's ETag. Fresh entries are served without any
+    network access; stale ones are revalidated with `If-None-Match`, and
+    the cached copy is used if the server cannot be reached. Interrupted
+    transfers continue from the partial file with an HTTP Range request.
+
+    Example:
+        >>> path = Downloader().fetch("https://elan.lean-lang.org/elan-init.sh")
+    """
+
+    def __init__(self, cache_dir: Optional[Union[str, Path]] = None,
+                 max_age: Optional[float] = 7 * 24 * 3600,
+                 retries: int = 3,
+                 timeout: float = 30):
+        """
+        Args:
+            cache_dir: Cache directory (default: LEANUP_CACHE_DIR/downloads)
+            max_age: Seconds a cached entry is used without revalidation
+                (None: never revalidate)
+            retries: Attempts after a failed or interrupted transfer
+            timeout: Connect and read timeout of each request in seconds
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir else LEANUP_CACHE_DIR / "downloads"
+        self.max_age = max_age
+        self.retries = retries
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        """Persistent HTTP session of the current thread"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def entry_dir(self, url: str) -> Path:
+        """Get the cache entry directory of a URL"""
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return self.cache_dir / key[:2] / key
+
+    @contextmanager
+    def _lock(self, entry: Path) -> Generator[None, None, None]:
+        """Serialize transfers of one URL across threads and processes."""
+        entry.mkdir(parents=True, exist_ok=True)
+        with open(entry / 'lock', 'w') as lock_file:
+            try:
+                import fcntl
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            except ImportError:
+                pass
+            yield
+
+    @staticmethod
+    def _read_json(path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_json(path: Path, data: Dict[str, Any]) -> None:
+        tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp.write_text(json.dumps(data), encoding='utf-8')
+        os.replace(tmp, path)
+
+    def cached(self, url: str, sha256: Optional[str] = None) -> Optional[Path]:
+        """Get the cached payload of a URL without any network access.
+
+        Args:
+            url: Download URL
+            sha256: Expected SHA-256 of the payload
+
+        Returns:
+            Path to the cached payload, or None if it is missing, does not
+            match `sha256` or no longer matches the digest recorded when it
+            was downloaded
+        """
+        entry = self.entry_dir(url)
+        meta = self._read_json(entry / 'meta.json')
+        if meta is None or not (entry / 'data').is_file():
+            return None
+        if sha256 and meta.get('sha256') != sha256.lower():
+            return None
+        if (entry / 'data').stat().st_size != meta.get('size') or file_sha256(entry / 'data') != meta.get('sha256'):
+            logger.warning(f"Cached download of {url} is corrupted, discarding it")
+            return None
+        return entry / 'data'
+
+    def fetch(self, url: str, sha256: Optional[str] = None, refresh: bool = False) -> Path:
+        """Download a URL into the cache, reusing the cached copy where possible.
+
+        Args:
+            url: Download URL
+            sha256: Expected SHA-256 of the payload; a cached copy with this
+                digest is always used as is
+            refresh: Revalidate the cached copy even if it is fresh
+
+        Returns:
+            Path to the cached payload
+
+        Raises:
+            DownloadError: If the download fails and nothing usable is cached
+        """
+        entry = self.entry_dir(url)
+        with self._lock(entry):
+            meta = self._read_json(entry / 'meta.json')
+            path = self.cached(url, sha256)
+            if path is not None and not refresh:
+                age = time.time() - meta.get('fetched_at', 0)
+                if sha256 or self.max_age is None or age < self.max_age:
+                    logger.debug(f"Using cached download of {url}")
+                    return path
+            try:
+                return self._transfer(url, entry, meta if path is not None else None, sha256)
+            except (requests.RequestException, OSError) as e:
+                if path is not None:
+                    logger.warning(f"Could not revalidate {url}, using cached copy: {e}")
+                    return path
+                raise DownloadError(f"Failed to download {url}: {e}") from e
+
+    def _transfer(self, url: str, entry: Path, meta: Optional[Dict[str, Any]],
+                  sha256: Optional[str]) -> Path:
+        """Fetch the payload over HTTP, resuming and retrying as needed."""
+        part = entry / 'data.part'
+        part_meta_path = entry / 'part.json'
+        for attempt in range(self.retries + 1):
+            # Ranges and checksums refer to the raw bytes, so ask for no content coding
+            headers = {'Accept-Encoding': 'identity'}
+            if meta is not None and meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            part_meta = self._read_json(part_meta_path) or {}
+            offset = part.stat().st_size if part.exists() and part_meta.get('url') == url else 0
+            if offset:
+                headers['Range'] = f"bytes={offset}-"
+                if part_meta.get('etag'):
+                    headers['If-Range'] = part_meta['etag']
+            try:
+                with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                    if response.status_code == 304 and meta is not None:
+                        meta['fetched_at'] = time.time()
+                        self._write_json(entry / 'meta.json', meta)
+                        logger.debug(f"Cached download of {url} is up to date")
+                        return entry / 'data'
+                    if response.status_code == 416:
+                        # The partial file is stale; start over
+                        part.unlink()
+                        continue
+                    response.raise_for_status()
+                    if response.status_code != 206:
+                        offset = 0
+                    etag = response.headers.get('ETag')
+                    self._write_json(part_meta_path, {'url': url, 'etag': etag})
+                    digest = self._write_body(response, part, offset)
+                    length = response.headers.get('Content-Length')
+                    if length is not None and part.stat().st_size != offset + int(length):
+                        raise requests.ConnectionError(
+                            f"Connection closed after {part.stat().st_size - offset} of {length} bytes")
+            except (requests.ConnectionError, requests.Timeout,
+                    requests.exceptions.ChunkedEncodingError, urllib3.exceptions.HTTPError) as e:
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"Download of {url} interrupted, retrying: {e}")
+                time.sleep(min(0.5 * 2 ** attempt, 10))
+                continue
+            except requests.HTTPError as e:
+                status = e.response.status_code if e.response is not None else 0
+                if status < 500 or attempt == self.retries:
+                    raise
+                logger.warning(f"Download of {url} failed with {status}, retrying")
+                time.sleep(min(0.5 * 2 ** attempt, 10))
+                continue
+
+            if sha256 and digest != sha256.lower():
+                part.unlink()
+                raise DownloadError(f"Checksum mismatch for {url}: expected {sha256}, got {digest}")
+            os.replace(part, entry / 'data')
+            part_meta_path.unlink()
+            self._write_json(entry / 'meta.json', {
+                'url': url,
+                'etag': etag,
+                'sha256': digest,
+                'size': (entry / 'data').stat().st_size,
+                'fetched_at': time.time(),
+            })
+            logger.info(f"Downloaded {url}")
+            return entry / 'data'
+        raise DownloadError(f"Failed to download {url}")
+
+    @staticmethod
+    def _write_body(response: requests.Response, part: Path, offset: int) -> str:
+        """Stream a response body into the partial file and return the payload's SHA-256."""
+        digest = hashlib.sha256()
+        if offset:
+            with open(part, 'rb') as f:
+                for block in iter(lambda: f.read(MAX_CHUNK_SIZE), b''):
+                    digest.update(block)
+        chunk_size = MIN_CHUNK_SIZE
+        with open(part, 'ab' if offset else 'wb') as f:
+            while True:
+                start = time.monotonic()
+                block = response.raw.read(chunk_size)
+                if not block:
+                    break
+                elapsed = time.monotonic() - start
+                f.write(block)
+                digest.update(block)
+                if elapsed < FAST_READ_SECONDS:
+                    chunk_size = min(chunk_size * 2, MAX_CHUNK_SIZE)
+                elif elapsed > SLOW_READ_SECONDS:
+                    chunk_size = max(chunk_size // 2, MIN_CHUNK_SIZE)
+        return digest.hexdigest()
+
+    def download(self, url: str, target_path: Union[str, Path],
+                 sha256: Optional[str] = None) -> bool:
+        """Download a URL to a file through the cache.
+
+        Args:
+            url: Download URL
+            target_path: Destination file
+            sha256: Expected SHA-256 of the payload
+
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            path = self.fetch(url, sha256=sha256)
+            target_path = Path(target_path)
+            target_path.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(path, target_path)
+            return True
+        except (DownloadError, requests.RequestException, OSError) as e:
+            logger.error(f"Failed to download {url}: {e}")
+            return False
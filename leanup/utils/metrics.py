@@ -0,0 +1,355 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Generator, Iterable, List, Optional, Tuple, Union
+
+from leanup.const import LEANUP_CACHE_DIR
+from leanup.utils import tracing
+from leanup.utils.custom_logger import setup_logger
+
+logger = setup_logger("metrics")
+
+# Set to 0 to stop recording metrics
+METRICS_ENV = 'LEANUP_METRICS'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    timestamp REAL NOT NULL,
+    operation TEXT NOT NULL,
+    repo TEXT,
+    toolchain TEXT,
+    commit_hash TEXT,
+    duration REAL NOT NULL,
+    peak_rss INTEGER,
+    ok INTEGER NOT NULL,
+    host TEXT
+);
+CREATE INDEX IF NOT EXISTS records_operation ON records (operation, repo, timestamp);
+"""
+
+# Records of one operation and repository compared by `MetricsStore.regressions`
+RECENT_RECORDS = 5
+BASELINE_RECORDS = 20
+MIN_RECORDS = 3
+
+
+def metrics_enabled() -> bool:
+    """Check if metrics are recorded, i.e. LEANUP_METRICS is not 0"""
+    return os.environ.get(METRICS_ENV, '1').strip().lower() not in ('0', 'false', 'no', 'off')
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Percentile of `values` by the nearest-rank method, or None if empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+class MetricsStore:
+    """SQLite store of operation timings, used to follow performance over time.
+
+    Each record holds the operation, the repository, its toolchain and
+    commit, the duration and the peak RSS of the commands it ran. Writes
+    open a short-lived connection, so several processes can record into
+    the same database.
+    """
+
+    def __init__(self, path: Optional[Union[str, Path]] = None):
+        """Initialize the store.
+
+        Args:
+            path: Database file (default: LEANUP_CACHE_DIR/metrics.db)
+        """
+        self.path = Path(path) if path else LEANUP_CACHE_DIR / "metrics.db"
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        import sqlite3
+        if not self._initialized:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path), timeout=10)
+        conn.row_factory = sqlite3.Row
+        if not self._initialized:
+            with self._lock:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(SCHEMA)
+                self._initialized = True
+        # Checks record one row per file, so skip the fsync of every commit;
+        # WAL keeps the database consistent, only the last records may be lost
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def record(self, operation: str, duration: float, repo: Optional[str] = None,
+               toolchain: Optional[str] = None, commit: Optional[str] = None,
+               peak_rss: Optional[int] = None, ok: bool = True,
+               timestamp: Optional[float] = None) -> bool:
+        """Append a timing record.
+
+        Args:
+            operation: Operation name, e.g. repo.lake_build
+            duration: Duration in seconds
+            repo: Repository path
+            toolchain: Lean toolchain of the repository
+            commit: Commit checked out in the repository
+            peak_rss: Largest peak RSS of the commands run, in bytes
+            ok: Whether the operation succeeded
+            timestamp: Time the operation started (default: now minus duration)
+
+        Returns:
+            bool: True if the record was stored
+        """
+        import socket
+        if timestamp is None:
+            timestamp = time.time() - duration
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute(
+                        "INSERT INTO records (timestamp, operation, repo, toolchain, commit_hash,"
+                        " duration, peak_rss, ok, host) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (timestamp, operation, repo, toolchain, commit, duration, peak_rss,
+                         int(ok), socket.gethostname()))
+            finally:
+                conn.close()
+            return True
+        except Exception as e:
+            logger.debug(f"Failed to record metrics in {self.path}: {e}")
+            return False
+
+    def records(self, operation: Optional[str] = None, repo: Optional[str] = None,
+                since: Optional[float] = None, ok: Optional[bool] = True) -> List[Dict[str, Any]]:
+        """Get records, oldest first.
+
+        Args:
+            operation: Only this operation
+            repo: Only repositories whose path ends with or equals this
+            since: Only records started after this timestamp
+            ok: Only successful (True) or failed (False) records, None for all
+
+        Returns:
+            List of records as dicts
+        """
+        if not self.path.exists():
+            return []
+        clauses, params = [], []
+        if operation:
+            clauses.append("operation = ?")
+            params.append(operation)
+        if repo:
+            clauses.append("(repo = ? OR repo LIKE ?)")
+            params.extend([repo, f"%/{repo}"])
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if ok is not None:
+            clauses.append("ok = ?")
+            params.append(int(ok))
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        try:
+            conn = self._connect()
+            try:
+                rows = conn.execute(f"SELECT * FROM records{where} ORDER BY timestamp, id", params).fetchall()
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.error(f"Failed to read metrics from {self.path}: {e}")
+            return []
+        return [dict(row) for row in rows]
+
+    @staticmethod
+    def _group(records: Iterable[Dict[str, Any]], *fields: str) -> Dict[Tuple, List[Dict[str, Any]]]:
+        groups: Dict[Tuple, List[Dict[str, Any]]] = {}
+        for record in records:
+            groups.setdefault(tuple(record[field] for field in fields), []).append(record)
+        return groups
+
+    def summary(self, **filters: Any) -> List[Dict[str, Any]]:
+        """Duration percentiles per operation and repository.
+
+        Args:
+            **filters: Filters of `records`
+
+        Returns:
+            List of dicts with operation, repo, count, p50, p95, p99, the
+            median peak RSS and the time of the last record
+        """
+        import statistics
+        rows = []
+        for (operation, repo), records in sorted(self._group(self.records(**filters), 'operation', 'repo').items(),
+                                                 key=lambda item: (item[0][0], item[0][1] or '')):
+            durations = [record['duration'] for record in records]
+            rss = [record['peak_rss'] for record in records if record['peak_rss']]
+            rows.append({
+                'operation': operation,
+                'repo': repo,
+                'count': len(records),
+                'p50': percentile(durations, 50),
+                'p95': percentile(durations, 95),
+                'p99': percentile(durations, 99),
+                'peak_rss': int(statistics.median(rss)) if rss else None,
+                'last': records[-1]['timestamp'],
+            })
+        return rows
+
+    def trend(self, by: str = 'commit_hash', threshold: float = 0.2, **filters: Any) -> List[Dict[str, Any]]:
+        """Median duration per operation, repository and commit or toolchain.
+
+        Groups are ordered by their first record. Each is compared with the
+        previous group of the same operation and repository.
+
+        Args:
+            by: Record field to group by, commit_hash or toolchain
+            threshold: Relative slowdown flagged as a regression
+            **filters: Filters of `records`
+
+        Returns:
+            List of dicts with operation, repo, the group value, count,
+            median, change from the previous group and a regression flag
+        """
+        import statistics
+        rows = []
+        for (operation, repo), records in self._group(self.records(**filters), 'operation', 'repo').items():
+            previous = None
+            for (value,), group in self._group(records, by).items():
+                median = statistics.median(record['duration'] for record in group)
+                change = (median - previous) / previous if previous else None
+                rows.append({
+                    'operation': operation,
+                    'repo': repo,
+                    by: value,
+                    'count': len(group),
+                    'median': median,
+                    'change': change,
+                    'regression': change is not None and change > threshold,
+                })
+                previous = median
+        return rows
+
+    def regressions(self, threshold: float = 0.2, recent: int = RECENT_RECORDS,
+                    baseline: int = BASELINE_RECORDS, **filters: Any) -> List[Dict[str, Any]]:
+        """Find operations whose recent runs are slower than before.
+
+        The median of the last `recent` records of each operation and
+        repository is compared with the median of up to `baseline` records
+        before them.
+
+        Args:
+            threshold: Relative slowdown flagged as a regression, e.g. 0.2 for 20%
+            recent: Number of recent records
+            baseline: Number of earlier records compared against
+            **filters: Filters of `records`
+
+        Returns:
+            List of dicts with operation, repo, baseline and recent medians
+            and the relative change
+        """
+        import statistics
+        rows = []
+        for (operation, repo), records in self._group(self.records(**filters), 'operation', 'repo').items():
+            latest, earlier = records[-recent:], records[:-recent][-baseline:]
+            if len(latest) < MIN_RECORDS or len(earlier) < MIN_RECORDS:
+                continue
+            before = statistics.median(record['duration'] for record in earlier)
+            after = statistics.median(record['duration'] for record in latest)
+            if before > 0 and (after - before) / before > threshold:
+                rows.append({
+                    'operation': operation,
+                    'repo': repo,
+                    'baseline': before,
+                    'recent': after,
+                    'change': (after - before) / before,
+                })
+        return rows
+
+
+_default_store: Optional[MetricsStore] = None
+
+
+def default_store() -> MetricsStore:
+    """Get the store under LEANUP_CACHE_DIR shared by the process"""
+    global _default_store
+    if _default_store is None:
+        _default_store = MetricsStore()
+    return _default_store
+
+
+def _succeeded(result: Any) -> bool:
+    """Tell from an operation's result whether it succeeded."""
+    if isinstance(result, tuple) and len(result) == 3 and isinstance(result[2], int):
+        return result[2] == 0
+    if isinstance(result, dict):
+        return not result.get('error')
+    return bool(result)
+
+
+def _record_span(span: tracing.Span, result: Any) -> None:
+    """Store a finished span of a `recorded` operation."""
+    if 'error' in span.attrs or 'exit_code' in span.attrs:
+        return
+    default_store().record(
+        span.name, span.duration,
+        repo=span.attrs.get('cwd'),
+        toolchain=span.attrs.get('toolchain'),
+        commit=span.attrs.get('commit'),
+        peak_rss=span.attrs.get('peak_rss'),
+        ok=_succeeded(result),
+        timestamp=span.start)
+
+
+def recorded(operation: str, attrs: Optional[Callable[..., Dict[str, Any]]] = None):
+    """Decorator tracing every call of a function and recording its timing in the metrics store.
+
+    Args:
+        operation: Operation name
+        attrs: Function of the call's arguments returning span attributes;
+            `cwd`, `toolchain` and `commit` are stored with the record
+    """
+    return tracing.traced(operation, attrs, on_finish=_record_span, always=metrics_enabled)
+
+
+@contextmanager
+def recording(operation: str, attrs: Optional[Callable[[], Dict[str, Any]]] = None
+              ) -> Generator[Union[tracing.Span, Any], None, None]:
+    """Context manager recording a block like `recorded` records a call.
+
+    Used for generators, which `recorded` would only time until their first
+    item. Set the span's `failed` attribute to record the block as failed;
+    blocks left by an exception, e.g. a generator closed early, are not
+    recorded.
+
+    Args:
+        operation: Operation name
+        attrs: Function returning the span attributes, see `recorded`
+    """
+    enabled = metrics_enabled()
+    values = attrs() if attrs is not None and (enabled or tracing.get_tracer()) else {}
+    with tracing.span(operation, always=enabled, **values) as current:
+        yield current
+    if enabled and isinstance(current, tracing.Span):
+        _record_span(current, not current.attrs.get('failed'))
+
+
+def repo_attrs(self, *args, **kwargs) -> Dict[str, Any]:
+    """Span attributes identifying the state of a LeanRepo"""
+    return {
+        'cwd': str(self.cwd),
+        'toolchain': self.get_lean_toolchain(),
+        'commit': self.head_commit(),
+    }
+
+
+def check_attrs(self, *args, **kwargs) -> Dict[str, Any]:
+    """Span attributes of a single-file check on a LeanRepo.
+
+    Cheaper than `repo_attrs` as they are taken for every file: the
+    toolchain read when the repository was opened is used, and the commit,
+    whose lookup may read all of packed-refs, is left out.
+    """
+    return {'cwd': str(self.cwd), 'toolchain': self.lean_version}
@@ -0,0 +1,141 @@
+import io
+import os
+import re
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from leanup.utils import tracing
+from leanup.utils.custom_logger import setup_logger
+
+logger = setup_logger("profiling")
+
+# Profile written by `leanup --profile` without a file name
+DEFAULT_PROFILE = 'leanup.prof'
+
+# Built-in functions counted as file system calls in the report
+FILESYSTEM_CALLS = re.compile(
+    r"<built-in method (?:posix|nt)\.(?:stat|lstat|fstat|scandir|listdir|open|mkdir|rename|replace|"
+    r"unlink|rmdir|utime|chmod|access|readlink|symlink|link)>"
+    r"|<built-in method (?:io|_io|builtins)\.open>"
+    r"|<method '(?:read|readline|readlines|write)' of '_io\.(?:BufferedReader|BufferedWriter|FileIO)' objects>")
+
+
+def _busy_time(intervals: Iterable[Tuple[float, float]]) -> float:
+    """Total time covered by at least one of the (start, end) intervals."""
+    total = 0.0
+    current_start = current_end = None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+
+class CommandProfiler:
+    """Profile one CLI command with cProfile and split its time by kind.
+
+    Wall time is split into waiting on subprocesses, from the command
+    spans of `execute_command`, Python CPU time of this process, and the
+    remainder, which is I/O and other waiting. cProfile only sees the
+    thread that started it, so the function table covers the main thread.
+    """
+
+    def __init__(self, path: Union[str, Path] = DEFAULT_PROFILE):
+        """Initialize the profiler.
+
+        Args:
+            path: pstats file; a text report is written next to it with
+                `.txt` appended to the name
+        """
+        self.path = Path(path)
+        self.report_path = self.path.with_name(self.path.name + '.txt')
+        self._profile = None
+        self._owns_tracer = False
+        self._tracer: Optional[tracing.Tracer] = None
+        self._first_span = 0
+
+    def start(self) -> None:
+        """Start profiling, tracing subprocesses if tracing is off"""
+        import cProfile
+        self._tracer = tracing.get_tracer()
+        if self._tracer is None:
+            self._tracer = tracing.enable()
+            self._owns_tracer = True
+        self._first_span = len(self._tracer.spans)
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._start = time.time()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def stop(self) -> Dict[str, Any]:
+        """Stop profiling and write the profile and the report.
+
+        Returns:
+            Dict with wall, subprocess, cpu, io and filesystem seconds, the
+            number of commands run and the report text
+        """
+        self._profile.disable()
+        import pstats
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        end = self._start + wall
+        commands = [span for span in self._tracer.spans[self._first_span:] if 'argv' in span.attrs]
+        subprocess_wait = _busy_time((max(span.start, self._start), min(span.start + span.duration, end))
+                                     for span in commands)
+        if self._owns_tracer:
+            tracing.disable()
+        out = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=out)
+        result = {
+            'wall': wall,
+            'subprocess': subprocess_wait,
+            'cpu': cpu,
+            # Children run alongside Python threads, so the parts may overlap
+            'io': max(0.0, wall - subprocess_wait - cpu),
+            'filesystem': sum(tottime for (_, _, name), (_, _, tottime, _, _) in stats.stats.items()
+                              if FILESYSTEM_CALLS.match(name)),
+            'commands': len(commands),
+            'slowest': sorted(commands, key=lambda span: span.duration, reverse=True)[:5],
+        }
+        stats.sort_stats('cumulative').print_stats(15)
+        table = out.getvalue()
+        # Drop the pstats preamble up to the table header
+        result['report'] = self.report(result, table[table.find('   ncalls'):] if '   ncalls' in table else table)
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._profile.dump_stats(str(self.path))
+            self.report_path.write_text(result['report'])
+        except OSError as e:
+            logger.error(f"Failed to write profile {self.path}: {e}")
+        return result
+
+    def report(self, result: Dict[str, Any], functions: str) -> str:
+        """Format the time split, the slowest commands and the table of top functions."""
+        wall = result['wall'] or 1e-9
+        lines: List[str] = [f"Profile written to {self.path} (report: {self.report_path})", ""]
+        rows = [
+            ("wall time", result['wall'], ""),
+            ("subprocess wait", result['subprocess'], f"{result['commands']} commands"),
+            ("Python CPU", result['cpu'], ""),
+            ("I/O and other waits", result['io'], ""),
+        ]
+        for label, seconds, note in rows:
+            share = f"{seconds / wall:>4.0%}" if label != "wall time" else "    "
+            lines.append(f"  {label:<22}{seconds:>9.3f}s  {share}  {note}".rstrip())
+        lines.append(f"    {'file system calls':<20}{result['filesystem']:>9.3f}s        main thread")
+        if result['slowest']:
+            lines += ["", "Slowest commands:"]
+            for span in result['slowest']:
+                argv = span.attrs['argv']
+                command = argv if isinstance(argv, str) else ' '.join(os.path.basename(a) if i == 0 else a
+                                                                      for i, a in enumerate(argv))
+                lines.append(f"  {span.duration:>9.3f}s  {command[:100]}")
+        lines += ["", "Top functions by cumulative time (main thread):", functions.rstrip()]
+        return '\n'.join(lines) + '\n'
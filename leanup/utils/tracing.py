@@ -0,0 +1,404 @@
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Generator, List, Optional, Union
+
+from leanup.utils.custom_logger import setup_logger
+
+logger = setup_logger("tracing")
+
+# Environment variable naming the trace file; `.json` selects the Chrome
+# trace_event format, anything else JSON lines
+TRACE_ENV = 'LEANUP_TRACE'
+
+_current_span: 'contextvars.ContextVar[Optional[Span]]' = contextvars.ContextVar('leanup_span', default=None)
+_tracer: Optional['Tracer'] = None
+_env_checked = False
+_lock = threading.Lock()
+
+
+class Span:
+    """A timed operation, nested under the span that was current when it started."""
+
+    def __init__(self, tracer: 'Tracer', name: str, parent: Optional['Span'] = None, **attrs: Any):
+        self.tracer = tracer
+        self.name = name
+        self.id = tracer.next_id()
+        self.parent = parent
+        self.parent_id = parent.id if parent is not None else None
+        self.attrs = attrs
+        self.thread = threading.get_ident()
+        self.start = time.time()
+        self._start = time.perf_counter()
+        self.duration: Optional[float] = None
+
+    def set(self, **attrs: Any) -> None:
+        """Add attributes to the span"""
+        self.attrs.update(attrs)
+
+    def record_peak_rss(self, peak_rss: int) -> None:
+        """Raise the span's peak RSS, the largest of any command run inside it"""
+        self.attrs['peak_rss'] = max(self.attrs.get('peak_rss') or 0, peak_rss)
+
+    def record_cpu_time(self, user_time: float, system_time: float) -> None:
+        """Add the user and system CPU time of a command run inside the span"""
+        self.attrs['user_time'] = self.attrs.get('user_time', 0.0) + user_time
+        self.attrs['system_time'] = self.attrs.get('system_time', 0.0) + system_time
+
+    def finish(self) -> None:
+        """End the span and hand it to the tracer"""
+        if self.duration is None:
+            self.duration = time.perf_counter() - self._start
+            if self.parent is not None and self.attrs.get('peak_rss'):
+                self.parent.record_peak_rss(self.attrs['peak_rss'])
+            if self.parent is not None and 'user_time' in self.attrs:
+                self.parent.record_cpu_time(self.attrs['user_time'], self.attrs['system_time'])
+            if self.tracer.keep:
+                self.tracer.spans.append(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'parent': self.parent_id,
+            'name': self.name,
+            'start': self.start,
+            'duration': self.duration,
+            'pid': self.tracer.pid,
+            'thread': self.thread,
+            'attrs': self.attrs,
+        }
+
+
+class _NoopSpan:
+    """Stand-in yielded by `span` while tracing is off."""
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """Collects finished spans and writes them to a trace file."""
+
+    def __init__(self, path: Optional[Union[str, Path]] = None, keep: bool = True):
+        """Initialize the tracer.
+
+        Args:
+            path: Trace file written by `save`; `.json` selects the Chrome
+                trace_event format, anything else JSON lines
+            keep: Keep finished spans; spans of a tracer that does not are
+                only read by whoever started them
+        """
+        self.path = Path(path) if path else None
+        self.keep = keep
+        self.pid = os.getpid()
+        self.spans: List[Span] = []
+        self._ids = iter(range(1, sys.maxsize))
+        self._ids_lock = threading.Lock()
+
+    def next_id(self) -> int:
+        with self._ids_lock:
+            return next(self._ids)
+
+    def start_span(self, name: str, **attrs: Any) -> Span:
+        """Start a span under the current one without making it current"""
+        return Span(self, name, _current_span.get(), **attrs)
+
+    def to_jsonl(self) -> str:
+        return ''.join(json.dumps(span.to_dict(), default=str) + '\n' for span in self.spans)
+
+    def to_chrome(self) -> Dict[str, Any]:
+        """Spans as complete ("X") events of the Chrome trace_event format"""
+        events = []
+        for span in self.spans:
+            args = dict(span.attrs, span_id=span.id, parent_id=span.parent_id)
+            events.append({
+                'name': span.name,
+                'cat': 'leanup',
+                'ph': 'X',
+                'ts': int(span.start * 1e6),
+                'dur': int((span.duration or 0) * 1e6),
+                'pid': self.pid,
+                'tid': span.thread,
+                'args': args,
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def save(self, path: Optional[Union[str, Path]] = None) -> Optional[Path]:
+        """Write the finished spans to `path` (default: the tracer's path).
+
+        Returns:
+            The file written, or None if there is no path or writing failed
+        """
+        path = Path(path) if path else self.path
+        if path is None:
+            return None
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if path.suffix == '.json':
+                content = json.dumps(self.to_chrome(), default=str)
+            else:
+                content = self.to_jsonl()
+            path.write_text(content)
+            logger.debug(f"Wrote {len(self.spans)} spans to {path}")
+            return path
+        except (OSError, TypeError, ValueError) as e:
+            logger.error(f"Failed to write trace {path}: {e}")
+            return None
+
+
+# Tracer of spans measured while tracing is off, e.g. for metrics
+_detached = Tracer(keep=False)
+
+
+def get_tracer() -> Optional[Tracer]:
+    """Get the active tracer, enabling it from LEANUP_TRACE on first use"""
+    global _env_checked
+    if _tracer is None and not _env_checked:
+        _env_checked = True
+        if os.environ.get(TRACE_ENV):
+            enable(os.environ[TRACE_ENV])
+    return _tracer
+
+
+def enable(path: Optional[Union[str, Path]] = None) -> Tracer:
+    """Start tracing, writing the trace to `path` when the process exits.
+
+    Args:
+        path: Trace file; `.json` selects the Chrome trace_event format,
+            anything else JSON lines
+
+    Returns:
+        The active tracer
+    """
+    global _tracer
+    with _lock:
+        if _tracer is None or (path and _tracer.path != Path(path)):
+            _tracer = Tracer(path)
+            atexit.register(_save_at_exit, _tracer)
+        return _tracer
+
+
+def disable() -> Optional[Tracer]:
+    """Stop tracing and write the trace file.
+
+    Returns:
+        The tracer that was active, if any
+    """
+    global _tracer
+    with _lock:
+        tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.save()
+    return tracer
+
+
+def _save_at_exit(tracer: Tracer) -> None:
+    if tracer is _tracer:
+        disable()
+
+
+def _record_exception(current: Span, e: BaseException) -> None:
+    if isinstance(e, SystemExit):
+        current.set(exit_code=e.code)
+    else:
+        current.set(error=repr(e))
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, always: bool = False, **attrs: Any) -> Generator[Union[Span, _NoopSpan], None, None]:
+    """Time a block as a span nested under the current one.
+
+    Does nothing while tracing is off, unless `always` is set. Exceptions
+    leaving the block are recorded in the span's `error` attribute,
+    `sys.exit` codes in `exit_code`.
+
+    Args:
+        name: Span name, e.g. "lake build"
+        always: Measure the block even while tracing is off; the span is
+            then only seen by the caller
+        **attrs: Attributes recorded with the span
+    """
+    tracer = get_tracer() or (_detached if always else None)
+    if tracer is None:
+        yield NOOP_SPAN
+        return
+    current = tracer.start_span(name, **attrs)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        _record_exception(current, e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.finish()
+
+
+def traced(name: str, attrs: Optional[Callable[..., Dict[str, Any]]] = None,
+           on_finish: Optional[Callable[[Span, Any], None]] = None,
+           always: Optional[Callable[[], bool]] = None):
+    """Decorator recording every call of a function as a span.
+
+    Coroutines returned by the function are traced until they complete, so
+    async overrides that await the decorated method are timed correctly.
+
+    Args:
+        name: Span name
+        attrs: Function of the call's arguments returning span attributes
+        on_finish: Called with the finished span and the call's result
+            (None if it raised)
+        always: Function deciding per call whether to measure the call
+            even while tracing is off
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            tracer = get_tracer() or (_detached if always is not None and always() else None)
+            if tracer is None:
+                return func(*args, **kwargs)
+            current = tracer.start_span(name, **(attrs(*args, **kwargs) if attrs is not None else {}))
+            token = _current_span.set(current)
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                _record_exception(current, e)
+                _finish(current, None, on_finish)
+                raise
+            finally:
+                _current_span.reset(token)
+            if inspect.isawaitable(result):
+                return _finish_after(current, result, on_finish)
+            _finish(current, result, on_finish)
+            return result
+        return wrapper
+    return decorator
+
+
+def _finish(current: Span, result: Any, on_finish: Optional[Callable[[Span, Any], None]]) -> None:
+    current.finish()
+    if on_finish is not None:
+        on_finish(current, result)
+
+
+async def _finish_after(current: Span, awaitable, on_finish: Optional[Callable[[Span, Any], None]]) -> Any:
+    """Await a traced call's result, keeping its span current until it completes."""
+    token = _current_span.set(current)
+    result = None
+    try:
+        result = await awaitable
+        return result
+    except BaseException as e:
+        _record_exception(current, e)
+        raise
+    finally:
+        _current_span.reset(token)
+        _finish(current, result, on_finish)
+
+
+def in_context(func: Callable) -> Callable:
+    """Bind `func` to a copy of the current context.
+
+    Spans started by the returned callable in a worker thread nest under
+    the span that is current now. Bind once per submitted task, as a
+    context cannot be entered by two threads at once.
+    """
+    return functools.partial(contextvars.copy_context().run, func)
+
+
+def cwd_attrs(self, *args, **kwargs) -> Dict[str, Any]:
+    """Span attributes of a method call on an object with a `cwd`"""
+    return {'cwd': str(self.cwd)}
+
+
+def command_name(command: Union[str, List[str]]) -> str:
+    """Short span name of a command, e.g. "lake build" """
+    argv = command.split() if isinstance(command, str) else [str(arg) for arg in command]
+    if not argv:
+        return 'command'
+    return ' '.join([os.path.basename(argv[0])] + argv[1:2])
+
+
+def output_size(data: Union[str, bytes, None]) -> int:
+    if not data:
+        return 0
+    return len(data.encode(errors='replace')) if isinstance(data, str) else len(data)
+
+
+class RusagePopen(subprocess.Popen):
+    """Popen reaping the child with `os.wait4` to record its resource usage in the current span.
+
+    `wait` and `poll` reap the child themselves and set `returncode`, which
+    Popen then returns as is, so the usage is recorded whichever is used.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.span = current_span()
+        self._reap_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def _reap(self, block: bool) -> bool:
+        """Reap the child if it exited, or wait for it if `block`; True once reaped."""
+        if not self._reap_lock.acquire(blocking=block):
+            # Another thread is waiting for the child
+            return False
+        try:
+            if self.returncode is not None:
+                return True
+            try:
+                pid, sts, rusage = os.wait4(self.pid, 0 if block else os.WNOHANG)
+            except ChildProcessError:
+                # Reaped elsewhere, e.g. while SIGCHLD is ignored; Popen reports 0 too
+                self.returncode = 0
+                return True
+            if pid != self.pid:
+                return False
+            if self.span is not None:
+                # ru_maxrss is in bytes on macOS and in KiB elsewhere
+                scale = 1 if sys.platform == 'darwin' else 1024
+                self.span.record_peak_rss(rusage.ru_maxrss * scale)
+                self.span.record_cpu_time(rusage.ru_utime, rusage.ru_stime)
+            self.returncode = -os.WTERMSIG(sts) if os.WIFSIGNALED(sts) else os.WEXITSTATUS(sts)
+            return True
+        finally:
+            self._reap_lock.release()
+
+    def poll(self) -> Optional[int]:
+        self._reap(block=False)
+        return super().poll()
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        if timeout is None:
+            self._reap(block=True)
+        else:
+            deadline = time.monotonic() + timeout
+            delay = 0.0005
+            while not self._reap(block=False):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise subprocess.TimeoutExpired(self.args, timeout)
+                delay = min(delay * 2, remaining, 0.05)
+                time.sleep(delay)
+        return super().wait(timeout=timeout)
+
+
+def popen_class() -> type:
+    """Popen class for a new command: RusagePopen inside a span where `wait4` exists"""
+    if _current_span.get() is not None and hasattr(os, 'wait4'):
+        return RusagePopen
+    return subprocess.Popen
@@ -41,4 +41,17 @@ def mock_repo_cache(temp_dir):
     """Create a mock repository cache directory"""
     cache_dir = temp_dir / 'repos'
     cache_dir.mkdir(parents=True, exist_ok=True)
-    return cache_dir
\ No newline at end of file
+    return cache_dir
+
+@pytest.fixture(autouse=True)
+def no_metrics(monkeypatch):
+    """Keep tests from recording metrics into the user's cache"""
+    monkeypatch.setenv('LEANUP_METRICS', '0')
+
+@pytest.fixture(autouse=True)
+def repo_catalog(tmp_path, monkeypatch):
+    """Keep tests from writing to the user's repository catalog"""
+    from leanup.repo import catalog
+    repo_catalog = catalog.RepoCatalog(tmp_path / 'catalog.db')
+    monkeypatch.setattr(catalog, '_default_catalog', repo_catalog)
+    return repo_catalog
@@ -0,0 +1,111 @@
+import json
+import os
+import stat
+from pathlib import Path
+
+from leanup.repo.artifacts import ArtifactStore
+from leanup.repo.manager import LeanRepo
+
+
+def make_checkout(root: Path, rev: str = "a" * 40) -> Path:
+    """Create a Lean project depending on one built package"""
+    root.mkdir(parents=True)
+    (root / "lean-toolchain").write_text("leanprover/lean4:v4.9.0\n")
+    (root / "lake-manifest.json").write_text(json.dumps({
+        "version": 7,
+        "packagesDir": ".lake/packages",
+        "packages": [{"type": "git", "name": "dep", "rev": rev,
+                      "url": "https://example.com/dep", "inherited": False}],
+    }))
+    return root / ".lake" / "packages" / "dep" / ".lake" / "build"
+
+
+class TestArtifactStore:
+    """Test cases for ArtifactStore class"""
+    
+    def test_ingest_and_restore(self, temp_dir):
+        """Test storing a build and restoring it elsewhere"""
+        store = ArtifactStore(temp_dir / 'store')
+        build = temp_dir / 'a' / 'build'
+        (build / 'lib').mkdir(parents=True)
+        (build / 'lib' / 'Dep.olean').write_bytes(b'olean')
+        (build / 'lib' / 'Dep.ilean').write_bytes(b'ilean')
+        
+        result = store.ingest('key', build)
+        assert result['files'] == 2
+        assert store.has('key')
+        
+        target = temp_dir / 'b' / 'build'
+        assert store.restore('key', target)
+        assert (target / 'lib' / 'Dep.olean').read_bytes() == b'olean'
+        assert not os.path.samefile(target / 'lib' / 'Dep.olean', build / 'lib' / 'Dep.olean')
+        assert not store.restore('missing', target)
+    
+    def test_rebuild_after_ingest(self, temp_dir):
+        """Test builds stay writable in place after being stored or restored"""
+        store = ArtifactStore(temp_dir / 'store')
+        build = temp_dir / 'a' / 'build'
+        build.mkdir(parents=True)
+        (build / 'Dep.olean').write_bytes(b'old')
+        store.ingest('key', build)
+        target = temp_dir / 'b' / 'build'
+        store.restore('key', target)
+        
+        # Lake rewrites outputs in place when it rebuilds
+        for path in [build / 'Dep.olean', target / 'Dep.olean']:
+            with open(path, 'wb') as f:
+                f.write(b'new')
+        store.restore('key', temp_dir / 'c')
+        assert (temp_dir / 'c' / 'Dep.olean').read_bytes() == b'old'
+    
+    def test_detach_legacy_links(self, temp_dir):
+        """Test files hardlinked to a read-only object are replaced by writable copies"""
+        store = ArtifactStore(temp_dir / 'store')
+        build = temp_dir / 'build'
+        build.mkdir()
+        obj = temp_dir / 'object'
+        obj.write_bytes(b'olean')
+        obj.chmod(stat.S_IRUSR)
+        os.link(obj, build / 'Dep.olean')
+        (build / 'Other.olean').write_bytes(b'other')
+        
+        assert store.detach(build) == 1
+        assert not os.path.samefile(obj, build / 'Dep.olean')
+        (build / 'Dep.olean').write_bytes(b'rebuilt')
+        assert obj.read_bytes() == b'olean'
+    
+    def test_ingest_deduplicates(self, temp_dir):
+        """Test identical files in different builds share one object"""
+        store = ArtifactStore(temp_dir / 'store')
+        for name in ['a', 'b']:
+            (temp_dir / name).mkdir()
+            (temp_dir / name / 'Dep.olean').write_bytes(b'same content')
+        
+        first = store.ingest('a', temp_dir / 'a')
+        second = store.ingest('b', temp_dir / 'b')
+        
+        assert first['bytes'] == len(b'same content')
+        assert second['bytes'] == 0
+        assert len(list((temp_dir / 'store' / 'objects').rglob('*'))) == 2
+
+
+class TestLeanRepoArtifacts:
+    """Test sharing dependency builds between checkouts"""
+    
+    def test_store_and_restore_between_checkouts(self, temp_dir):
+        """Test a second checkout reuses the build of the first"""
+        store = ArtifactStore(temp_dir / 'store')
+        build = make_checkout(temp_dir / 'one')
+        build.mkdir(parents=True)
+        (build / 'Dep.olean').write_bytes(b'olean')
+        
+        assert LeanRepo(temp_dir / 'one').store_artifacts(store) == ['dep']
+        assert LeanRepo(temp_dir / 'one').store_artifacts(store) == []
+        
+        other = make_checkout(temp_dir / 'two')
+        assert LeanRepo(temp_dir / 'two').restore_artifacts(store) == ['dep']
+        assert (other / 'Dep.olean').read_bytes() == b'olean'
+        
+        # A different revision is not restored
+        make_checkout(temp_dir / 'three', rev="b" * 40)
+        assert LeanRepo(temp_dir / 'three').restore_artifacts(store) == []
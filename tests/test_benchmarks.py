@@ -0,0 +1,41 @@
+import json
+import subprocess
+import sys
+import pytest
+from pathlib import Path
+
+from leanup.const import OS_TYPE
+
+RUN = Path(__file__).resolve().parent.parent / 'benchmarks' / 'run.py'
+
+
+def run_benchmarks(*args):
+    return subprocess.run([sys.executable, str(RUN), '-n', '2', '--only', 'status_refresh',
+                           '--only', 'lake_call_overhead', *args],
+                          capture_output=True, text=True)
+
+
+@pytest.mark.skipif(OS_TYPE == 'Windows', reason="Stub executables are scripts with a shebang")
+class TestBenchmarks:
+    """Test the benchmark suite runs against the stubs and compares baselines"""
+
+    def test_baseline(self, temp_dir):
+        """Test results are written to a JSON baseline"""
+        result = run_benchmarks('-o', str(temp_dir / 'baseline.json'))
+        assert result.returncode == 0, result.stderr
+        report = json.loads((temp_dir / 'baseline.json').read_text())
+        assert set(report['benchmarks']) == {'status_refresh', 'lake_call_overhead'}
+        assert report['benchmarks']['status_refresh']['samples'] == 2
+        assert report['meta']['python']
+
+    def test_compare_flags_regressions(self, temp_dir):
+        """Test benchmarks slower than the baseline beyond the threshold fail the run"""
+        baseline = temp_dir / 'baseline.json'
+        baseline.write_text(json.dumps({'benchmarks': {
+            'status_refresh': {'unit': 'ms', 'higher_is_better': False, 'median': 0.001},
+            'lake_call_overhead': {'unit': 'ms', 'higher_is_better': False, 'median': 1000.0},
+        }}))
+        result = run_benchmarks('--compare', str(baseline), '--min-delta', '0')
+        assert result.returncode == 1
+        assert 'status_refresh' in result.stderr
+        assert 'lake_call_overhead' not in result.stderr
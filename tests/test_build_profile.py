@@ -0,0 +1,102 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+from leanup.const import OS_TYPE
+from leanup.repo.build_profile import BuildProfiler, parse_duration
+from leanup.repo.manager import LeanRepo
+from leanup.utils.basic import execute_command
+
+
+def test_parse_duration():
+    """Test parsing lake durations"""
+    assert parse_duration("1.5s") == 1.5
+    assert parse_duration("250ms") == 0.25
+    assert parse_duration("1m 3s") == 63.0
+
+
+class TestBuildProfiler:
+    """Test cases for BuildProfiler class"""
+    
+    def make_project(self, root: Path):
+        (root / "Pkg").mkdir()
+        (root / "Pkg" / "A.lean").write_text("def a := 1\n")
+        (root / "Pkg" / "B.lean").write_text("import Pkg.A\ndef b := 1\n")
+        (root / "Pkg" / "C.lean").write_text("import Pkg.A\ndef c := 1\n")
+        (root / "Pkg" / "D.lean").write_text("import Pkg.B\nimport Pkg.C\ndef d := 1\n")
+    
+    def test_report(self, temp_dir):
+        """Test timings, parallelism and critical path"""
+        self.make_project(temp_dir)
+        profiler = BuildProfiler(temp_dir)
+        profiler.started_at = 0.0
+        profiler.feed("✔ [1/5] Built Pkg.A (2s)", now=2.0)
+        profiler.feed("✔ [2/5] Built Pkg.B (1s)", now=3.0)
+        profiler.feed("✔ [3/5] Built Pkg.C (3s)", now=5.0)
+        profiler.feed("✔ [4/5] Built Pkg.C:c.o (500ms)", now=5.5)
+        profiler.feed("info: some unrelated line", now=5.6)
+        profiler.feed("✔ [5/5] Built Pkg.D (1s)", now=6.0)
+        profiler.finished_at = 6.0
+        
+        report = profiler.report(top=2)
+        
+        assert report['jobs'] == 5
+        assert report['wall_time'] == 6.0
+        assert report['job_time'] == 7.5
+        assert report['parallelism'] == 7.5 / 6.0
+        assert [job['name'] for job in report['slowest']] == ['Pkg.C', 'Pkg.A']
+        assert report['slowest'][0]['start'] == 2.0
+        assert report['critical_path'] == {'modules': ['Pkg.A', 'Pkg.C', 'Pkg.D'], 'duration': 6.0}
+    
+    def test_legacy_progress_lines(self, temp_dir):
+        """Test older lake output without durations"""
+        profiler = BuildProfiler(temp_dir)
+        profiler.feed("[1/2] Building Pkg.A", now=1.0)
+        profiler.feed("[2/2] Building Pkg.B", now=3.0)
+        
+        assert profiler.jobs['Pkg.A'] == {'start': 1.0}
+    
+    @pytest.mark.skipif(OS_TYPE == 'Windows', reason="Stub lake uses POSIX paths")
+    def test_lake_build_with_profiler(self, temp_dir):
+        """Test profiling a build from streamed output"""
+        self.make_project(temp_dir)
+        script = temp_dir / 'lake.py'
+        script.write_text(
+            "import time\n"
+            "for name in ['Pkg.A', 'Pkg.B']:\n"
+            "    time.sleep(0.05)\n"
+            "    print(f'✔ [1/2] Built {name} (50ms)', flush=True)\n"
+        )
+        repo = LeanRepo(temp_dir)
+        profiler = BuildProfiler(temp_dir)
+        repo._lake_command = lambda args: [sys.executable, str(script)] + args
+        
+        stdout, _, code = repo.lake_build(profiler=profiler)
+        report = profiler.report()
+        
+        assert code == 0
+        assert 'Built Pkg.B' in stdout
+        assert report['jobs'] == 2
+        assert report['critical_path']['modules'] == ['Pkg.A', 'Pkg.B']
+        assert report['wall_time'] >= 0.1
+    
+    @pytest.mark.skipif(OS_TYPE == 'Windows', reason="CPU time is read with os.wait4")
+    def test_cpu_time_of_build_only(self, temp_dir):
+        """Test the CPU time counts the build but not commands running next to it"""
+        self.make_project(temp_dir)
+        burn = "import time\nstart = time.process_time()\nwhile time.process_time() - start < {}: pass\n"
+        script = temp_dir / 'lake.py'
+        # The other command finishes while the build still runs
+        script.write_text(burn.format(0.3) + "time.sleep(1)\n")
+        repo = LeanRepo(temp_dir)
+        profiler = BuildProfiler(temp_dir)
+        repo._lake_command = lambda args: [sys.executable, str(script)] + args
+        
+        other = threading.Thread(target=execute_command, args=([sys.executable, '-c', burn.format(0.5)],))
+        other.start()
+        repo.lake_build(profiler=profiler)
+        other.join()
+        
+        assert 0.3 <= profiler.report()['cpu_time'] < 0.75
@@ -0,0 +1,46 @@
+from leanup.utils.cache import ResultCache
+
+
+class TestResultCache:
+    """Test cases for ResultCache class"""
+    
+    def test_put_get(self, temp_dir):
+        """Test storing and reading results"""
+        cache = ResultCache(temp_dir / 'results')
+        
+        assert cache.get('a' * 64) is None
+        cache.put('a' * 64, ('out', 'err', 1))
+        
+        assert cache.get('a' * 64) == ('out', 'err', 1)
+        assert cache.stats()['hits'] == 1
+        assert cache.stats()['misses'] == 1
+    
+    def test_persistent(self, temp_dir):
+        """Test entries survive across cache instances"""
+        ResultCache(temp_dir / 'results').put('b' * 64, ('out', '', 0))
+        
+        cache = ResultCache(temp_dir / 'results')
+        assert cache.get('b' * 64) == ('out', '', 0)
+        assert cache.stats()['entries'] == 1
+    
+    def test_lru_eviction(self, temp_dir):
+        """Test least recently used entries are evicted past the size cap"""
+        cache = ResultCache(temp_dir / 'results', max_size=250, memory_entries=0)
+        cache.put('1' * 64, ('x' * 50, '', 0))
+        cache.put('2' * 64, ('x' * 50, '', 0))
+        cache.get('1' * 64)
+        cache.put('3' * 64, ('x' * 50, '', 0))
+        
+        assert cache.size <= 250
+        assert cache.get('2' * 64) is None
+        assert cache.get('1' * 64) is not None
+        assert cache.get('3' * 64) is not None
+    
+    def test_clear(self, temp_dir):
+        """Test clearing the cache"""
+        cache = ResultCache(temp_dir / 'results')
+        cache.put('c' * 64, ('out', '', 0))
+        cache.clear()
+        
+        assert cache.get('c' * 64) is None
+        assert cache.size == 0
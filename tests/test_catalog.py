@@ -0,0 +1,190 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+from unittest.mock import patch
+from click.testing import CliRunner
+
+from leanup.cli import cli
+from leanup.repo.catalog import RepoCatalog, repo_sizes, tree_size
+from leanup.repo.eviction import CacheEvictor
+from leanup.repo.manager import LeanRepo
+
+
+def make_repo(path, toolchain='leanprover/lean4:v4.9.0', lake_bytes=0):
+    path.mkdir(parents=True)
+    subprocess.run(['git', 'init', '-q'], cwd=path, check=True)
+    subprocess.run(['git', '-c', 'user.name=t', '-c', 'user.email=t@t', 'commit', '-q',
+                    '--allow-empty', '-m', 'init'], cwd=path, check=True)
+    (path / 'lean-toolchain').write_text(toolchain + '\n')
+    if lake_bytes:
+        (path / '.lake' / 'build').mkdir(parents=True)
+        (path / '.lake' / 'build' / 'Main.olean').write_bytes(b'x' * lake_bytes)
+    return path
+
+
+class TestRepoCatalog:
+    """Test cases for RepoCatalog class"""
+
+    def test_sizes(self, temp_dir):
+        """Test sizes count hard-linked files once and skip symlinks"""
+        (temp_dir / '.lake').mkdir()
+        (temp_dir / '.lake' / 'a').write_bytes(b'x' * 100)
+        os.link(temp_dir / '.lake' / 'a', temp_dir / '.lake' / 'b')
+        (temp_dir / 'README.md').write_bytes(b'x' * 10)
+        (temp_dir / 'link').symlink_to(temp_dir / '.lake')
+        assert tree_size(temp_dir / '.lake') == 100
+        total, lake = repo_sizes(temp_dir)
+        assert lake == 100
+        assert total == 110 + len(str(temp_dir / '.lake'))
+
+    def test_update(self, temp_dir):
+        """Test toolchain, commit and sizes are stored and builds are kept"""
+        catalog = RepoCatalog(temp_dir / 'catalog.db')
+        path = make_repo(temp_dir / 'repos' / 'a', lake_bytes=1000)
+        assert catalog.update(path, url='https://example.com/a', build_duration=2.0, build_ok=False)
+        entry = catalog.get(path)
+        assert entry['toolchain'] == 'leanprover/lean4:v4.9.0'
+        assert len(entry['commit_hash']) == 40
+        assert entry['lake_size'] == 1000 and entry['size'] > 1000
+        assert entry['build_ok'] == 0
+
+        (path / 'lean-toolchain').write_text('leanprover/lean4:v4.10.0\n')
+        assert catalog.update(path)
+        entry = catalog.get(path)
+        assert entry['toolchain'] == 'leanprover/lean4:v4.10.0'
+        assert entry['url'] == 'https://example.com/a'
+        assert (entry['build_duration'], entry['build_ok']) == (2.0, 0)
+        assert not catalog.update(temp_dir / 'missing')
+
+    def test_entries(self, temp_dir):
+        """Test filtering by glob patterns and refreshing a directory"""
+        catalog = RepoCatalog(temp_dir / 'catalog.db')
+        search_dir = temp_dir / 'repos'
+        make_repo(search_dir / 'mathlib4', toolchain='leanprover/lean4:v4.9.0')
+        make_repo(search_dir / 'repl', toolchain='leanprover/lean4:v4.10.0')
+        assert catalog.refresh(search_dir) == (2, 0)
+        assert catalog.refresh(search_dir) == (0, 0)
+        names = [e['name'] for e in catalog.entries(parent=search_dir, filters={'toolchain': '*v4.9*'})]
+        assert names == ['mathlib4']
+        with pytest.raises(ValueError):
+            catalog.entries(filters={'size': '1'})
+
+        subprocess.run(['rm', '-rf', str(search_dir / 'repl')], check=True)
+        assert catalog.refresh(search_dir) == (0, 1)
+        assert [e['name'] for e in catalog.entries()] == ['mathlib4']
+
+    def test_lake_build_updates(self, temp_dir, repo_catalog):
+        """Test builds of cataloged repositories update their entries"""
+        path = make_repo(repo_catalog.cache_dir / 'repos' / 'a', lake_bytes=1000)
+        repo_catalog.update(path)
+        other = make_repo(temp_dir / 'other')
+        code = ("import os, sys; os.makedirs('.lake/build', exist_ok=True); "
+                "open('.lake/build/New.olean', 'wb').write(b'x' * 3000); sys.exit(1)")
+        with patch.object(LeanRepo, '_lake_command', return_value=[sys.executable, '-c', code]):
+            LeanRepo(path).lake_build()
+            LeanRepo(other).lake_build()
+        entry = repo_catalog.get(path)
+        assert entry['lake_size'] == 4000
+        assert entry['last_build'] and entry['build_duration'] > 0
+        assert entry['build_ok'] == 0
+        assert repo_catalog.get(other) is None
+
+    def test_incremental_sizes(self, temp_dir, monkeypatch):
+        """Test updates measure only the parts of a checkout that changed"""
+        from leanup.repo import catalog as catalog_module
+        catalog = RepoCatalog(temp_dir / 'catalog.db')
+        path = make_repo(temp_dir / 'repos' / 'a', lake_bytes=1000)
+        dep = make_repo(path / '.lake' / 'packages' / 'dep')
+        (dep / 'Dep.lean').write_bytes(b'x' * 500)
+        assert catalog.update(path)
+        entry = catalog.get(path)
+        assert entry['lake_size'] == 1000 + tree_size(dep)
+
+        walked = []
+        real_tree_size = catalog_module.tree_size
+        monkeypatch.setattr(catalog_module, 'tree_size',
+                            lambda p, exclude=None: walked.append(os.path.relpath(p, path)) or real_tree_size(p, exclude))
+        (path / '.lake' / 'build' / 'Main.olean').write_bytes(b'x' * 3000)
+        assert catalog.update(path, build_duration=1.0)
+        assert walked == ['.lake/build']
+        assert catalog.get(path)['size'] == entry['size'] + 2000
+
+        # A new package commit or a new package build is measured, nothing else
+        walked.clear()
+        subprocess.run(['git', '-c', 'user.name=t', '-c', 'user.email=t@t', 'commit', '-q',
+                        '--allow-empty', '-m', 'next'], cwd=dep, check=True)
+        (dep / '.lake' / 'build').mkdir(parents=True)
+        (dep / '.lake' / 'build' / 'Dep.olean').write_bytes(b'x' * 200)
+        assert catalog.update(path)
+        assert walked == ['.lake/packages/dep', '.lake/packages/dep/.lake/build']
+        walked.clear()
+        assert catalog.update(path)
+        assert walked == []
+        assert catalog.update(path, rescan=True)
+        assert '.' in walked
+
+    def test_outside_build_rescanned(self, repo_catalog):
+        """Test gc measures repositories built without LeanUp again"""
+        repos_dir = repo_catalog.cache_dir / 'repos'
+        path = make_repo(repos_dir / 'a', lake_bytes=1000)
+        repo_catalog.update(path)
+        entry = repo_catalog.get(path)
+        os.utime(path / '.lake', (entry['updated'] - 10, entry['updated'] - 10))
+        os.utime(path / '.lake' / 'build', (entry['updated'] - 10, entry['updated'] - 10))
+        assert CacheEvictor(0, repos_dir=repos_dir).entries()[0]['lake_size'] == 1000
+
+        (path / '.lake' / 'build' / 'New.olean').write_bytes(b'x' * 3000)
+        assert CacheEvictor(0, repos_dir=repos_dir).entries()[0]['lake_size'] == 4000
+
+
+class TestListCommand:
+    """Test the repo list command"""
+
+    def test_list(self, temp_dir):
+        """Test plain, long, JSON and filtered listings"""
+        search_dir = temp_dir / 'repos'
+        make_repo(search_dir / 'mathlib4', lake_bytes=2048)
+        make_repo(search_dir / 'repl', toolchain='leanprover/lean4:v4.10.0')
+        runner = CliRunner()
+        args = ['repo', 'list', '--search-dir', str(search_dir)]
+
+        result = runner.invoke(cli, args)
+        assert result.exit_code == 0
+        assert result.output.split() == ['mathlib4', 'repl']
+
+        result = runner.invoke(cli, args + ['--long'])
+        assert 'name      toolchain' in result.output
+        assert '2.0KiB' in result.output
+
+        result = runner.invoke(cli, args + ['--json', '--filter', 'toolchain=*v4.10.0'])
+        entries = json.loads(result.output)
+        assert [e['name'] for e in entries] == ['repl']
+
+        result = runner.invoke(cli, args + ['--filter', 'size=1'])
+        assert result.exit_code == 2
+
+    def test_list_other_search_dir(self, temp_dir, repo_catalog):
+        """Test that any directory is listed and only the cache is cataloged"""
+        search_dir = temp_dir / 'elsewhere'
+        make_repo(search_dir / 'mathlib4', lake_bytes=2048)
+        (search_dir / 'notes').mkdir()
+        runner = CliRunner()
+        args = ['repo', 'list', '--search-dir', str(search_dir)]
+
+        result = runner.invoke(cli, args)
+        assert result.exit_code == 0
+        assert result.output.split() == ['mathlib4', 'notes']
+
+        result = runner.invoke(cli, args + ['--json'])
+        entries = json.loads(result.output)
+        assert [e['name'] for e in entries] == ['mathlib4', 'notes']
+        assert entries[0]['lake_size'] == 2048
+        assert repo_catalog.entries() == []
+
+        cache_repos = repo_catalog.cache_dir / 'repos'
+        make_repo(cache_repos / 'repl')
+        result = runner.invoke(cli, ['repo', 'list', '--search-dir', str(cache_repos)])
+        assert result.output.split() == ['repl']
+        assert [e['name'] for e in repo_catalog.entries()] == ['repl']
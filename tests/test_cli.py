@@ -1,3 +1,4 @@
+import json
 import pytest
 import tempfile
 from pathlib import Path
@@ -107,14 +108,35 @@ class TestCLI:
         mock_elan.install_elan.assert_called_once()
         mock_elan.proxy_elan_command.assert_called_once_with(['toolchain', 'install', 'stable'])
     
+    @patch('leanup.cli.ElanManager')
+    def test_install_command_direct(self, mock_elan_manager):
+        """Test install command installing several toolchains directly"""
+        mock_elan = Mock()
+        mock_elan.is_elan_installed.return_value = True
+        mock_elan.install_toolchains.return_value = {'v4.9.0': True, 'v4.10.0': False}
+        mock_elan_manager.return_value = mock_elan
+        
+        result = self.runner.invoke(cli, ['install', 'v4.9.0', 'v4.10.0', '--direct', '-j', '2'])
+        
+        assert result.exit_code == 1
+        assert '✓ Lean toolchain v4.9.0 installed' in result.output
+        mock_elan.install_toolchains.assert_called_once_with(
+            ['v4.9.0', 'v4.10.0'], jobs=2, mirror_dir=None, force=False)
+        mock_elan.proxy_elan_command.assert_not_called()
+    
     @patch('leanup.cli.ElanManager')
     def test_status_command(self, mock_elan_manager):
         """Test status command"""
         # Mock elan manager
         mock_elan = Mock()
-        mock_elan.is_elan_installed.return_value = True
-        mock_elan.get_elan_version.return_value = '4.0.0'
-        mock_elan.get_installed_toolchains.return_value = ['leanprover/lean4:v4.10.0', 'leanprover/lean4:v4.9.0']
+        mock_elan.get_status_info.return_value = {
+            'installed': True,
+            'version': '4.0.0',
+            'elan_home': '/home/user/.elan',
+            'executable': '/home/user/.elan/bin/elan',
+            'toolchains': ['leanprover/lean4:v4.10.0', 'leanprover/lean4:v4.9.0'],
+            'default_toolchain': 'leanprover/lean4:v4.10.0',
+        }
         mock_elan_manager.return_value = mock_elan
         
         result = self.runner.invoke(cli, ['status'])
@@ -123,12 +145,20 @@ class TestCLI:
         assert '=== LeanUp Status ===' in result.output
         assert 'elan: ✓ installed (version: 4.0.0)' in result.output
         assert 'leanprover/lean4:v4.10.0, leanprover/lean4:v4.9.0' in result.output
+        assert 'Default toolchain: leanprover/lean4:v4.10.0' in result.output
+        
+        result = self.runner.invoke(cli, ['status', '--json'])
+        assert result.exit_code == 0
+        assert json.loads(result.output) == mock_elan.get_status_info.return_value
     
     @patch('leanup.cli.ElanManager')
     def test_status_command_elan_not_installed(self, mock_elan_manager):
         """Test status command when elan is not installed"""
         mock_elan = Mock()
-        mock_elan.is_elan_installed.return_value = False
+        mock_elan.get_status_info.return_value = {
+            'installed': False, 'version': None, 'elan_home': '/home/user/.elan',
+            'executable': None, 'toolchains': [], 'default_toolchain': None,
+        }
         mock_elan_manager.return_value = mock_elan
         
         result = self.runner.invoke(cli, ['status'])
@@ -0,0 +1,137 @@
+import hashlib
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from leanup.utils.download import Downloader, DownloadError
+
+
+class FakeUpstream:
+    """Local HTTP server with ETag, Range and interrupted-transfer support"""
+
+    def __init__(self):
+        self.files = {}
+        self.requests = []
+        # Number of bytes to send before dropping the next response
+        self.cut_after = None
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                upstream.requests.append(dict(self.headers))
+                if self.path not in upstream.files:
+                    self.send_error(404)
+                    return
+                data = upstream.files[self.path]
+                etag = '"%s"' % hashlib.md5(data).hexdigest()
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                start = 0
+                range_header = self.headers.get('Range')
+                if range_header and self.headers.get('If-Range', etag) == etag:
+                    start = int(range_header.split('=')[1].rstrip('-'))
+                self.send_response(206 if start else 200)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(data) - start))
+                self.end_headers()
+                body = data[start:]
+                if upstream.cut_after is not None:
+                    body, upstream.cut_after = body[:upstream.cut_after], None
+                    self.wfile.write(body)
+                    self.wfile.flush()
+                    self.close_connection = True
+                    return
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def upstream():
+    server = FakeUpstream()
+    yield server
+    server.close()
+
+
+class TestDownloader:
+    """Test cases for Downloader class"""
+
+    def test_cached_offline(self, temp_dir, upstream):
+        """Test repeat downloads are served from the cache without the network"""
+        upstream.files['/elan-init.sh'] = b'#!/bin/sh\necho elan\n'
+        downloader = Downloader(temp_dir / 'downloads')
+        assert downloader.download(upstream.url + '/elan-init.sh', temp_dir / 'a.sh')
+        assert (temp_dir / 'a.sh').read_bytes() == b'#!/bin/sh\necho elan\n'
+
+        url = upstream.url + '/elan-init.sh'
+        upstream.close()
+        assert downloader.download(url, temp_dir / 'b.sh')
+        assert (temp_dir / 'b.sh').read_bytes() == b'#!/bin/sh\necho elan\n'
+        assert len(upstream.requests) == 1
+
+    def test_revalidate_with_etag(self, temp_dir, upstream):
+        """Test stale entries are revalidated and refreshed when they change"""
+        url = upstream.url + '/file'
+        upstream.files['/file'] = b'v1'
+        downloader = Downloader(temp_dir / 'downloads', max_age=0)
+        assert downloader.fetch(url).read_bytes() == b'v1'
+        assert downloader.fetch(url).read_bytes() == b'v1'
+        assert upstream.requests[-1]['If-None-Match']
+
+        upstream.files['/file'] = b'v2'
+        assert downloader.fetch(url).read_bytes() == b'v2'
+
+    def test_stale_entry_used_when_offline(self, temp_dir, upstream):
+        """Test the cached copy is used if the server cannot be reached"""
+        url = upstream.url + '/file'
+        upstream.files['/file'] = b'data'
+        downloader = Downloader(temp_dir / 'downloads', max_age=0, retries=0)
+        downloader.fetch(url)
+        upstream.close()
+        assert downloader.fetch(url).read_bytes() == b'data'
+
+    def test_resume_interrupted_transfer(self, temp_dir, upstream):
+        """Test an interrupted transfer continues with a Range request"""
+        data = bytes(range(256)) * 4096
+        upstream.files['/big'] = data
+        upstream.cut_after = 100000
+        downloader = Downloader(temp_dir / 'downloads')
+        path = downloader.fetch(upstream.url + '/big', sha256=hashlib.sha256(data).hexdigest())
+        assert path.read_bytes() == data
+        assert upstream.requests[-1]['Range'] == 'bytes=100000-'
+
+    def test_checksum_mismatch(self, temp_dir, upstream):
+        """Test payloads not matching the expected digest are rejected"""
+        upstream.files['/file'] = b'data'
+        downloader = Downloader(temp_dir / 'downloads')
+        with pytest.raises(DownloadError):
+            downloader.fetch(upstream.url + '/file', sha256='0' * 64)
+        assert downloader.cached(upstream.url + '/file') is None
+
+    def test_missing(self, temp_dir, upstream):
+        """Test HTTP errors fail the download"""
+        downloader = Downloader(temp_dir / 'downloads')
+        assert downloader.download(upstream.url + '/missing', temp_dir / 'out') is False
+
+    def test_corrupted_cache_entry(self, temp_dir, upstream):
+        """Test cached payloads no longer matching their recorded digest are downloaded again"""
+        url = upstream.url + '/file'
+        upstream.files['/file'] = b'data'
+        downloader = Downloader(temp_dir / 'downloads')
+        path = downloader.fetch(url)
+        path.write_bytes(b'dat!')
+        assert downloader.cached(url) is None
+        assert downloader.fetch(url).read_bytes() == b'data'
+        assert len(upstream.requests) == 2
@@ -3,7 +3,9 @@ import pytest
 from unittest.mock import Mock, patch, MagicMock
 from pathlib import Path
 from leanup.repo.elan import ElanManager
+from leanup.utils.basic import execute_command
 from leanup.const import OS_TYPE
+from leanup.utils.archive import extract_archive
 
 
 class TestElanManager:
@@ -87,22 +89,22 @@ class TestElanManager:
                 version = manager.get_elan_version()
                 assert version is None
     
-    @patch('leanup.repo.elan.requests.get')
-    def test_download_installer_success(self, mock_get, mock_elan_home, temp_dir):
+    def test_download_installer_success(self, mock_elan_home, temp_dir):
         """Test successful installer download"""
         with patch.dict(os.environ, {'ELAN_HOME': str(mock_elan_home)}):
             manager = ElanManager()
             
-            # Mock successful HTTP response
-            mock_response = Mock()
-            mock_response.iter_content.return_value = [b'script content']
-            mock_get.return_value = mock_response
+            # Mock a cached payload
+            payload = temp_dir / 'payload'
+            payload.write_bytes(b'script content')
             
             target_path = temp_dir / 'installer.sh'
-            result = manager.download('http://example.com/script.sh', target_path)
+            with patch.object(manager.downloader, 'fetch', return_value=payload) as mock_fetch:
+                result = manager.download('http://example.com/script.sh', target_path)
             
             assert result is True
-            assert target_path.exists()
+            assert target_path.read_bytes() == b'script content'
+            mock_fetch.assert_called_once_with('http://example.com/script.sh', sha256=None)
     
     @patch('subprocess.run')
     @pytest.mark.skipif(OS_TYPE == 'Windows', reason="Windows path separator issue")
@@ -119,13 +121,13 @@ class TestElanManager:
                 mock_run.assert_called_once_with(['/usr/bin/elan', '--version'], check=False)
     
     @pytest.mark.skipif(OS_TYPE == 'Windows', reason="Windows path separator issue")
-    def test_get_status_info_installed(self, mock_elan_home):
+    def test_get_status_info_installed(self, mock_elan_home, temp_dir):
         """Test getting status info when elan is installed"""
         with patch.dict(os.environ, {'ELAN_HOME': str(mock_elan_home)}):
             manager = ElanManager()
+            manager.status_cache_path = temp_dir / 'status.json'
             
-            with patch.object(manager, 'is_elan_installed', return_value=True), \
-                 patch.object(manager, 'get_elan_version', return_value='3.0.0'), \
+            with patch.object(manager, 'get_elan_version', return_value='3.0.0'), \
                  patch.object(manager, 'get_elan_executable', return_value=Path('/usr/bin/elan')), \
                  patch.object(manager, 'get_installed_toolchains', return_value=['stable']):
                 
@@ -135,14 +137,192 @@ class TestElanManager:
                 assert info['executable'] == '/usr/bin/elan'
                 assert info['toolchains'] == ['stable']
     
-    def test_get_status_info_not_installed(self, mock_elan_home):
+    def test_get_status_info_not_installed(self, mock_elan_home, temp_dir):
         """Test getting status info when elan is not installed"""
         with patch.dict(os.environ, {'ELAN_HOME': str(mock_elan_home)}):
             manager = ElanManager()
+            manager.status_cache_path = temp_dir / 'status.json'
             
-            with patch.object(manager, 'is_elan_installed', return_value=False):
+            with patch.object(manager, 'get_elan_executable', return_value=None):
                 info = manager.get_status_info()
                 assert info['installed'] is False
                 assert info['version'] is None
                 assert info['executable'] is None
-                assert info['toolchains'] == []
\ No newline at end of file
+                assert info['toolchains'] == []
+    
+    @pytest.mark.skipif(OS_TYPE == 'Windows', reason="Unix executable")
+    def test_get_status_info_cached(self, mock_elan_home, temp_dir):
+        """Test status is read from ELAN_HOME and elan only runs when it changed"""
+        elan_exe = mock_elan_home / 'bin' / 'elan'
+        elan_exe.write_text('#!/bin/sh\necho "elan 4.0.0 (abc 2025-01-30)"\n')
+        elan_exe.chmod(0o755)
+        (mock_elan_home / 'settings.toml').write_text(
+            'version = "12"\ndefault_toolchain = "leanprover/lean4:v4.9.0"\n\n[overrides]\n"/proj" = "v4.10.0"\n')
+        (mock_elan_home / 'toolchains' / 'leanprover--lean4---v4.9.0').mkdir(parents=True)
+        with patch.dict(os.environ, {'ELAN_HOME': str(mock_elan_home)}):
+            manager = ElanManager()
+            manager.status_cache_path = temp_dir / 'status.json'
+            assert manager.get_settings()['overrides'] == {'/proj': 'v4.10.0'}
+            
+            with patch('leanup.repo.elan.execute_command', wraps=execute_command) as mock_execute:
+                info = manager.get_status_info()
+                assert info['version'] == '4.0.0'
+                assert info['toolchains'] == ['leanprover/lean4:v4.9.0']
+                assert info['default_toolchain'] == 'leanprover/lean4:v4.9.0'
+                other = ElanManager()
+                other.status_cache_path = manager.status_cache_path
+                assert other.get_status_info() == info
+                assert mock_execute.call_count == 1
+                
+                (mock_elan_home / 'toolchains' / 'leanprover--lean4---v4.10.0').mkdir()
+                os.utime(mock_elan_home / 'toolchains', ns=(0, 10 ** 18))
+                info = manager.get_status_info()
+                assert info['toolchains'] == ['leanprover/lean4:v4.10.0', 'leanprover/lean4:v4.9.0']
+                assert mock_execute.call_count == 2
+    
+    def test_resolve_toolchain_bin(self, mock_elan_home):
+        """Test resolving a toolchain to its bin directory"""
+        with patch.dict(os.environ, {'ELAN_HOME': str(mock_elan_home)}):
+            manager = ElanManager()
+            assert manager.resolve_toolchain_bin('leanprover/lean4:v4.9.0') is None
+            
+            bin_dir = mock_elan_home / 'toolchains' / 'leanprover--lean4---v4.9.0' / 'bin'
+            bin_dir.mkdir(parents=True)
+            (bin_dir / ('lake.exe' if OS_TYPE == 'Windows' else 'lake')).touch()
+            
+            assert manager.resolve_toolchain_bin('leanprover/lean4:v4.9.0\n') == bin_dir
+            assert manager.resolve_toolchain_bin('v4.9.0') == bin_dir
+            assert manager.resolve_toolchain_bin('leanprover/lean4:stable') is None
+            assert manager.resolve_toolchain_bin(None) is None
+    
+    def test_toolchain_release(self, mock_elan_home):
+        """Test resolving toolchains to release archives"""
+        with patch.dict(os.environ, {'ELAN_HOME': str(mock_elan_home)}), \
+             patch.object(ElanManager, 'release_platform', return_value='linux'), \
+             patch('leanup.repo.elan.zstd_available', return_value=True):
+            manager = ElanManager()
+            release = manager.toolchain_release('4.9.0')
+            assert release['name'] == 'leanprover/lean4:v4.9.0'
+            assert [asset for asset, url in release['assets']] == [
+                'lean-4.9.0-linux.tar.zst', 'lean-4.9.0-linux.zip']
+            assert release['assets'][1][1] == (
+                'https://github.com/leanprover/lean4/releases/download/v4.9.0/lean-4.9.0-linux.zip')
+            nightly = manager.toolchain_release('leanprover/lean4-nightly:nightly-2024-05-01')
+            assert nightly['assets'][0][0] == 'lean-nightly-2024-05-01-linux.tar.zst'
+            assert manager.toolchain_release('stable') is None
+            assert manager.toolchain_release('leanprover/lean4:nightly') is None
+
+
+def make_release_zip(path, version):
+    """Write a fake Lean release archive"""
+    import zipfile
+    with zipfile.ZipFile(path, 'w') as archive:
+        for name in ['lake', 'lean']:
+            info = zipfile.ZipInfo(f"lean-{version}-linux/bin/{name}")
+            info.external_attr = 0o100755 << 16
+            archive.writestr(info, '#!/bin/sh\n')
+        archive.writestr(f"lean-{version}-linux/lib/lean/Init.olean", 'olean')
+
+
+@pytest.mark.skipif(OS_TYPE == 'Windows', reason="Unix file modes")
+class TestDirectToolchainInstall:
+    """Test cases for installing toolchains without elan"""
+    
+    @pytest.fixture(autouse=True)
+    def platform(self):
+        with patch.object(ElanManager, 'release_platform', return_value='linux'), \
+             patch('leanup.repo.elan.zstd_available', return_value=False):
+            yield
+    
+    def test_install_from_mirror(self, mock_elan_home, temp_dir):
+        """Test toolchains are installed in parallel from a mirror directory"""
+        mirror = temp_dir / 'mirror'
+        mirror.mkdir()
+        for version in ['4.9.0', '4.10.0']:
+            make_release_zip(mirror / f"lean-{version}-linux.zip", version)
+        with patch.dict(os.environ, {'ELAN_HOME': str(mock_elan_home)}):
+            manager = ElanManager()
+            with patch.object(manager.downloader, 'fetch') as mock_fetch:
+                results = manager.install_toolchains(['v4.9.0', 'leanprover/lean4:v4.10.0'], mirror_dir=mirror)
+            mock_fetch.assert_not_called()
+            assert results == {'v4.9.0': True, 'leanprover/lean4:v4.10.0': True}
+            
+            bin_dir = manager.resolve_toolchain_bin('leanprover/lean4:v4.10.0')
+            assert bin_dir == mock_elan_home / 'toolchains' / 'leanprover--lean4---v4.10.0' / 'bin'
+            assert os.access(bin_dir / 'lean', os.X_OK)
+            assert (bin_dir.parent / 'lib' / 'lean' / 'Init.olean').read_text() == 'olean'
+            assert not [p for p in (mock_elan_home / 'toolchains').iterdir() if p.name.startswith('.')]
+    
+    def test_concurrent_install(self, mock_elan_home, temp_dir):
+        """Test parallel installs of one toolchain all succeed and leave a complete toolchain"""
+        import threading
+        from leanup.repo import elan
+        mirror = temp_dir / 'mirror'
+        mirror.mkdir()
+        make_release_zip(mirror / 'lean-4.9.0-linux.zip', '4.9.0')
+        barrier = threading.Barrier(4)
+        
+        def extract(*args, **kwargs):
+            extract_archive(*args, **kwargs)
+            barrier.wait(timeout=10)
+        
+        with patch.dict(os.environ, {'ELAN_HOME': str(mock_elan_home)}), \
+             patch.object(elan, 'extract_archive', side_effect=extract):
+            manager = ElanManager()
+            results = []
+            threads = [threading.Thread(target=lambda: results.append(
+                manager.install_release('v4.9.0', mirror_dir=mirror, force=True))) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert results == [True] * 4
+            bin_dir = manager.resolve_toolchain_bin('v4.9.0')
+            assert sorted(p.name for p in bin_dir.iterdir()) == ['lake', 'lean']
+            assert not [p for p in (mock_elan_home / 'toolchains').iterdir() if p.name.startswith('.')]
+    
+    def test_download_fills_mirror(self, mock_elan_home, temp_dir):
+        """Test downloads are verified against the published checksum and added to the mirror"""
+        import hashlib
+        from leanup.utils.download import DownloadError
+        payload = temp_dir / 'payload'
+        make_release_zip(payload, '4.9.0')
+        digest = hashlib.sha256(payload.read_bytes()).hexdigest()
+        checksum = temp_dir / 'checksum'
+        checksum.write_text(f"{digest}  lean-4.9.0-linux.zip\n")
+        url = 'https://github.com/leanprover/lean4/releases/download/v4.9.0/lean-4.9.0-linux.zip'
+        files = {url: payload, url + '.sha256': checksum}
+        
+        def fetch(url, sha256=None):
+            if url not in files:
+                raise DownloadError(url)
+            return files[url]
+        
+        mirror = temp_dir / 'mirror'
+        with patch.dict(os.environ, {'ELAN_HOME': str(mock_elan_home)}):
+            manager = ElanManager()
+            with patch.object(manager.downloader, 'fetch', side_effect=fetch) as mock_fetch:
+                assert manager.install_toolchain('v4.9.0', mirror_dir=mirror)
+                # Already installed
+                assert manager.install_toolchain('v4.9.0', mirror_dir=mirror)
+            mock_fetch.assert_called_with(url, sha256=digest)
+            assert mock_fetch.call_count == 2
+            assert (mirror / 'lean-4.9.0-linux.zip').read_bytes() == payload.read_bytes()
+            assert (mirror / 'lean-4.9.0-linux.zip.sha256').read_text().split()[0] == digest
+            assert manager.resolve_toolchain_bin('v4.9.0') is not None
+            
+            # A corrupted mirror copy is downloaded again
+            (mirror / 'lean-4.9.0-linux.zip').write_bytes(b'corrupted')
+            with patch.object(manager.downloader, 'fetch', side_effect=fetch) as mock_fetch:
+                assert manager.install_toolchain('v4.9.0', mirror_dir=mirror, force=True)
+            mock_fetch.assert_called_with(url, sha256=digest)
+            assert (mirror / 'lean-4.9.0-linux.zip').read_bytes() == payload.read_bytes()
+    
+    def test_fallback_to_elan(self, mock_elan_home):
+        """Test channels are installed through elan"""
+        with patch.dict(os.environ, {'ELAN_HOME': str(mock_elan_home)}):
+            manager = ElanManager()
+            with patch.object(manager, 'get_elan_executable', return_value=Path('/usr/bin/elan')), \
+                 patch('leanup.repo.elan.execute_command', return_value=('', '', 0)) as mock_execute:
+                assert manager.install_toolchain('stable')
+            mock_execute.assert_called_once_with(['/usr/bin/elan', 'toolchain', 'install', 'stable'])
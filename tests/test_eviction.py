@@ -0,0 +1,151 @@
+import os
+import subprocess
+import threading
+import time
+import pytest
+from click.testing import CliRunner
+
+from leanup.cli import cli
+from leanup.repo.catalog import RepoCatalog
+from leanup.repo.eviction import CacheEvictor, cache_budget, parse_size
+from leanup.repo.manager import LeanRepo
+
+
+def make_checkout(path, source_bytes, lake_bytes):
+    (path / '.lake' / 'build').mkdir(parents=True)
+    # Empty stand-in for a worktree's .git file, so sizes stay exact
+    (path / '.git').write_text('')
+    (path / 'Main.lean').write_bytes(b'x' * source_bytes)
+    (path / '.lake' / 'build' / 'Main.olean').write_bytes(b'x' * lake_bytes)
+    return path
+
+
+@pytest.fixture
+def cache(repo_catalog):
+    """Cache with three checkouts, used from oldest to newest in the order a, b, c"""
+    repos_dir = repo_catalog.cache_dir / 'repos'
+    for i, name in enumerate(['a', 'b', 'c']):
+        make_checkout(repos_dir / name, 1000, 4000)
+        repo_catalog.update(repos_dir / name)
+        lock = repo_catalog.lock(repos_dir / name)
+        lock.path.parent.mkdir(parents=True, exist_ok=True)
+        lock.path.touch()
+        os.utime(lock.path, (time.time() + i, time.time() + i))
+    return repos_dir
+
+
+class TestCacheEvictor:
+    """Test cases for CacheEvictor class"""
+
+    def test_parse_size(self, mock_config_manager):
+        """Test sizes with binary units and the configured budget"""
+        assert parse_size('500') == 500
+        assert parse_size('2K') == 2048
+        assert parse_size('1.5GiB') == int(1.5 * 1024 ** 3)
+        assert parse_size(10) == 10
+        with pytest.raises(ValueError):
+            parse_size('lots')
+        assert cache_budget(mock_config_manager) is None
+        mock_config_manager.save_config({'cache': {'max_size': '20G'}})
+        assert cache_budget(mock_config_manager) == 20 * 1024 ** 3
+
+    def test_builds_before_checkouts(self, cache, repo_catalog):
+        """Test build outputs of the least recently used repositories go first"""
+        evictor = CacheEvictor(11000, repos_dir=cache)
+        assert evictor.usage() == 15000
+        evicted = evictor.collect()
+        assert [(os.path.basename(e['path']), e['kind']) for e in evicted] == [('a', 'build')]
+        assert not (cache / 'a' / '.lake').exists()
+        assert (cache / 'b' / '.lake').exists()
+        # Sizes are updated without measuring the checkouts again
+        assert repo_catalog.get(cache / 'a')['size'] == 1000
+        assert evictor.usage() == 11000
+
+        evicted = CacheEvictor(2500, repos_dir=cache).collect()
+        assert [(os.path.basename(e['path']), e['kind']) for e in evicted] == [
+            ('b', 'build'), ('c', 'build'), ('a', 'checkout')]
+        assert not (cache / 'a').exists()
+        assert repo_catalog.get(cache / 'a') is None
+
+    def test_in_use_skipped(self, cache):
+        """Test repositories used by a LeanRepo are never evicted"""
+        evictor = CacheEvictor(0, repos_dir=cache)
+        with LeanRepo(cache / 'a').in_use():
+            evictor.collect()
+        assert evictor.skipped == [str(cache / 'a')]
+        assert (cache / 'a' / '.lake' / 'build' / 'Main.olean').exists()
+        assert not (cache / 'b').exists()
+        evictor.collect()
+        assert not (cache / 'a').exists()
+
+    def test_lock_scope(self, temp_dir, repo_catalog):
+        """Test repositories outside the cache are not locked and stale lock files are not reused"""
+        with LeanRepo(temp_dir).in_use() as held:
+            assert not held
+        assert not repo_catalog.lock_dir.exists()
+
+        # A user waiting while an eviction deletes the lock file locks a new one
+        path = repo_catalog.cache_dir / 'repos' / 'a'
+        eviction = repo_catalog.lock(path)
+        assert eviction.acquire(exclusive=True)
+        user = repo_catalog.lock(path)
+        waiting = threading.Thread(target=user.acquire)
+        waiting.start()
+        time.sleep(0.1)
+        eviction.path.unlink()
+        eviction.release()
+        waiting.join()
+        assert not repo_catalog.lock(path).acquire(exclusive=True, blocking=False)
+        user.release()
+
+    def test_sandbox_in_use(self, repo_catalog):
+        """Test a repository used through a sandbox is kept along with its sandboxes"""
+        repos_dir = repo_catalog.cache_dir / 'repos'
+        repo = repos_dir / 'proj'
+        repo.mkdir(parents=True)
+        subprocess.run(['git', 'init', '-q'], cwd=repo, check=True)
+        subprocess.run(['git', '-c', 'user.name=t', '-c', 'user.email=t@t', 'commit', '-q',
+                        '--allow-empty', '-m', 'init'], cwd=repo, check=True)
+        sandbox, = LeanRepo(repo).create_sandboxes(1)
+        assert sandbox.cwd.parent == repos_dir / 'proj.sandboxes'
+
+        evictor = CacheEvictor(0, repos_dir=repos_dir)
+        assert [entry['name'] for entry in evictor.entries()] == ['proj']
+        with sandbox.in_use():
+            evictor.collect()
+        assert evictor.skipped == [str(repo)]
+        assert (sandbox.cwd / '.git').exists()
+
+        evictor.collect()
+        assert not repo.exists()
+        assert not (repos_dir / 'proj.sandboxes').exists()
+
+    def test_dry_run(self, cache):
+        """Test a dry run deletes nothing"""
+        evicted = CacheEvictor(0, repos_dir=cache).collect(dry_run=True)
+        assert len(evicted) == 6
+        assert (cache / 'a' / '.lake').exists()
+
+
+class TestCacheGcCommand:
+    """Test the cache gc command"""
+
+    def test_gc(self, cache):
+        """Test usage and evictions are reported"""
+        runner = CliRunner()
+        args = ['cache', 'gc', '--search-dir', str(cache)]
+        result = runner.invoke(cli, args + ['--max-size', '100K'])
+        assert result.exit_code == 0
+        assert 'nothing to evict' in result.output
+
+        result = runner.invoke(cli, args + ['--max-size', '11000', '--dry-run'])
+        assert 'Would evict build outputs of a (3.9KiB)' in result.output
+        assert (cache / 'a' / '.lake').exists()
+
+        result = runner.invoke(cli, args + ['--max-size', '11000'])
+        assert result.exit_code == 0
+        assert 'Evicted build outputs of a' in result.output
+        assert 'Cache usage after eviction: 10.7KiB' in result.output
+
+        result = runner.invoke(cli, args + ['--max-size', 'lots'])
+        assert result.exit_code == 1
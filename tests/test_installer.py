@@ -0,0 +1,213 @@
+import subprocess
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from click.testing import CliRunner
+
+from leanup.cli import cli
+from leanup.repo.installer import RepoInstaller, BuildLimiter, load_manifest, default_repo_dir
+
+
+def git(*args, cwd=None):
+    subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True)
+
+
+@pytest.fixture
+def upstreams(temp_dir):
+    """Create a source directory with a plain and a Lean bare repository"""
+    source = temp_dir / 'source'
+    for name, files in [('plain', {'README.md': 'hello'}),
+                        ('lean', {'lakefile.lean': '', 'lean-toolchain': 'leanprover/lean4:v4.9.0'})]:
+        work = temp_dir / 'work' / name
+        work.mkdir(parents=True)
+        git("init", "-b", "main", cwd=work)
+        git("config", "user.email", "test@example.com", cwd=work)
+        git("config", "user.name", "test", cwd=work)
+        for filename, content in files.items():
+            (work / filename).write_text(content)
+        git("add", ".", cwd=work)
+        git("commit", "-m", "init", cwd=work)
+        git("clone", "--bare", str(work), str(source / 'org' / name))
+    return source.as_uri()
+
+
+class TestLoadManifest:
+    """Test cases for load_manifest"""
+
+    def test_entries(self, temp_dir):
+        """Test plain names and mappings are normalized"""
+        manifest = temp_dir / 'repos.yaml'
+        manifest.write_text(
+            "repos:\n"
+            "  - org/plain\n"
+            "  - repository: org/lean\n"
+            "    source: https://example.com\n"
+            "    branch: 4.9\n"
+            f"    dest_dir: {temp_dir / 'dest'}\n"
+        )
+        specs = load_manifest(manifest)
+        assert specs[0] == {'repository': 'org/plain', 'source': 'https://github.com',
+                            'branch': None, 'dest_dir': default_repo_dir('org/plain')}
+        assert specs[1]['source'] == 'https://example.com'
+        assert specs[1]['branch'] == '4.9'
+        assert specs[1]['dest_dir'] == temp_dir / 'dest'
+
+    def test_invalid(self, temp_dir):
+        """Test malformed entries are rejected"""
+        manifest = temp_dir / 'repos.yaml'
+        manifest.write_text("- source: https://example.com\n")
+        with pytest.raises(ValueError):
+            load_manifest(manifest)
+
+
+class TestBuildLimiter:
+    """Test cases for BuildLimiter"""
+
+    @patch('leanup.repo.installer.psutil.virtual_memory')
+    @patch('leanup.repo.installer.os.cpu_count', return_value=32)
+    def test_slots(self, mock_cpu_count, mock_memory):
+        """Test slots are capped by both CPU and memory"""
+        mock_memory.return_value.available = 20 * 1024 ** 3
+        assert BuildLimiter(cpus_per_build=4, memory_per_build=8 * 1024 ** 3).slots == 2
+        assert BuildLimiter(cpus_per_build=16, memory_per_build=1024 ** 3).slots == 2
+        assert BuildLimiter(memory_per_build=64 * 1024 ** 3).slots == 1
+        assert BuildLimiter(max_builds=5).slots == 5
+
+
+class TestRepoInstaller:
+    """Test cases for RepoInstaller class"""
+
+    def test_install_all(self, temp_dir, upstreams):
+        """Test repositories are cloned, updated and built with capped builds"""
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def fake_build(self, **kwargs):
+            with lock:
+                running.append(self.cwd)
+                peak.append(len(running))
+            time.sleep(0.1)
+            with lock:
+                running.remove(self.cwd)
+            return "", "", 0
+
+        specs = [{'repository': f'org/{name}', 'source': upstreams, 'branch': None,
+                  'dest_dir': temp_dir / 'repos' / f'{name}{i}'}
+                 for i in range(3) for name in ['plain', 'lean']]
+        specs.append({'repository': 'org/missing', 'source': upstreams, 'branch': None,
+                      'dest_dir': temp_dir / 'repos' / 'missing'})
+        progress = []
+        installer = RepoInstaller(jobs=2, builds=BuildLimiter(max_builds=1), share_artifacts=False,
+                                  on_progress=progress.append)
+        with patch('leanup.repo.elan.ElanManager.install_toolchain', return_value=True), \
+             patch('leanup.repo.manager.LeanRepo.lake_update', return_value=("", "", 0)), \
+             patch('leanup.repo.manager.LeanRepo.lake_build', fake_build):
+            results = installer.install_all(specs)
+
+        assert len(progress) == len(specs)
+        assert [r['repository'] for r in results] == [s['repository'] for s in specs]
+        assert [r['status'] for r in results] == ['ok'] * 6 + ['failed']
+        assert results[0]['timings'].keys() == {'clone', 'total'}
+        assert results[1]['timings'].keys() == {'clone', 'toolchain', 'update', 'build', 'total'}
+        assert (temp_dir / 'repos' / 'lean2' / 'lakefile.lean').exists()
+        assert max(peak) == 1
+
+        # Existing checkouts are left alone unless forced
+        assert installer.install(specs[0])['status'] == 'skipped'
+
+        entry = installer.catalog.get(temp_dir / 'repos' / 'lean1')
+        assert entry['url'] == f"{upstreams}/org/lean"
+        assert entry['toolchain'] == 'leanprover/lean4:v4.9.0'
+        assert entry['commit_hash'] and entry['size'] > 0
+        assert entry['build_ok'] == 1 and entry['build_duration'] >= 0.1
+        assert installer.catalog.get(temp_dir / 'repos' / 'plain0')['last_build'] is None
+        assert installer.catalog.get(temp_dir / 'repos' / 'missing') is None
+
+    def test_update_failure(self, temp_dir, upstreams):
+        """Test a failed lake update skips the build"""
+        spec = {'repository': 'org/lean', 'source': upstreams, 'branch': None,
+                'dest_dir': temp_dir / 'lean'}
+        installer = RepoInstaller(builds=BuildLimiter(max_builds=1), share_artifacts=False)
+        with patch('leanup.repo.elan.ElanManager.install_toolchain', return_value=True), \
+             patch('leanup.repo.manager.LeanRepo.lake_update', return_value=("", "no network", 1)), \
+             patch('leanup.repo.manager.LeanRepo.lake_build') as mock_build:
+            result = installer.install(spec)
+        assert result['status'] == 'failed'
+        assert 'no network' in result['error']
+        mock_build.assert_not_called()
+
+    def test_cli_install_from(self, temp_dir, upstreams):
+        """Test `repo install --from` prints progress and a summary table"""
+        manifest = temp_dir / 'repos.yaml'
+        manifest.write_text(
+            f"- repository: org/plain\n  source: {upstreams}\n  dest_dir: {temp_dir / 'a'}\n"
+            f"- repository: org/plain\n  source: {upstreams}\n  dest_dir: {temp_dir / 'b'}\n"
+        )
+        result = CliRunner().invoke(cli, ['repo', 'install', '--from', str(manifest), '--max-builds', '1'])
+        assert result.exit_code == 0, result.output
+        assert result.output.count('✓ org/plain') == 2
+        assert 'repository  status  clone' in result.output
+        assert (temp_dir / 'b' / 'README.md').exists()
+
+
+class TestRepoSync:
+    """Test cases for syncing installed repositories"""
+
+    def commit(self, temp_dir, upstreams, files):
+        work = temp_dir / 'work' / 'lean'
+        for filename, content in files.items():
+            (work / filename).write_text(content)
+        git("add", ".", cwd=work)
+        git("commit", "-m", "change", cwd=work)
+        git("push", upstreams + '/org/lean', "main", cwd=work)
+
+    def test_sync_runs_only_needed_stages(self, temp_dir, upstreams):
+        """Test sync skips update and build unless the relevant files changed"""
+        dest = temp_dir / 'repos' / 'lean'
+        installer = RepoInstaller(builds=BuildLimiter(max_builds=1), share_artifacts=False)
+        with patch('leanup.repo.elan.ElanManager.install_toolchain', return_value=True), \
+             patch('leanup.repo.manager.LeanRepo.lake_update', return_value=("", "", 0)), \
+             patch('leanup.repo.manager.LeanRepo.lake_build', return_value=("", "", 0)):
+            installer.install({'repository': 'org/lean', 'source': upstreams, 'branch': None, 'dest_dir': dest})
+            (dest / '.lake' / 'build').mkdir(parents=True)
+            (dest / '.lake' / 'build' / 'Main.olean').write_text('olean')
+
+            result = installer.sync(dest)
+            assert result['status'] == 'unchanged'
+            assert result['timings'].keys() == {'fetch', 'total'}
+
+            self.commit(temp_dir, upstreams, {'README.md': 'docs'})
+            result = installer.sync(dest)
+            assert result['status'] == 'ok'
+            assert result['changed'] == ['README.md']
+            assert result['timings'].keys() == {'fetch', 'total'}
+            assert (dest / 'README.md').read_text() == 'docs'
+
+            self.commit(temp_dir, upstreams, {'Main.lean': 'def x := 1'})
+            result = installer.sync(dest)
+            assert result['timings'].keys() == {'fetch', 'build', 'total'}
+
+            self.commit(temp_dir, upstreams, {'lakefile.lean': '-- new dependency'})
+            result = installer.sync(dest)
+            assert result['timings'].keys() == {'fetch', 'update', 'build', 'total'}
+
+        assert (dest / '.lake' / 'build' / 'Main.olean').read_text() == 'olean'
+        assert (dest / '.git' / 'shallow').exists()
+
+    def test_cli_sync(self, temp_dir, upstreams):
+        """Test `repo sync` requires names or --all and reports each repository"""
+        search_dir = temp_dir / 'repos'
+        installer = RepoInstaller(builds=BuildLimiter(max_builds=1), share_artifacts=False)
+        installer.install({'repository': 'org/plain', 'source': upstreams, 'branch': None,
+                           'dest_dir': search_dir / 'plain'})
+        runner = CliRunner()
+        result = runner.invoke(cli, ['repo', 'sync', '--search-dir', str(search_dir)])
+        assert result.exit_code == 1
+        result = runner.invoke(cli, ['repo', 'sync', 'missing', '--search-dir', str(search_dir)])
+        assert result.exit_code == 1
+        result = runner.invoke(cli, ['repo', 'sync', '--all', '--search-dir', str(search_dir), '--max-builds', '1'])
+        assert result.exit_code == 0, result.output
+        assert '= plain' in result.output
+        assert 'repository  status     fetch' in result.output
@@ -1,10 +1,13 @@
+import asyncio
 import pytest
 import shutil
 from unittest.mock import patch, Mock
 from pathlib import Path
 import tempfile
+import time
 
-from leanup.repo.manager import LeanRepo, RepoManager
+from leanup.const import OS_TYPE
+from leanup.repo.manager import LeanRepo, RepoManager, AsyncLeanRepo
 
 
 class TestRepoManager:
@@ -114,4 +117,245 @@ class TestLeanRepo:
         assert info['has_lakefile_toml'] is True
         assert info['has_lakefile_lean'] is False
         assert info['build_dir_exists'] is True
-        assert info['has_lake_manifest'] is False
\ No newline at end of file
+        assert info['has_lake_manifest'] is False
+    
+    def test_check_many(self):
+        """Test checking many files concurrently"""
+        paths = [f"File{i}.lean" for i in range(10)]
+        with patch.object(self.lean_repo, 'lake_env_lean',
+                          side_effect=lambda p, **kw: (str(p), '', 0)) as mock_check:
+            results = list(self.lean_repo.check_many(paths, jobs=3, options={'maxHeartbeats': 0}))
+        
+        assert sorted(p for p, _ in results) == sorted(paths)
+        assert all(out == (p, '', 0) for p, out in results)
+        mock_check.assert_any_call('File0.lean', json=True, options={'maxHeartbeats': 0}, nproc=None, timeout=None)
+    
+    def test_check_many_ordered(self):
+        """Test checking many files preserves input order when requested"""
+        paths = [f"File{i}.lean" for i in range(6)]
+        
+        def fake_check(path, **kwargs):
+            # Later files finish first
+            time.sleep(0.01 * (6 - int(path[4])))
+            return path, '', 0
+        
+        with patch.object(self.lean_repo, 'lake_env_lean', side_effect=fake_check):
+            results = list(self.lean_repo.check_many(paths, jobs=6, ordered=True))
+        
+        assert [p for p, _ in results] == paths
+
+    def test_iter_lean_messages(self):
+        """Test streaming Lean messages with early termination"""
+        import sys
+        script = (
+            "import json, time\n"
+            "print('not json', flush=True)\n"
+            "for i, sev in enumerate(['warning', 'error', 'error']):\n"
+            "    print(json.dumps({'severity': sev, 'pos': {'line': i, 'column': 0}, 'data': str(i)}), flush=True)\n"
+            "time.sleep(30)\n"
+        )
+        with patch.object(self.lean_repo, '_lean_command',
+                          return_value=([sys.executable, '-c', script], None)) as mock_cmd:
+            messages = list(self.lean_repo.iter_lean_messages(
+                'Foo.lean', options={'maxHeartbeats': 0}, stop=lambda m: m['severity'] == 'error'))
+        
+        assert [m['severity'] for m in messages] == ['warning', 'error']
+        assert messages[1]['pos'] == {'line': 1, 'column': 0}
+        mock_cmd.assert_called_once_with(['--json', '-D maxHeartbeats=0', 'Foo.lean'])
+
+    def test_lake_env_lean_cache(self):
+        """Test identical checks are served from the result cache"""
+        from leanup.utils.cache import ResultCache
+        lean_repo = LeanRepo(self.temp_dir, cache=ResultCache(Path(self.temp_dir) / 'cache'))
+        (Path(self.temp_dir) / "Foo.lean").write_text("example : True := trivial")
+        
+        with patch.object(lean_repo, '_lean', return_value=('{}', '', 0)) as mock_lake:
+            assert lean_repo.lake_env_lean('Foo.lean') == ('{}', '', 0)
+            assert lean_repo.lake_env_lean('Foo.lean') == ('{}', '', 0)
+            assert mock_lake.call_count == 1
+            
+            lean_repo.lake_env_lean('Foo.lean', options={'maxHeartbeats': 0})
+            assert mock_lake.call_count == 2
+            
+            (Path(self.temp_dir) / "Foo.lean").write_text("example : False := sorry")
+            lean_repo.lake_env_lean('Foo.lean')
+            assert mock_lake.call_count == 3
+        
+        # Failures, e.g. from an import that is not built yet, are not cached
+        (Path(self.temp_dir) / "Bar.lean").write_text("import Foo")
+        with patch.object(lean_repo, '_lean', return_value=('', 'unknown package', 1)) as mock_lake:
+            lean_repo.lake_env_lean('Bar.lean')
+            lean_repo.lake_env_lean('Bar.lean')
+            assert mock_lake.call_count == 2
+        
+        assert lean_repo.result_cache.stats()['hits'] == 1
+
+    def test_lake_env_lean_cache_imports(self):
+        """Test cached checks depend on the build state of the imported modules"""
+        from leanup.utils.cache import ResultCache
+        lean_repo = LeanRepo(self.temp_dir, cache=ResultCache(Path(self.temp_dir) / 'cache'))
+        (Path(self.temp_dir) / "Bar.lean").write_text("import Init.Core\nimport Foo -- local\n")
+        lib = Path(self.temp_dir) / ".lake" / "build" / "lib" / "lean"
+        
+        with patch.object(lean_repo, '_lean', return_value=('{}', '', 0)) as mock_lean:
+            # Foo is not built yet, so the check is not cached
+            lean_repo.lake_env_lean('Bar.lean')
+            lean_repo.lake_env_lean('Bar.lean')
+            assert mock_lean.call_count == 2
+            
+            lib.mkdir(parents=True)
+            (lib / "Foo.olean").write_bytes(b'olean')
+            (lib / "Foo.trace").write_text('{"depHash": "1"}')
+            lean_repo.lake_env_lean('Bar.lean')
+            lean_repo.lake_env_lean('Bar.lean')
+            assert mock_lean.call_count == 3
+            
+            # Rebuilding Foo or anything it imports changes its trace
+            (lib / "Foo.trace").write_text('{"depHash": "2"}')
+            lean_repo.lake_env_lean('Bar.lean')
+            assert mock_lean.call_count == 4
+    
+    def test_lake_bypasses_elan_shim(self):
+        """Test lake runs from the resolved toolchain and falls back to the shim"""
+        (Path(self.temp_dir) / "lean-toolchain").write_text("leanprover/lean4:v4.9.0\n")
+        with patch.object(self.lean_repo.elan, 'resolve_toolchain_bin', return_value=None):
+            assert self.lean_repo._lake_command(["build"]) == ["lake", "build"]
+        
+        bin_dir = Path(self.temp_dir) / "bin"
+        bin_dir.mkdir()
+        lake_exe = bin_dir / ("lake.exe" if OS_TYPE == 'Windows' else "lake")
+        lake_exe.touch()
+        with patch.object(self.lean_repo.elan, 'resolve_toolchain_bin', return_value=bin_dir) as mock_resolve:
+            assert self.lean_repo._lake_command(["build"]) == [str(lake_exe), "build"]
+            mock_resolve.assert_called_with("leanprover/lean4:v4.9.0")
+
+    def test_lean_uses_cached_lake_env(self):
+        """Test lean runs directly with the environment captured from lake env"""
+        root = Path(self.temp_dir)
+        (root / "lake-manifest.json").write_text("{}")
+        printenv = "LEAN=/toolchain/bin/lean\nLEAN_PATH=/repo/.lake/build/lib\n"
+        
+        with patch('leanup.repo.manager.execute_command', return_value=(printenv, '', 0)) as mock_execute:
+            self.lean_repo.lean(['--json', 'Foo.lean'])
+            self.lean_repo.lean(['--json', 'Bar.lean'])
+            
+            assert mock_execute.call_count == 3
+            assert mock_execute.call_args_list[0][0][0][-2:] == ['env', 'printenv']
+            command = mock_execute.call_args_list[2][0][0]
+            assert command == ['/toolchain/bin/lean', '--json', 'Bar.lean']
+            assert mock_execute.call_args_list[2][1]['env']['LEAN_PATH'] == '/repo/.lake/build/lib'
+            
+            # Touching the manifest invalidates the captured environment
+            import os
+            os.utime(root / "lake-manifest.json", ns=(0, 0))
+            self.lean_repo.lean(['Foo.lean'])
+            assert mock_execute.call_count == 5
+    
+    def test_lean_falls_back_to_lake_env(self):
+        """Test lean goes through lake when the environment cannot be captured"""
+        with patch('leanup.repo.manager.execute_command', return_value=('', 'error', 1)) as mock_execute:
+            self.lean_repo.lean(['Foo.lean'])
+            
+            assert mock_execute.call_args_list[-1][0][0][-3:] == ['env', 'lean', 'Foo.lean']
+
+
+class TestAsyncLeanRepo:
+    """Test cases for AsyncLeanRepo class"""
+    
+    def setup_method(self):
+        """Setup test environment"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.lean_repo = AsyncLeanRepo(self.temp_dir, max_concurrency=2, direct_lean=False)
+    
+    def teardown_method(self):
+        """Cleanup test environment"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_lake_methods_are_coroutines(self):
+        """Test lake methods build the same commands as LeanRepo"""
+        async def fake_execute(command, **kwargs):
+            return ' '.join(command), '', 0
+        
+        with patch('leanup.repo.manager.async_execute_command', side_effect=fake_execute):
+            stdout, _, code = asyncio.run(
+                self.lean_repo.lake_env_lean('Foo.lean', options={'maxHeartbeats': 0}))
+            assert stdout == 'lake env lean --json -D maxHeartbeats=0 Foo.lean'
+            assert code == 0
+            stdout, _, _ = asyncio.run(self.lean_repo.lake_build('Foo'))
+            assert stdout == 'lake build Foo'
+    
+    def test_check_many(self):
+        """Test checking many files asynchronously"""
+        async def fake_execute(command, **kwargs):
+            return command[-1], '', 0
+        
+        async def collect():
+            return [item async for item in self.lean_repo.check_many(
+                ['A.lean', 'B.lean', 'C.lean'], jobs=2, ordered=True)]
+        
+        with patch('leanup.repo.manager.async_execute_command', side_effect=fake_execute):
+            results = asyncio.run(collect())
+        assert [p for p, _ in results] == ['A.lean', 'B.lean', 'C.lean']
+        assert results[0][1] == ('A.lean', '', 0)
+
+
+class TestSandboxes:
+    """Test cases for git worktree sandboxes"""
+    
+    def setup_method(self):
+        """Create a git repository with lake outputs"""
+        import subprocess
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.root = self.temp_dir / "project"
+        self.root.mkdir()
+        for args in (["init"], ["config", "user.email", "t@example.com"], ["config", "user.name", "t"]):
+            subprocess.run(["git", *args], cwd=self.root, check=True, capture_output=True)
+        (self.root / ".gitignore").write_text(".lake\n")
+        (self.root / "Main.lean").write_text("def main := 1\n")
+        subprocess.run(["git", "add", "."], cwd=self.root, check=True, capture_output=True)
+        subprocess.run(["git", "commit", "-m", "init"], cwd=self.root, check=True, capture_output=True)
+        (self.root / ".lake" / "packages" / "dep").mkdir(parents=True)
+        (self.root / ".lake" / "packages" / "dep" / "Dep.lean").write_text("def dep := 1\n")
+        (self.root / ".lake" / "build" / "lib").mkdir(parents=True)
+        (self.root / ".lake" / "build" / "lib" / "Main.olean").write_bytes(b"olean")
+        self.repo = LeanRepo(self.root)
+    
+    def teardown_method(self):
+        """Cleanup test environment"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_create_and_remove_sandboxes(self):
+        """Test sandboxes copy dependencies and build outputs"""
+        sandboxes = self.repo.create_sandboxes(2)
+        
+        assert len(sandboxes) == 2
+        assert all(isinstance(box, LeanRepo) for box in sandboxes)
+        box = sandboxes[0]
+        assert (box.cwd / "Main.lean").exists()
+        assert not (box.cwd / ".lake" / "packages").is_symlink()
+        assert (box.cwd / ".lake" / "packages" / "dep" / "Dep.lean").read_text() == "def dep := 1\n"
+        
+        # Nor do writes to its dependencies
+        (box.cwd / ".lake" / "packages" / "dep" / "Dep.lean").write_text("def dep := 2\n")
+        assert (self.root / ".lake" / "packages" / "dep" / "Dep.lean").read_text() == "def dep := 1\n"
+        
+        # Writes to a sandbox build do not reach the original
+        olean = box.cwd / ".lake" / "build" / "lib" / "Main.olean"
+        olean.write_bytes(b"changed")
+        assert (self.root / ".lake" / "build" / "lib" / "Main.olean").read_bytes() == b"olean"
+        
+        for box in sandboxes:
+            assert self.repo.remove_sandbox(box)
+        assert not sandboxes[0].cwd.exists()
+        assert (self.root / ".lake" / "packages" / "dep").is_dir()
+    
+    def test_sandbox_context_manager(self):
+        """Test a sandbox is removed after use"""
+        with self.repo.sandbox() as box:
+            path = box.cwd
+            assert (path / "Main.lean").exists()
+        assert not path.exists()
+    
+    def test_not_a_git_repo(self):
+        """Test sandboxes need a git repository"""
+        assert LeanRepo(self.temp_dir).create_sandboxes(1) == []
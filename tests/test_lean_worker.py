@@ -0,0 +1,111 @@
+import os
+import sys
+import pytest
+from pathlib import Path
+
+from leanup.const import OS_TYPE
+from leanup.repo.worker import LeanWorkerPool, split_imports
+
+# Minimal stand-in for the Lean REPL: one JSON request per blank-line separated block
+STUB_REPL = '''
+import json, sys
+env = 0
+buffer = ""
+for line in sys.stdin:
+    if line.strip():
+        buffer += line
+        continue
+    if not buffer:
+        continue
+    request = json.loads(buffer)
+    buffer = ""
+    messages = []
+    if "error" in request["cmd"]:
+        messages.append({"severity": "error", "data": "boom"})
+    print(json.dumps({"env": env, "messages": messages, "base": request.get("env")}))
+    print()
+    sys.stdout.flush()
+    env += 1
+'''
+
+
+@pytest.fixture
+def repl_command(temp_dir):
+    script = temp_dir / 'repl.py'
+    script.write_text(STUB_REPL)
+    return [sys.executable, str(script)]
+
+
+def test_split_imports():
+    """Test splitting the import header from the body"""
+    content = "-- comment\nimport Mathlib\nimport Foo Bar\n\ntheorem t : True := trivial\n"
+    imports, body = split_imports(content)
+    assert imports == ['Mathlib', 'Foo', 'Bar']
+    assert body.split('\n')[4] == "theorem t : True := trivial"
+    assert 'import' not in body
+
+
+def test_split_imports_line_comments():
+    """Test trailing comments on import lines are not taken for modules"""
+    imports, body = split_imports("import Mathlib -- everything\nimport Foo--local\ndef x := 1\n")
+    assert imports == ['Mathlib', 'Foo']
+    assert body.split('\n')[2] == "def x := 1"
+
+
+@pytest.mark.skipif(OS_TYPE == 'Windows', reason="Stub REPL uses POSIX pipes")
+class TestLeanWorkerPool:
+    """Test cases for LeanWorkerPool class"""
+
+    def test_run_reuses_header(self, temp_dir, repl_command):
+        """Test jobs run on top of the loaded header"""
+        with LeanWorkerPool(temp_dir, header="import Mathlib", command=repl_command) as pool:
+            pool.start()
+            first = pool.run("example : True := trivial")
+            second = pool.run("example : error")
+            assert first['base'] == 0
+            assert first['messages'] == []
+            assert second['base'] == 0
+            assert second['messages'][0]['severity'] == 'error'
+
+    def test_restart_after_max_jobs(self, temp_dir, repl_command):
+        """Test workers restart after max_jobs jobs"""
+        with LeanWorkerPool(temp_dir, header="import Mathlib",
+                            command=repl_command, max_jobs=2) as pool:
+            envs = [pool.run("example : True := trivial")['env'] for _ in range(4)]
+            assert envs == [1, 2, 1, 2]
+
+    def test_check_file(self, temp_dir, repl_command):
+        """Test checking files with covered and uncovered imports"""
+        (temp_dir / 'A.lean').write_text("import Mathlib\nexample : True := trivial\n")
+        (temp_dir / 'B.lean').write_text("import Other\nexample : True := trivial\n")
+        with LeanWorkerPool(temp_dir, header="import Mathlib", command=repl_command) as pool:
+            assert pool.check_file('A.lean')['base'] == 0
+            assert pool.check_file('B.lean')['base'] is None
+            assert 'error' in pool.check_file('missing.lean')
+
+    def test_worker_crash_returns_error(self, temp_dir):
+        """Test a crashing worker reports an error"""
+        pool = LeanWorkerPool(temp_dir, command=[sys.executable, '-c', 'pass'])
+        result = pool.run("example : True := trivial")
+        assert 'error' in result
+        pool.close()
+
+    def test_fallback_without_repl(self, temp_dir, monkeypatch):
+        """Test projects without a repl executable are checked with lake env lean"""
+        lake = temp_dir / 'bin' / 'lake'
+        lake.parent.mkdir()
+        lake.write_text(
+            '#!/bin/sh\n'
+            'if [ "$1" = exe ]; then echo "error: unknown executable \'$2\'" >&2; exit 1; fi\n'
+            'shift 3\n'
+            'grep -q error "$@" || exit 0\n'
+            'echo \'{"severity": "error", "data": "boom"}\'; exit 1\n')
+        lake.chmod(0o755)
+        monkeypatch.setenv('PATH', f"{lake.parent}{os.pathsep}{os.environ['PATH']}")
+        (temp_dir / 'A.lean').write_text("import Mathlib\nexample : True := trivial\n")
+        with LeanWorkerPool(temp_dir, header="import Mathlib") as pool:
+            pool.start()
+            assert pool.fallback
+            assert pool.check_file('A.lean') == {"messages": []}
+            assert pool.run("example : error")['messages'][0]['data'] == 'boom'
+        assert [p.name for p in temp_dir.iterdir() if p.suffix == '.lean'] == ['A.lean']
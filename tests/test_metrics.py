@@ -0,0 +1,180 @@
+import asyncio
+import json
+import subprocess
+import sys
+import pytest
+from unittest.mock import patch
+from click.testing import CliRunner
+
+from leanup.cli import cli
+from leanup.repo.manager import LeanRepo, AsyncLeanRepo, RepoManager
+from leanup.utils import metrics
+from leanup.utils.cache import ResultCache
+from leanup.utils.metrics import MetricsStore, percentile
+
+
+@pytest.fixture
+def store(temp_dir, monkeypatch):
+    """Record metrics into a temporary database"""
+    store = MetricsStore(temp_dir / 'metrics.db')
+    monkeypatch.setenv('LEANUP_METRICS', '1')
+    monkeypatch.setattr(metrics, '_default_store', store)
+    return store
+
+
+def add_runs(store, operation, repo, durations, **fields):
+    for i, duration in enumerate(durations):
+        store.record(operation, duration, repo=repo, timestamp=1000 + i, **fields)
+
+
+class TestMetricsStore:
+    """Test cases for MetricsStore class"""
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles"""
+        values = list(range(1, 101))
+        assert percentile(values, 50) == 50
+        assert percentile(values, 95) == 95
+        assert percentile(values, 99) == 99
+        assert percentile([3.0], 99) == 3.0
+        assert percentile([], 50) is None
+
+    def test_summary(self, store):
+        """Test percentiles per operation and repository, ignoring failures"""
+        add_runs(store, 'repo.lake_build', '/repos/a', [1, 2, 3, 4, 100])
+        add_runs(store, 'repo.lake_build', '/repos/b', [5])
+        store.record('repo.lake_build', 500, repo='/repos/a', ok=False)
+        rows = store.summary()
+        assert [(row['repo'], row['count']) for row in rows] == [('/repos/a', 5), ('/repos/b', 1)]
+        assert rows[0]['p50'] == 3
+        assert rows[0]['p99'] == 100
+        assert [row['repo'] for row in store.summary(repo='b')] == ['/repos/b']
+
+    def test_regressions(self, store):
+        """Test recent runs slower than the earlier ones are flagged"""
+        add_runs(store, 'repo.lake_build', '/repos/a', [10] * 10 + [15] * 5)
+        add_runs(store, 'repo.lake_build', '/repos/b', [10] * 10 + [11] * 5)
+        add_runs(store, 'repo.lake_update', '/repos/a', [1, 9])
+        rows = store.regressions(threshold=0.2)
+        assert [(row['operation'], row['repo']) for row in rows] == [('repo.lake_build', '/repos/a')]
+        assert rows[0]['change'] == pytest.approx(0.5)
+
+    def test_trend(self, store):
+        """Test medians per commit in the order the commits were first seen"""
+        add_runs(store, 'repo.lake_build', '/repos/a', [10, 12], commit='aaa')
+        store.record('repo.lake_build', 20, repo='/repos/a', commit='bbb', timestamp=2000)
+        rows = store.trend(by='commit_hash')
+        assert [(row['commit_hash'], row['median']) for row in rows] == [('aaa', 11), ('bbb', 20)]
+        assert rows[1]['regression']
+
+    def test_missing_database(self, temp_dir):
+        """Test an empty result before anything was recorded"""
+        assert MetricsStore(temp_dir / 'none.db').summary() == []
+
+
+class TestRecordedOperations:
+    """Test LeanRepo operations record their timings"""
+
+    @pytest.fixture
+    def repo(self, temp_dir):
+        subprocess.run(['git', 'init', '-q'], cwd=temp_dir, check=True)
+        subprocess.run(['git', '-c', 'user.name=t', '-c', 'user.email=t@t', 'commit', '-q',
+                        '--allow-empty', '-m', 'init'], cwd=temp_dir, check=True)
+        (temp_dir / 'lean-toolchain').write_text('leanprover/lean4:v4.9.0\n')
+        return LeanRepo(temp_dir)
+
+    def test_head_commit(self, repo):
+        """Test the checked out commit is read without git"""
+        head = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=repo.cwd,
+                              capture_output=True, text=True).stdout.strip()
+        assert repo.head_commit() == head
+        subprocess.run(['git', 'pack-refs', '--all'], cwd=repo.cwd, check=True)
+        assert repo.head_commit() == head
+        assert RepoManager(repo.cwd / 'missing').head_commit() is None
+
+    def test_lake_build_recorded(self, store, repo):
+        """Test lake_build records repo, toolchain, commit, result and peak RSS"""
+        code = "import sys; block = bytearray(32 * 1024 * 1024); sys.exit(1)"
+        with patch.object(LeanRepo, '_lake_command', return_value=[sys.executable, '-c', code]):
+            repo.lake_build()
+        record, = store.records(ok=None)
+        assert record['operation'] == 'repo.lake_build'
+        assert record['repo'] == str(repo.cwd)
+        assert record['toolchain'] == 'leanprover/lean4:v4.9.0'
+        assert record['commit_hash'] == repo.head_commit()
+        assert record['ok'] == 0
+        assert record['duration'] > 0
+        if sys.platform != 'win32':
+            assert record['peak_rss'] > 32 * 1024 * 1024
+
+    def test_async_lake_update_recorded(self, store, temp_dir):
+        """Test awaited operations are recorded once they complete"""
+        async def fake_execute(command, **kwargs):
+            await asyncio.sleep(0.05)
+            return '', '', 0
+
+        with patch('leanup.repo.manager.async_execute_command', side_effect=fake_execute):
+            asyncio.run(AsyncLeanRepo(temp_dir).lake_update())
+        record, = store.records()
+        assert record['operation'] == 'repo.lake_update'
+        assert record['duration'] >= 0.05
+
+    def test_checks_recorded(self, store, repo):
+        """Test checks are recorded once per file run, with a record for each batch"""
+        (repo.cwd / 'Foo.lean').write_text('example : True := trivial')
+        repo.result_cache = ResultCache(repo.cwd / 'cache')
+        with patch.object(LeanRepo, '_lean', side_effect=[('', '', 0), ('', 'error', 1)]):
+            results = list(repo.check_many(['Foo.lean', 'Foo.lean', 'Bar.lean'], jobs=1, ordered=True))
+        assert [result[2] for _, result in results] == [0, 0, 1]
+        records = store.records(ok=None)
+        # The second check of Foo.lean is a cache hit, which is not recorded
+        assert [(r['operation'], r['ok']) for r in records] == [
+            ('repo.check_many', 0), ('repo.lake_env_lean', 1), ('repo.lake_env_lean', 0)]
+        assert records[0]['commit_hash'] == repo.head_commit()
+        assert records[1]['toolchain'] == 'leanprover/lean4:v4.9.0'
+
+        with patch.object(LeanRepo, 'execute_command', return_value=('', '', 0)):
+            repo.lean(['Foo.lean'])
+        assert store.records(operation='repo.lean')[0]['repo'] == str(repo.cwd)
+
+    def test_worker_check_recorded(self, store, repo):
+        """Test files checked by a worker pool are recorded"""
+        (repo.cwd / 'Foo.lean').write_text('example : True := trivial')
+        pool = repo.worker_pool()
+        with patch.object(pool, 'run', return_value={'env': 0}):
+            pool.check_file('Foo.lean')
+        record, = store.records()
+        assert (record['operation'], record['repo']) == ('worker.check_file', str(repo.cwd))
+
+    def test_disabled(self, store, repo, monkeypatch):
+        """Test LEANUP_METRICS=0 stops recording"""
+        monkeypatch.setenv('LEANUP_METRICS', '0')
+        with patch('leanup.repo.manager.execute_command', return_value=('', '', 0)):
+            repo.lake_build()
+        assert store.records(ok=None) == []
+
+
+class TestStatsCommand:
+    """Test the stats command"""
+
+    def test_stats(self, store):
+        """Test percentiles and regressions are printed"""
+        add_runs(store, 'repo.lake_build', '/repos/mathlib4', [10] * 10 + [30] * 5, commit='abc')
+        result = CliRunner().invoke(cli, ['stats', '--by', 'commit'])
+        assert result.exit_code == 0
+        assert 'repo.lake_build  mathlib4' in result.output
+        assert '⚠ repo.lake_build mathlib4: 10.0s → 30.0s (+200%)' in result.output
+
+    def test_stats_json(self, store):
+        """Test the JSON report"""
+        add_runs(store, 'elan.install_toolchain', None, [1, 2, 3])
+        result = CliRunner().invoke(cli, ['stats', '--json', '--operation', 'elan.install_toolchain'])
+        report = json.loads(result.output)
+        assert report['summary'][0]['count'] == 3
+        assert report['regressions'] == []
+
+    def test_stats_empty(self, store):
+        """Test the message before anything was recorded"""
+        result = CliRunner().invoke(cli, ['stats'])
+        assert result.exit_code == 0
+        assert 'No metrics recorded yet' in result.output
@@ -0,0 +1,61 @@
+import subprocess
+import pytest
+
+from leanup.repo.manager import RepoManager
+from leanup.repo.mirror import MirrorCache
+
+
+def git(*args, cwd=None):
+    subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True)
+
+
+@pytest.fixture
+def upstream(temp_dir):
+    """Create a bare upstream repository with two branches"""
+    work = temp_dir / 'work'
+    work.mkdir()
+    git("init", "-b", "main", cwd=work)
+    git("config", "user.email", "test@example.com", cwd=work)
+    git("config", "user.name", "test", cwd=work)
+    (work / "README.md").write_text("hello")
+    git("add", ".", cwd=work)
+    git("commit", "-m", "init", cwd=work)
+    git("branch", "dev", cwd=work)
+    bare = temp_dir / 'upstream.git'
+    git("clone", "--bare", str(work), str(bare))
+    return work, bare.as_uri()
+
+
+class TestMirrorCache:
+    """Test cases for MirrorCache class"""
+    
+    def test_clone_through_mirror(self, temp_dir, upstream):
+        """Test clones are made from the mirror and keep the upstream origin"""
+        work, url = upstream
+        mirror = MirrorCache(temp_dir / 'mirrors')
+        for name in ['first', 'second', 'third']:
+            (temp_dir / name).mkdir()
+        
+        first = RepoManager(temp_dir / 'first')
+        assert first.clone_from(url, mirror=mirror)
+        assert mirror.mirror_path(url).exists()
+        assert (temp_dir / 'first' / 'README.md').read_text() == 'hello'
+        assert first._git_repo.remotes.origin.url == url
+        
+        # New upstream commits reach later clones through a fetch
+        (work / "NEW.md").write_text("new")
+        git("add", ".", cwd=work)
+        git("commit", "-m", "new", cwd=work)
+        git("push", url, "main", cwd=work)
+        
+        second = RepoManager(temp_dir / 'second')
+        assert second.clone_from(url, branch='dev', mirror=mirror)
+        assert second.git_status()['branch'] == 'dev'
+        third = RepoManager(temp_dir / 'third')
+        assert third.clone_from(url, mirror=mirror)
+        assert (temp_dir / 'third' / 'NEW.md').exists()
+    
+    def test_update_failure(self, temp_dir):
+        """Test a missing upstream yields no mirror"""
+        mirror = MirrorCache(temp_dir / 'mirrors')
+        assert mirror.update((temp_dir / 'missing.git').as_uri()) is None
@@ -0,0 +1,65 @@
+import pstats
+import sys
+from unittest.mock import Mock, patch
+from click.testing import CliRunner
+
+from leanup.cli import cli
+from leanup.utils import tracing
+from leanup.utils.basic import execute_command
+from leanup.utils.profiling import CommandProfiler, DEFAULT_PROFILE, _busy_time
+
+
+class TestCommandProfiler:
+    """Test cases for CommandProfiler class"""
+
+    def test_busy_time(self):
+        """Test overlapping intervals are counted once"""
+        assert _busy_time([]) == 0
+        assert _busy_time([(0, 2), (1, 3), (5, 6)]) == 4
+        assert _busy_time([(4, 5), (0, 10)]) == 10
+
+    def test_subprocess_wait(self, temp_dir):
+        """Test time waiting on commands is split from Python CPU time"""
+        profiler = CommandProfiler(temp_dir / 'out.prof')
+        profiler.start()
+        execute_command([sys.executable, '-c', 'import time; time.sleep(0.2)'])
+        result = profiler.stop()
+        assert result['commands'] == 1
+        assert result['subprocess'] >= 0.2
+        assert result['cpu'] < result['subprocess']
+        assert 'subprocess wait' in result['report']
+        assert 'Slowest commands:' in result['report']
+        assert pstats.Stats(str(temp_dir / 'out.prof')).total_calls > 0
+        assert (temp_dir / 'out.prof.txt').read_text() == result['report']
+        # The tracer it enabled is turned off again
+        assert tracing.get_tracer() is None
+
+
+class TestProfileOption:
+    """Test the --profile option of the CLI"""
+
+    @patch('leanup.cli.ElanManager')
+    def test_profile_default_file(self, mock_elan_manager, temp_dir, monkeypatch):
+        """Test --profile without a value writes the default file"""
+        mock_elan_manager.return_value = Mock(get_status_info=Mock(return_value={'installed': False}))
+        monkeypatch.chdir(temp_dir)
+        result = CliRunner().invoke(cli, ['--profile', 'status'])
+        assert result.exit_code == 0
+        assert 'Python CPU' in result.output
+        assert (temp_dir / DEFAULT_PROFILE).exists()
+        assert (temp_dir / (DEFAULT_PROFILE + '.txt')).exists()
+
+    @patch('leanup.cli.ElanManager')
+    def test_profile_command(self, mock_elan_manager, temp_dir):
+        """Test commands run by the profiled command are reported"""
+        def proxy(args):
+            execute_command([sys.executable, '-c', 'import time; time.sleep(0.2)'])
+            return 0
+
+        mock_elan_manager.return_value = Mock(proxy_elan_command=Mock(side_effect=proxy))
+        path = temp_dir / 'elan.prof'
+        result = CliRunner().invoke(cli, [f'--profile={path}', 'elan', '--version'])
+        assert result.exit_code == 0
+        report = (temp_dir / 'elan.prof.txt').read_text()
+        assert '1 commands' in report
+        assert sys.executable.rsplit('/', 1)[-1] in report
@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+import pytest
+
+from leanup.const import OS_TYPE
+
+# Modules only needed by the code paths that use them
+HEAVY_MODULES = ['git', 'requests', 'urllib3', 'yaml', 'psutil', 'asyncio', 'colorama',
+                 'leanup.cli.repo', 'leanup.repo.manager', 'leanup.utils.download']
+
+# Cumulative `python -X importtime` budget of leanup.cli, in microseconds
+# (about 70 ms measured on an idle machine)
+IMPORT_BUDGET_US = 100_000
+
+
+def import_times(code, env=None):
+    """Run `code` with `-X importtime` and return cumulative import times by module"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            capture_output=True, text=True, env=env)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return result, times
+
+
+class TestStartup:
+    """Test the CLI only imports what a command needs"""
+
+    def test_import_cli(self):
+        """Test importing the CLI stays within budget and skips heavy modules"""
+        result, times = import_times('import leanup.cli')
+        assert result.returncode == 0, result.stderr
+        assert [name for name in HEAVY_MODULES if name in times] == []
+        # Best of a few runs, so a busy machine does not fail the budget
+        best = min([times['leanup.cli']] + [import_times('import leanup.cli')[1]['leanup.cli'] for _ in range(2)])
+        assert best < IMPORT_BUDGET_US
+
+    @pytest.mark.skipif(OS_TYPE == 'Windows', reason="Uses a shell script as elan")
+    def test_elan_proxy(self, mock_elan_home):
+        """Test `leanup elan` runs elan without loading repository support"""
+        elan = mock_elan_home / 'bin' / 'elan'
+        elan.write_text('#!/bin/sh\necho "elan $@"\n')
+        elan.chmod(0o755)
+        env = dict(os.environ, ELAN_HOME=str(mock_elan_home))
+        result, times = import_times("from leanup.cli import cli; cli(['elan', '--version'])", env=env)
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.strip() == 'elan --version'
+        assert [name for name in HEAVY_MODULES if name in times] == []
+
+    def test_help_lists_lazy_commands(self):
+        """Test `--help` lists subcommands without importing them"""
+        result, times = import_times("from leanup.cli import cli; cli(['--help'])")
+        assert result.returncode == 0, result.stderr
+        assert 'repo' in result.stdout
+        assert 'leanup.cli.repo' not in times
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock, patch
+from click.testing import CliRunner
+
+from leanup.cli import cli
+from leanup.utils import tracing
+from leanup.utils.basic import execute_command, async_execute_command, stream_command
+
+
+@pytest.fixture
+def tracer(temp_dir):
+    """Enable tracing into a JSON lines file for one test"""
+    active = tracing.enable(temp_dir / 'trace.jsonl')
+    yield active
+    tracing.disable()
+
+
+def by_name(tracer):
+    return {span.name: span for span in tracer.spans}
+
+
+class TestTracing:
+    """Test cases for spans, command tracing and trace export"""
+
+    def test_disabled(self):
+        """Test spans are no-ops while tracing is off"""
+        assert tracing.get_tracer() is None
+        with tracing.span('noop') as span:
+            span.set(ignored=True)
+        assert execute_command([sys.executable, '-c', 'pass'])[2] == 0
+
+    def test_nested_spans(self, tracer):
+        """Test spans nest under the current span, also in worker threads"""
+        def work():
+            with tracing.span('worker'):
+                pass
+
+        with tracing.span('outer', repository='demo'):
+            with tracing.span('inner'):
+                pass
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                executor.submit(tracing.in_context(work)).result()
+        spans = by_name(tracer)
+        assert spans['inner'].parent_id == spans['outer'].id
+        assert spans['worker'].parent_id == spans['outer'].id
+        assert spans['worker'].thread != threading.get_ident()
+        assert spans['outer'].attrs == {'repository': 'demo'}
+
+    def test_execute_command_span(self, tracer, temp_dir):
+        """Test commands record argv, cwd, exit code, output size and peak RSS"""
+        code = "import sys; block = bytearray(64 * 1024 * 1024); print('x' * 99); sys.exit(3)"
+        with tracing.span('build'):
+            stdout, _, returncode = execute_command([sys.executable, '-c', code], cwd=str(temp_dir))
+        assert returncode == 3
+        command = next(span for span in tracer.spans if span.name.startswith('python'))
+        assert command.parent_id == by_name(tracer)['build'].id
+        assert command.attrs['argv'][1:] == ['-c', code]
+        assert command.attrs['cwd'] == str(temp_dir)
+        assert command.attrs['returncode'] == 3
+        assert command.attrs['stdout_bytes'] == 100
+        if hasattr(os, 'wait4'):
+            assert command.attrs['peak_rss'] > 64 * 1024 * 1024
+
+    @pytest.mark.skipif(not hasattr(os, 'wait4'), reason="needs os.wait4")
+    def test_rusage_popen(self, tracer):
+        """Test the child's usage is recorded whether it is reaped by poll or wait"""
+        code = "import sys; block = bytearray(64 * 1024 * 1024); sys.exit(3)"
+        with tracing.span('poll') as span:
+            process = tracing.RusagePopen([sys.executable, '-c', code])
+            while process.poll() is None:
+                time.sleep(0.01)
+        assert process.returncode == 3 and process.wait() == 3
+        assert span.attrs['peak_rss'] > 64 * 1024 * 1024
+        assert span.attrs['user_time'] > 0
+
+        with tracing.span('wait') as span:
+            process = tracing.RusagePopen([sys.executable, '-c', 'import time; time.sleep(30)'])
+            with pytest.raises(subprocess.TimeoutExpired):
+                process.wait(timeout=0.05)
+            process.terminate()
+            assert process.wait(timeout=5) == -signal.SIGTERM
+        assert span.attrs['peak_rss'] > 0
+
+    def test_async_and_stream_spans(self, tracer):
+        """Test async and streamed commands are traced too"""
+        asyncio.run(async_execute_command([sys.executable, '-c', 'print(1)']))
+        assert list(stream_command([sys.executable, '-c', 'print(2)'])) == ['2']
+        spans = [span for span in tracer.spans if span.name.startswith('python')]
+        assert [span.attrs['stdout_bytes'] for span in spans] == [2, 2]
+        assert all(span.attrs['returncode'] == 0 for span in spans)
+
+    def test_stream_command_spawn_error(self, tracer, temp_dir):
+        """Test a streamed command that fails to start still finishes its span"""
+        missing = str(temp_dir / 'missing')
+        with pytest.raises(OSError):
+            list(stream_command([missing]))
+        span, = [span for span in tracer.spans if span.attrs.get('argv') == [missing]]
+        assert 'FileNotFoundError' in span.attrs['error']
+
+    def test_traced_coroutine(self, tracer):
+        """Test coroutines returned by traced functions are timed until they complete"""
+        @tracing.traced('sleep')
+        def sleep():
+            return asyncio.sleep(0.05)
+
+        asyncio.run(sleep())
+        assert by_name(tracer)['sleep'].duration >= 0.05
+
+    def test_export(self, tracer, temp_dir):
+        """Test JSON lines and Chrome trace_event export"""
+        with tracing.span('outer'):
+            with tracing.span('inner', target='Demo'):
+                pass
+        tracer.save()
+        lines = [json.loads(line) for line in (temp_dir / 'trace.jsonl').read_text().splitlines()]
+        assert [line['name'] for line in lines] == ['inner', 'outer']
+        assert lines[0]['parent'] == lines[1]['id']
+        assert lines[0]['attrs'] == {'target': 'Demo'}
+
+        chrome = json.loads(tracer.save(temp_dir / 'trace.json').read_text())
+        events = chrome['traceEvents']
+        assert [event['ph'] for event in events] == ['X', 'X']
+        assert events[0]['args']['target'] == 'Demo'
+        assert events[0]['ts'] >= events[1]['ts']
+        assert events[0]['dur'] <= events[1]['dur']
+
+    @patch('leanup.cli.ElanManager')
+    def test_cli_trace(self, mock_elan_manager, temp_dir):
+        """Test `--trace` writes a trace with the command as root span"""
+        mock_elan = Mock()
+        mock_elan.is_elan_installed.return_value = True
+        mock_elan.proxy_elan_command.return_value = 0
+        mock_elan_manager.return_value = mock_elan
+
+        trace = temp_dir / 'cli.jsonl'
+        result = CliRunner().invoke(cli, ['--trace', str(trace), 'elan', '--version'])
+        assert result.exit_code == 0
+        assert tracing.get_tracer() is None
+        spans = [json.loads(line) for line in trace.read_text().splitlines()]
+        assert spans[-1]['name'] == 'leanup elan'
+        assert spans[-1]['attrs']['exit_code'] == 0
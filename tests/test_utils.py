@@ -1,9 +1,17 @@
+import asyncio
+import io
+import os
+import stat
+import tarfile
 import subprocess
+import sys
+import time
 import pytest
 from unittest.mock import patch, Mock
 from pathlib import Path
 from leanup.const import OS_TYPE
-from leanup.utils.basic import execute_command
+from leanup.utils.basic import execute_command, async_execute_command, OutputCapture, TIMEOUT_RETURNCODE
+from leanup.utils.archive import extract_archive
 from leanup.utils.custom_logger import setup_logger
 
 
@@ -48,14 +56,181 @@ class TestExecuteCommand:
         
         execute_command(['ls'], cwd='/tmp')
         
+        group_kwargs = ({'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+                        if OS_TYPE == 'Windows' else {'start_new_session': True})
         mock_popen.assert_called_once_with(
             ['ls'],
             cwd='/tmp',
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True,
-            shell= OS_TYPE == 'Windows'
+            shell= OS_TYPE == 'Windows',
+            env=None,
+            **group_kwargs
         )
+    
+    @pytest.mark.skipif(OS_TYPE == 'Windows', reason="Uses POSIX process groups")
+    def test_execute_command_timeout_kills_process_group(self, temp_dir):
+        """Test timeout kills grandchildren and returns partial output"""
+        import psutil
+        pid_file = temp_dir / 'pid'
+        grandchild = f"import os, time; open({str(pid_file)!r}, 'w').write(str(os.getpid())); time.sleep(30)"
+        script = (
+            "import subprocess, sys, time\n"
+            f"subprocess.Popen([sys.executable, '-c', {grandchild!r}])\n"
+            "print('partial', flush=True)\n"
+            "time.sleep(30)\n"
+        )
+        start = time.monotonic()
+        stdout, stderr, code = execute_command([sys.executable, '-c', script], timeout=1)
+        
+        assert time.monotonic() - start < 10
+        assert code == TIMEOUT_RETURNCODE
+        assert stdout == 'partial\n'
+        assert 'timed out' in stderr
+        pid = int(pid_file.read_text())
+        
+        def gone():
+            try:
+                return psutil.Process(pid).status() == psutil.STATUS_ZOMBIE
+            except psutil.NoSuchProcess:
+                return True
+        
+        # SIGKILL is delivered asynchronously, so give the grandchild a moment to exit
+        deadline = time.monotonic() + 5
+        while not gone() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert gone()
+    
+    def test_execute_command_exit_code_not_timeout(self):
+        """Test a command exiting with coreutils timeout's code is not reported as timed out"""
+        _, _, code = execute_command([sys.executable, '-c', 'import sys; sys.exit(124)'], timeout=30)
+        assert code == 124
+        assert code != TIMEOUT_RETURNCODE
+
+
+@pytest.mark.skipif(OS_TYPE == 'Windows', reason="Uses POSIX commands")
+class TestAsyncExecuteCommand:
+    """Test cases for async_execute_command function"""
+    
+    def test_async_execute_command_success(self):
+        """Test successful async command execution"""
+        stdout, stderr, code = asyncio.run(async_execute_command(['echo', 'hello']))
+        
+        assert stdout == 'hello\n'
+        assert stderr == ''
+        assert code == 0
+    
+    def test_async_execute_command_input(self):
+        """Test async command execution with input"""
+        stdout, _, code = asyncio.run(async_execute_command(['cat'], input='data'))
+        
+        assert stdout == 'data'
+        assert code == 0
+    
+    def test_async_execute_command_timeout(self):
+        """Test async command execution with timeout"""
+        start = time.monotonic()
+        stdout, _, code = asyncio.run(async_execute_command(
+            ['sh', '-c', 'echo partial; sleep 10'], timeout=0.5))
+        
+        assert code == TIMEOUT_RETURNCODE
+        assert stdout == 'partial\n'
+        assert time.monotonic() - start < 5
+    
+    def test_async_execute_command_cancel_kills_child(self, temp_dir):
+        """Test cancelling the coroutine kills the child process"""
+        import psutil
+        pid_file = temp_dir / 'pid'
+        script = f"import os, time; open({str(pid_file)!r}, 'w').write(str(os.getpid())); time.sleep(30)"
+        
+        async def run():
+            task = asyncio.ensure_future(async_execute_command([sys.executable, '-c', script]))
+            while not pid_file.exists() or not pid_file.read_text():
+                await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        
+        asyncio.run(run())
+        pid = int(pid_file.read_text())
+        assert not psutil.pid_exists(pid) or psutil.Process(pid).status() == psutil.STATUS_ZOMBIE
+    
+    def test_async_execute_command_semaphore(self):
+        """Test semaphore caps concurrent commands"""
+        async def run():
+            semaphore = asyncio.Semaphore(2)
+            start = time.monotonic()
+            await asyncio.gather(*[
+                async_execute_command(['sleep', '0.2'], semaphore=semaphore) for _ in range(4)])
+            return time.monotonic() - start
+        
+        assert asyncio.run(run()) >= 0.4
+
+
+class TestOutputCapture:
+    """Test cases for bounded-memory output capture"""
+    
+    SCRIPT = (
+        "import sys\n"
+        "for i in range(2000):\n"
+        "    print(f'line {i}' + ' ' * 100)\n"
+        "    if i == 10:\n"
+        "        print('error: bad thing')\n"
+        "print('warn', file=sys.stderr)\n"
+    )
+    
+    def test_tail_and_error_lines(self):
+        """Test only the tail and matching lines are kept"""
+        capture = OutputCapture(tail_kb=1)
+        stdout, stderr, code = execute_command([sys.executable, '-c', self.SCRIPT], capture=capture)
+        
+        assert code == 0
+        assert len(stdout) < 2048
+        assert stdout.startswith('error: bad thing\n')
+        assert 'bytes omitted' in stdout
+        assert stdout.rstrip().endswith('line 1999')
+        assert stderr == 'warn\n'
+    
+    def test_spill_file(self, temp_dir):
+        """Test full output is written to the spill file"""
+        spill = temp_dir / 'build.log'
+        capture = OutputCapture(tail_kb=1, spill_file=spill)
+        execute_command([sys.executable, '-c', self.SCRIPT], capture=capture)
+        
+        content = spill.read_text()
+        assert content.count('\n') == 2002
+        assert 'line 0 ' in content
+    
+    def test_long_line_bounded(self):
+        """Test the tail is bounded in UTF-8 bytes, also inside a line without newline"""
+        script = "import sys; sys.stdout.write('é' * 4 * 1024 * 1024 + 'end')"
+        for run in (execute_command, lambda *args, **kwargs: asyncio.run(async_execute_command(*args, **kwargs))):
+            seen = []
+            capture = OutputCapture(tail_kb=1, on_line=lambda line: seen.append(len(line)))
+            stdout, _, code = run([sys.executable, '-c', script], capture=capture)
+            assert code == 0
+            tail = stdout.split('omitted] ...\n')[1]
+            assert len(tail.encode()) <= 1024
+            assert tail.endswith('éééend')
+            assert f"[{8 * 1024 * 1024 + 3 - len(tail.encode())} bytes omitted]" in stdout
+            assert max(seen) <= 64 * 1024
+    
+    def test_small_output_unchanged(self):
+        """Test output below the limit is returned in full"""
+        stdout, _, code = execute_command([sys.executable, '-c', 'print("hi")'],
+                                          capture=OutputCapture())
+        assert stdout == 'hi\n'
+        assert code == 0
+    
+    def test_async_capture(self):
+        """Test bounded capture with async execution"""
+        stdout, stderr, code = asyncio.run(async_execute_command(
+            [sys.executable, '-c', self.SCRIPT], capture=OutputCapture(tail_kb=1)))
+        
+        assert code == 0
+        assert stdout.startswith('error: bad thing\n')
+        assert len(stdout) < 2048
 
 
 class TestSetupLogger:
@@ -79,4 +254,91 @@ class TestSetupLogger:
         
         assert log_file.exists()
         content = log_file.read_text()
-        assert 'test message' in content
\ No newline at end of file
+        assert 'test message' in content
+
+class TestExtractArchive:
+    """Test cases for extract_archive function"""
+    
+    def test_tar_strip_components(self, temp_dir):
+        """Test tar archives are extracted as a stream with leading components stripped"""
+        archive = temp_dir / 'release.tar.gz'
+        with tarfile.open(archive, 'w:gz') as tar:
+            data = b'#!/bin/sh\n'
+            info = tarfile.TarInfo('lean-4.9.0-linux/bin/lean')
+            info.size = len(data)
+            info.mode = 0o755
+            tar.addfile(info, io.BytesIO(data))
+            link = tarfile.TarInfo('lean-4.9.0-linux/bin/lean-copy')
+            link.type = tarfile.LNKTYPE
+            link.linkname = 'lean-4.9.0-linux/bin/lean'
+            link.mode = 0o755
+            tar.addfile(link)
+        
+        extract_archive(archive, temp_dir / 'out', strip_components=1)
+        assert (temp_dir / 'out' / 'bin' / 'lean').read_bytes() == b'#!/bin/sh\n'
+        assert (temp_dir / 'out' / 'bin' / 'lean-copy').read_bytes() == b'#!/bin/sh\n'
+        if OS_TYPE != 'Windows':
+            assert os.access(temp_dir / 'out' / 'bin' / 'lean', os.X_OK)
+    
+    def test_unknown_format(self, temp_dir):
+        """Test unknown archive formats are rejected"""
+        (temp_dir / 'file.rar').write_bytes(b'')
+        with pytest.raises(ValueError):
+            extract_archive(temp_dir / 'file.rar', temp_dir / 'out')
+    
+    @pytest.mark.skipif(OS_TYPE == 'Windows', reason="Unix symlinks")
+    def test_zip_symlinks(self, temp_dir):
+        """Test zip symlinks inside the target are kept and links out of it rejected"""
+        import zipfile
+        
+        def make_zip(path, members):
+            with zipfile.ZipFile(path, 'w') as archive:
+                for name, data, mode in members:
+                    info = zipfile.ZipInfo(name)
+                    info.external_attr = mode << 16
+                    archive.writestr(info, data)
+            return path
+        
+        link = stat.S_IFLNK | 0o777
+        archive = make_zip(temp_dir / 'ok.zip', [
+            ('lib/libleanshared.so.1', b'so', 0o644), ('lib/libleanshared.so', 'libleanshared.so.1', link)])
+        extract_archive(archive, temp_dir / 'out')
+        assert (temp_dir / 'out' / 'lib' / 'libleanshared.so').read_bytes() == b'so'
+        
+        # A member written through a symlink extracted before it
+        (temp_dir / 'outside').mkdir()
+        archive = make_zip(temp_dir / 'escape.zip', [
+            ('lib', str(temp_dir / 'outside'), link), ('lib/evil', b'x', 0o644)])
+        with pytest.raises(ValueError):
+            extract_archive(archive, temp_dir / 'escape')
+        archive = make_zip(temp_dir / 'relative.zip', [('lib', '../outside', link)])
+        with pytest.raises(ValueError):
+            extract_archive(archive, temp_dir / 'relative')
+        assert list((temp_dir / 'outside').iterdir()) == []
+    
+    @pytest.mark.skipif(OS_TYPE == 'Windows', reason="Unix symlinks")
+    def test_tar_without_filters(self, temp_dir, monkeypatch):
+        """Test members and links escaping the target are rejected without tarfile filters"""
+        monkeypatch.delattr(tarfile, 'tar_filter', raising=False)
+        (temp_dir / 'outside').mkdir()
+        
+        def make_tar(path, members):
+            with tarfile.open(path, 'w') as tar:
+                for name, linkname, type_ in members:
+                    info = tarfile.TarInfo(name)
+                    info.type, info.linkname = type_, linkname
+                    tar.addfile(info, io.BytesIO(b'') if type_ == tarfile.REGTYPE else None)
+            return path
+        
+        archive = make_tar(temp_dir / 'ok.tar', [
+            ('lib/libleanshared.so.1', '', tarfile.REGTYPE), ('lib/libleanshared.so', 'libleanshared.so.1', tarfile.SYMTYPE)])
+        extract_archive(archive, temp_dir / 'out')
+        assert (temp_dir / 'out' / 'lib' / 'libleanshared.so').exists()
+        
+        for members in ([('../outside/evil', '', tarfile.REGTYPE)],
+                        [('lib', '../outside', tarfile.SYMTYPE)],
+                        [('lib', str(temp_dir / 'outside'), tarfile.SYMTYPE)],
+                        [('evil', '../outside/evil', tarfile.LNKTYPE)]):
+            with pytest.raises(ValueError):
+                extract_archive(make_tar(temp_dir / 'bad.tar', members), temp_dir / 'bad')
+        assert list((temp_dir / 'outside').iterdir()) == []